@@ -0,0 +1,60 @@
+"""
+Memory benchmark of the typed entity views
+
+Keeps SNAPSHOTS snapshots of a synthetic install, once as deep copies of
+the raw payload dicts (the usual way to keep history) and once as compacted
+wiserEntities views, and reports the memory held by each with tracemalloc.
+
+Run with: python benchmarks/benchmarkEntities.py
+"""
+
+import copy
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wiserHeatingAPI.wiserEntities import ENTITY_CLASSES  # noqa: E402
+from benchmarkJson import buildDomainPayload  # noqa: E402
+
+SNAPSHOTS = 100
+ROOM_COUNTS = (5, 50, 200)
+
+
+def dictSnapshots(hubData):
+    return [copy.deepcopy(hubData) for _ in range(SNAPSHOTS)]
+
+
+def entitySnapshots(hubData):
+    return [{entityType: [ENTITY_CLASSES[entityType](entity).compact()
+                          for entity in hubData.get(entityType) or ()]
+             for entityType in ENTITY_CLASSES}
+            for _ in range(SNAPSHOTS)]
+
+
+def measure(function, hubData):
+    tracemalloc.start()
+    snapshots = function(hubData)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del snapshots
+    return size
+
+
+def main():
+    print("Memory held by {} snapshots (KB)".format(SNAPSHOTS))
+    print("{:>6} {:>12} {:>12} {:>8}".format("rooms", "dicts", "entities",
+                                             "ratio"))
+    for roomCount in ROOM_COUNTS:
+        hubData = json.loads(buildDomainPayload(roomCount))
+        dictSize = measure(dictSnapshots, hubData)
+        entitySize = measure(entitySnapshots, hubData)
+        print("{:>6} {:>12.1f} {:>12.1f} {:>8.2f}".format(
+            roomCount, dictSize / 1024, entitySize / 1024,
+            dictSize / entitySize))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Benchmark suite against the local mock hub
+
+Measures, for installs of increasing size:
+- refreshData latency when the install changed since the last poll, which
+  decodes and rebuilds everything, and when the hub sent the same bytes
+  again, which skips that work
+- single entity lookup throughput (getRoom, getDevice, getSmartPlug,
+  getRoomSchedule)
+- write throughput of setRoomTemperature one room at a time and of the
+  batched setRoomTemperatures
+
+Run with: python benchmarks/benchmarkHub.py [rooms ...]
+"""
+
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wiserHeatingAPI.wiserHub import wiserHub  # noqa: E402
+from wiserHeatingAPI.wiserMockHub import WiserMockHub  # noqa: E402
+
+ROOM_COUNTS = (5, 50, 200)
+REFRESHES = 20
+LOOKUPS = 20000
+
+
+def benchRefresh(hub, mockHub):
+    changed = []
+    unchanged = []
+    for _ in range(REFRESHES):
+        mockHub.changeReadings()
+        start = time.perf_counter()
+        hub.refreshData()
+        changed.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        hub.refreshData()
+        unchanged.append(time.perf_counter() - start)
+    return (statistics.median(changed) * 1000, max(changed) * 1000,
+            statistics.median(unchanged) * 1000)
+
+
+def benchLookups(hub):
+    rand = random.Random(0)
+    roomIds = [room.get("id") for room in hub.getRooms()]
+    deviceIds = [device.get("id") for device in hub.getDevices()]
+    plugIds = [plug.get("id") for plug in hub.getSmartPlugs()] or [None]
+    calls = []
+    for _ in range(LOOKUPS):
+        calls.append((hub.getRoom, rand.choice(roomIds)))
+        calls.append((hub.getDevice, rand.choice(deviceIds)))
+        calls.append((hub.getRoomSchedule, rand.choice(roomIds)))
+        if plugIds[0] is not None:
+            calls.append((hub.getSmartPlug, rand.choice(plugIds)))
+    start = time.perf_counter()
+    for function, entityId in calls:
+        function(entityId)
+    return len(calls) / (time.perf_counter() - start)
+
+
+def benchWrites(hub):
+    roomIds = [room.get("id") for room in hub.getRooms()][:50]
+    start = time.perf_counter()
+    for roomId in roomIds:
+        hub.setRoomTemperature(roomId, 19)
+    sequential = len(roomIds) / (time.perf_counter() - start)
+    start = time.perf_counter()
+    hub.setRoomTemperatures({roomId: 20 for roomId in roomIds})
+    batched = len(roomIds) / (time.perf_counter() - start)
+    return sequential, batched
+
+
+def main():
+    roomCounts = [int(arg) for arg in sys.argv[1:]] or ROOM_COUNTS
+    print("{:>6} {:>12} {:>12} {:>14} {:>14} {:>12} {:>12}".format(
+        "rooms", "changed ms", "changed max", "unchanged ms", "lookups/s",
+        "writes/s", "batch w/s"))
+    for roomCount in roomCounts:
+        with WiserMockHub(rooms=roomCount, smartPlugs=roomCount // 5,
+                          latency=0.002) as mockHub:
+            with wiserHub(mockHub.hubIP, mockHub.secret) as hub:
+                changedMedian, changedMax, unchangedMedian = benchRefresh(
+                    hub, mockHub)
+                lookups = benchLookups(hub)
+                sequential, batched = benchWrites(hub)
+        print("{:>6} {:>12.2f} {:>12.2f} {:>14.2f} {:>14.0f} {:>12.0f} "
+              "{:>12.0f}".format(roomCount, changedMedian, changedMax,
+                                 unchangedMedian, lookups, sequential,
+                                 batched))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmark of hub payload decoding
+
+Compares, for synthetic payloads of increasing size, the time taken to
+decode the domain payload with each installed JSON backend and to
+sanitize + decode the network payload with the original regex path and
+with wiserJson.sanitize.
+
+Run with: python benchmarks/benchmarkJson.py
+"""
+
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from wiserHeatingAPI import wiserJson  # noqa: E402
+
+ROOM_COUNTS = (5, 50, 500)
+
+
+def buildDomainPayload(roomCount):
+    rooms = []
+    devices = []
+    schedules = []
+    for roomId in range(1, roomCount + 1):
+        valveIds = [roomCount + roomId * 2, roomCount + roomId * 2 + 1]
+        rooms.append({"id": roomId, "Name": "Room {}".format(roomId),
+                      "RoomStatId": roomId, "SmartValveIds": valveIds,
+                      "ScheduleId": roomId, "CalculatedTemperature": 201,
+                      "CurrentSetPoint": 200, "ScheduledSetPoint": 200,
+                      "Mode": "Auto"})
+        for deviceId in [roomId] + valveIds:
+            devices.append({"id": deviceId, "ProductType": "iTRV",
+                            "BatteryVoltage": 30,
+                            "DisplayedSignalStrength": "Good"})
+        schedules.append({"id": roomId, "Type": "Heating", "Monday": {
+            "SetPoints": [{"Time": 700, "DegreesC": 200},
+                          {"Time": 2200, "DegreesC": 160}]}})
+    return json.dumps({"Room": rooms, "Device": devices,
+                       "Schedule": schedules}).encode()
+
+
+def buildNetworkPayload(roomCount, dirty):
+    stations = [{"MdnsHostname": "WiserHeat{:04d}".format(i),
+                 "MacAddress": "AA:BB:CC:DD:EE:{:02X}".format(i % 256),
+                 "SSID": "Network\x01" if dirty else "Network"}
+                for i in range(roomCount)]
+    return json.dumps({"Station": stations[0], "Scan": stations},
+                      ensure_ascii=False).encode()
+
+
+def regexSanitizeLoads(content):
+    return json.loads(re.sub(rb'[^\x20-\x7F]+', b'', content))
+
+
+def bench(function, payload, number):
+    return min(timeit.repeat(lambda: function(payload), number=number,
+                             repeat=5)) / number * 1e6
+
+
+def main():
+    print("Domain payload decode (microseconds per payload)")
+    print("{:>6} {:>10} ".format("rooms", "KB") + " ".join(
+        "{:>10}".format(name) for name in wiserJson.BACKENDS))
+    for roomCount in ROOM_COUNTS:
+        payload = buildDomainPayload(roomCount)
+        number = max(1, 2000 // roomCount)
+        timings = [bench(loads, payload, number)
+                   for loads in wiserJson.BACKENDS.values()]
+        print("{:>6} {:>10.1f} ".format(roomCount, len(payload) / 1024) +
+              " ".join("{:>10.1f}".format(t) for t in timings))
+
+    print()
+    print("Network payload sanitize + decode (microseconds per payload)")
+    print("{:>6} {:>6} {:>10} {:>10} {:>10}".format(
+        "rooms", "dirty", "KB", "regex", "wiserJson"))
+    for roomCount in ROOM_COUNTS:
+        for dirty in (False, True):
+            payload = buildNetworkPayload(roomCount, dirty)
+            number = max(1, 2000 // roomCount)
+            print("{:>6} {:>6} {:>10.1f} {:>10.1f} {:>10.1f}".format(
+                roomCount, str(dirty), len(payload) / 1024,
+                bench(regexSanitizeLoads, payload, number),
+                bench(lambda p: wiserJson.loads(wiserJson.sanitize(p)),
+                      payload, number)))
+
+
+if __name__ == "__main__":
+    main()
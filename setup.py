@@ -13,6 +13,8 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/asantaga/wiserheatingapi",
     packages=setuptools.find_packages(),
+    install_requires=["requests"],
+    extras_require={"async": ["aiohttp"], "fast": ["orjson"]},
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
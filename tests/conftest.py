@@ -0,0 +1,27 @@
+"""
+Fixtures shared by the tests, each test gets its own WiserMockHub
+"""
+
+import pytest
+
+from wiserHeatingAPI.wiserHub import wiserHub
+from wiserHeatingAPI.wiserMockHub import WiserMockHub
+
+
+@pytest.fixture
+def mockHub():
+    with WiserMockHub(rooms=4, smartPlugs=1) as mockHub:
+        yield mockHub
+
+
+@pytest.fixture
+def hub(mockHub):
+    with wiserHub(mockHub.hubIP, mockHub.secret) as hub:
+        yield hub
+
+
+def patchCount(mockHub, collection):
+    """
+    return: number of PATCHes the mock hub received for a collection
+    """
+    return mockHub.requestCounts.get(("PATCH", "domain/" + collection), 0)
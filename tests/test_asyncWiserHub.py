@@ -0,0 +1,77 @@
+"""
+Tests of AsyncWiserHub against the local mock hub
+"""
+
+import asyncio
+import time
+
+import pytest
+
+from wiserHeatingAPI.asyncWiserHub import AsyncWiserHub
+from wiserHeatingAPI.wiserHub import (wiserHub,
+                                      WiserHubAuthenticationException)
+
+
+def testAsyncRefreshAndSetters(mockHub):
+    async def run():
+        async with AsyncWiserHub(mockHub.hubIP, mockHub.secret) as hub:
+            await hub.refreshData()
+            assert len(hub.getRooms()) == 4
+            assert hub.wiserNetworkData is not None
+
+            await hub.setRoomTemperature(1, 22)
+            assert hub.getRoom(1)["CurrentSetPoint"] == 220
+            assert mockHub.getEntity("Room", 1)["CurrentSetPoint"] == 220
+
+            await hub.setRoomMode(2, "off")
+            assert mockHub.getEntity("Room", 2)["CurrentSetPoint"] == -200
+            assert hub.getRoom(2)["CurrentSetPoint"] == -200
+
+            await hub.setHotwaterMode("on")
+            assert hub.getHotwater()[0]["WaterHeatingState"] == "On"
+            hotWaterId = hub.getHotwater()[0]["id"]
+            assert mockHub.getEntity("HotWater", hotWaterId)[
+                "WaterHeatingState"] == "On"
+
+            plugId = hub.getSmartPlugs()[0]["id"]
+            await hub.setSmartPlugState(plugId, "On")
+            assert hub.getSmartPlug(plugId)["OutputState"] == "On"
+            assert mockHub.getEntity("SmartPlug", plugId)[
+                "OutputState"] == "On"
+    asyncio.run(run())
+
+
+def testAsyncRefreshesDoNotBlockEachOther(mockHub):
+    mockHub.latency = 0.3
+
+    async def run():
+        async with AsyncWiserHub(mockHub.hubIP, mockHub.secret) as first, \
+                AsyncWiserHub(mockHub.hubIP, mockHub.secret) as second:
+            start = time.monotonic()
+            await asyncio.gather(first.refreshData(), second.refreshData())
+            return time.monotonic() - start
+    assert asyncio.run(run()) < 0.55
+
+
+def testWrongSecret(mockHub):
+    with pytest.raises(WiserHubAuthenticationException):
+        wiserHub(mockHub.hubIP, "wrong")
+
+    async def run():
+        async with AsyncWiserHub(mockHub.hubIP, "wrong") as hub:
+            await hub.refreshData()
+    with pytest.raises(WiserHubAuthenticationException):
+        asyncio.run(run())
+
+
+def testAsyncHubIsNotAPlainContextManager(mockHub):
+    hub = AsyncWiserHub(mockHub.hubIP, mockHub.secret)
+    with pytest.raises(TypeError):
+        with hub:
+            pass
+
+
+def testAsyncHubHasNoWriteQueue(mockHub):
+    hub = AsyncWiserHub(mockHub.hubIP, mockHub.secret)
+    for name in ("enableWriteQueue", "disableWriteQueue", "flushWrites"):
+        assert not hasattr(hub, name)
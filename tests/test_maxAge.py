@@ -0,0 +1,35 @@
+"""
+Tests of getters refreshing expired data, see wiserHub maxAge
+"""
+
+import time
+
+from wiserHeatingAPI.wiserHub import wiserHub
+
+
+def testExpiredGetterRefreshesDomainOnly(mockHub):
+    with wiserHub(mockHub.hubIP, mockHub.secret, maxAge=0.1) as hub:
+        before = dict(mockHub.requestCounts)
+        time.sleep(0.15)
+        hub.getRoom(1)
+        hub.getRoom(2)
+        counts = {key: count - before.get(key, 0)
+                  for key, count in mockHub.requestCounts.items()}
+    assert counts.get(("GET", "domain")) == 1
+    assert not counts.get(("GET", "network"))
+
+
+def testUnreachableHubIsNotRetriedByEveryGetter(mockHub):
+    with wiserHub(mockHub.hubIP, mockHub.secret, maxAge=0.2,
+                  timeout=1) as hub:
+        mockHub.stop()
+        time.sleep(0.25)
+        before = hub.metrics.requestCount()
+        for _ in range(50):
+            assert hub.getRoom(1) is not None
+        assert hub.metrics.requestCount() - before == 1
+
+        # Retried once maxAge has passed again
+        time.sleep(0.25)
+        hub.getRoom(1)
+        assert hub.metrics.requestCount() - before == 2
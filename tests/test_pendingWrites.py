@@ -0,0 +1,58 @@
+"""
+Tests of local writes and their reconciliation with refreshes
+"""
+
+import threading
+import time
+
+from wiserHeatingAPI.wiserEvents import ROOM_SETPOINT_CHANGED
+
+
+def testWriteThroughAndReconcile(mockHub, hub):
+    hub.setRoomTemperature(1, 25)
+    assert hub.getRoom(1)["CurrentSetPoint"] == 250
+    assert hub.isWritePending("Room", 1)
+    hub.refreshData()
+    assert hub.getRoom(1)["CurrentSetPoint"] == 250
+    assert not hub.isWritePending("Room", 1)
+
+    # The hub is authoritative for settled writes
+    hub.setRoomTemperature(2, 25)
+    mockHub.updateEntity("Room", 2, CurrentSetPoint=190)
+    hub.refreshData()
+    assert hub.getRoom(2)["CurrentSetPoint"] == 190
+    assert not hub.isWritePending("Room", 2)
+
+
+def testWriteSurvivesRefreshInFlight(mockHub, hub):
+    mockHub.latency = 0.4
+    refresh = threading.Thread(target=hub.refreshData)
+    refresh.start()
+    time.sleep(0.1)
+    # The refresh's GET already has its stale response
+    mockHub.latency = 0
+    hub.setRoomTemperature(1, 25)
+    refresh.join()
+    assert hub.getRoom(1)["CurrentSetPoint"] == 250
+    assert hub.isWritePending("Room", 1)
+    hub.refreshData()
+    assert hub.getRoom(1)["CurrentSetPoint"] == 250
+    assert not hub.isWritePending("Room", 1)
+
+
+def testWriteEmitsChangeEvents(mockHub, hub):
+    events = []
+    hub.subscribe(events.append, [ROOM_SETPOINT_CHANGED])
+    previous = hub.getRoom(1)["CurrentSetPoint"]
+    hub.setRoomTemperature(1, 25)
+    assert [(event.entityId, event.oldValue, event.newValue)
+            for event in events] == [(1, previous, 250)]
+
+    # The refresh confirming the write has nothing new to report
+    hub.refreshData()
+    assert len(events) == 1
+
+    mockHub.updateEntity("Room", 1, CurrentSetPoint=190)
+    hub.refreshData()
+    assert [(event.oldValue, event.newValue)
+            for event in events[1:]] == [(250, 190)]
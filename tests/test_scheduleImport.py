@@ -0,0 +1,61 @@
+"""
+Tests of exporting and importing every room schedule through a directory
+"""
+
+import json
+import os
+
+from conftest import patchCount
+
+MONDAY = {"SetPoints": [{"Time": 700, "DegreesC": 215},
+                        {"Time": 2300, "DegreesC": 150}]}
+
+
+def writeSchedule(directory, roomId, schedule):
+    with open(os.path.join(directory, "room{}schedule.json".format(roomId)),
+              "w") as f:
+        json.dump(schedule, f)
+
+
+def testExportImportRoundTrip(mockHub, hub, tmp_path):
+    directory = str(tmp_path / "schedules")
+    results = hub.exportRoomSchedules(directory)
+    assert sorted(results) == [1, 2, 3, 4]
+    assert sorted(os.listdir(directory)) == [
+        "room{}schedule.json".format(roomId) for roomId in (1, 2, 3, 4)]
+    assert patchCount(mockHub, "Schedule") == 0
+
+    # The cache already holds every exported schedule
+    assert hub.importRoomSchedules(directory) == {
+        roomId: False for roomId in (1, 2, 3, 4)}
+    assert patchCount(mockHub, "Schedule") == 0
+
+
+def testImportWritesSharedSchedulesOnce(mockHub, hub, tmp_path):
+    mockHub.updateEntity("Room", 3, ScheduleId=2)
+    hub.refreshData()
+    directory = str(tmp_path)
+    hub.exportRoomSchedules(directory)
+    for roomId in (1, 2, 3):
+        writeSchedule(directory, roomId,
+                      dict(hub.getRoomSchedule(roomId), Monday=MONDAY))
+
+    results = hub.importRoomSchedules(directory)
+    assert results == {1: True, 2: True, 3: True, 4: False}
+    # Rooms 2 and 3 share schedule 2
+    assert patchCount(mockHub, "Schedule") == 2
+    for scheduleId in (1, 2):
+        assert mockHub.getEntity("Schedule", scheduleId)["Monday"] == MONDAY
+
+
+def testImportReportsFailuresPerRoom(mockHub, hub, tmp_path):
+    directory = str(tmp_path)
+    writeSchedule(directory, 1, dict(hub.getRoomSchedule(1), Monday=MONDAY))
+    with open(os.path.join(directory, "room2schedule.json"), "w") as f:
+        f.write("{not json")
+
+    results = hub.importRoomSchedules(directory, roomIds=[1, 2, 3])
+    assert results[1] is True
+    assert isinstance(results[2], ValueError)
+    assert isinstance(results[3], FileNotFoundError)
+    assert patchCount(mockHub, "Schedule") == 1
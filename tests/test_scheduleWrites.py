@@ -0,0 +1,57 @@
+"""
+Tests of schedule writes which only send what differs from the cache
+"""
+
+from wiserHeatingAPI.wiserHub import WiserNotFound
+
+from conftest import patchCount
+
+MONDAY = {"SetPoints": [{"Time": 700, "DegreesC": 215},
+                        {"Time": 2300, "DegreesC": 150}]}
+
+
+def testUnchangedScheduleIsNotSent(mockHub, hub):
+    schedule = dict(hub.getRoomSchedule(1))
+    # Set points compare equal in any order
+    schedule["Tuesday"] = {"SetPoints": list(reversed(
+        schedule["Tuesday"]["SetPoints"]))}
+    assert hub.setRoomSchedule(1, schedule) is False
+    assert patchCount(mockHub, "Schedule") == 0
+
+    assert hub.setRoomSchedule(1, schedule, force=True) is True
+    assert patchCount(mockHub, "Schedule") == 1
+
+
+def testOnlyChangedDaysAreSent(mockHub, hub):
+    schedule = dict(hub.getRoomSchedule(1), Monday=MONDAY)
+    # Changed behind the cache's back, a full upload would overwrite it
+    tuesday = {"SetPoints": [{"Time": 800, "DegreesC": 170}]}
+    mockHub.updateEntity("Schedule", 1, Tuesday=tuesday)
+
+    assert hub.setRoomSchedule(1, schedule) is True
+    assert patchCount(mockHub, "Schedule") == 1
+    assert mockHub.getEntity("Schedule", 1)["Monday"] == MONDAY
+    assert mockHub.getEntity("Schedule", 1)["Tuesday"] == tuesday
+    assert hub.getRoomSchedule(1)["Monday"] == MONDAY
+
+
+def testCopyRoomSchedulesWritesSharedSchedulesOnce(mockHub, hub, capsys):
+    mockHub.updateEntity("Room", 3, ScheduleId=2)
+    hub.refreshData()
+    hub.setRoomSchedule(1, dict(hub.getRoomSchedule(1), Monday=MONDAY))
+    before = patchCount(mockHub, "Schedule")
+
+    results = hub.copyRoomSchedules(1, [2, 3, 4, 99])
+    assert {roomId: results[roomId] for roomId in (2, 3, 4)} == \
+        {2: True, 3: True, 4: True}
+    assert isinstance(results[99], WiserNotFound)
+    # Rooms 2 and 3 share schedule 2
+    assert patchCount(mockHub, "Schedule") - before == 2
+    for scheduleId in (2, 4):
+        assert mockHub.getEntity("Schedule", scheduleId)["Monday"] == MONDAY
+
+    assert hub.copyRoomSchedules(1, [2, 3, 4]) == {2: False, 3: False,
+                                                  4: False}
+    assert hub.copyRoomSchedule(1, 2) is False
+    assert patchCount(mockHub, "Schedule") - before == 2
+    assert capsys.readouterr().out == ""
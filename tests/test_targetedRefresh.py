@@ -0,0 +1,61 @@
+"""
+Tests of refreshes which fetch a single entity or collection
+"""
+
+from wiserHeatingAPI.wiserEvents import ROOM_TEMPERATURE_CHANGED
+
+
+def testRefreshRoomSplicesOneRoom(mockHub, hub):
+    before = dict(mockHub.requestCounts)
+    state = hub.state
+    events = []
+    hub.subscribe(events.append)
+    mockHub.updateEntity("Room", 1, CalculatedTemperature=123,
+                         Name="Kitchen")
+    mockHub.updateEntity("Room", 2, CalculatedTemperature=124)
+
+    room = hub.refreshRoom(1)
+    assert room["CalculatedTemperature"] == 123
+    assert hub.getRoom(1) is room
+    # Only room 1 was fetched
+    assert hub.getRoom(2)["CalculatedTemperature"] != 124
+    assert hub.getRoom(3) is state.entityIndex["Room"][3]
+    assert hub.state.generation == state.generation + 1
+    assert hub.getDeviceRoom(room["RoomStatId"])["roomName"] == "Kitchen"
+    assert [(event.eventType, event.entityId) for event in events] == [
+        (ROOM_TEMPERATURE_CHANGED, 1)]
+    counts = {key: count - before.get(key, 0)
+              for key, count in mockHub.requestCounts.items()
+              if count != before.get(key, 0)}
+    assert counts == {("GET", "domain/Room"): 1}
+
+
+def testRefreshSmartPlugsSplicesTheCollection(mockHub, hub):
+    plugId = hub.getSmartPlugs()[0]["id"]
+    mockHub.updateEntity("SmartPlug", plugId, OutputState="On")
+    added = dict(mockHub.getEntity("SmartPlug", plugId), id=900)
+    mockHub.addEntity("SmartPlug", added)
+
+    plugs = hub.refreshSmartPlugs()
+    assert [plug["id"] for plug in plugs] == [plugId, 900]
+    assert hub.getSmartPlug(plugId)["OutputState"] == "On"
+    assert hub.getSmartPlug(900)["Name"] == added["Name"]
+
+    mockHub.removeEntity("SmartPlug", 900)
+    hub.refreshSmartPlugs()
+    assert [plug["id"] for plug in hub.getSmartPlugs()] == [plugId]
+
+
+def testRefreshRoomReconcilesPendingWrites(mockHub, hub):
+    hub.setRoomTemperature(1, 25)
+    assert hub.isWritePending("Room", 1)
+    hub.refreshRoom(1)
+    assert not hub.isWritePending("Room", 1)
+    assert hub.getRoom(1)["CurrentSetPoint"] == 250
+
+    # Another client changed the set point since, the hub wins
+    hub.setRoomTemperature(2, 25)
+    mockHub.updateEntity("Room", 2, CurrentSetPoint=190)
+    hub.refreshRooms()
+    assert not hub.isWritePending("Room", 2)
+    assert hub.getRoom(2)["CurrentSetPoint"] == 190
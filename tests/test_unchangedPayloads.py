@@ -0,0 +1,36 @@
+"""
+Tests of skipping the decoding and rebuilds of unchanged payloads
+"""
+
+
+def testUnchangedPayloadIsSkipped(mockHub, hub):
+    generation = hub.generation
+    hubData = hub.wiserHubData
+    hub.refreshData()
+    assert hub.lastRefreshChanged == {"domain": False, "network": False}
+    assert hub.generation == generation
+    assert hub.wiserHubData is hubData
+
+    mockHub.changeReadings()
+    hub.refreshData()
+    assert hub.lastRefreshChanged["domain"] is True
+    assert hub.generation == generation + 1
+    assert hub.getRoom(1)["CalculatedTemperature"] == \
+        mockHub.getEntity("Room", 1)["CalculatedTemperature"]
+
+
+def testLocalWriteClearsFingerprint(mockHub, hub):
+    hub.refreshData()
+    hub.setRoomTemperature(1, 25)
+    # The cache no longer matches the hub's bytes, the next refresh decodes
+    hub.refreshData()
+    assert hub.lastRefreshChanged["domain"] is True
+    hub.refreshData()
+    assert hub.lastRefreshChanged["domain"] is False
+
+
+def testUnchangedRefreshEmitsNoEvents(mockHub, hub):
+    events = []
+    hub.subscribe(events.append)
+    hub.refreshData()
+    assert events == []
@@ -0,0 +1,24 @@
+"""
+Tests of the typed entity views
+"""
+
+from wiserHeatingAPI.wiserEntities import ENTITY_CLASSES, fromWiserTemp
+
+
+def testFromWiserTemp():
+    assert fromWiserTemp(205) == 20.5
+    assert fromWiserTemp(-200) == -20.0
+    assert fromWiserTemp(-32768) is None
+
+
+def testRoomStatWithoutReading():
+    roomStat = ENTITY_CLASSES["RoomStat"]({"id": 1, "SetPoint": 200,
+                                           "MeasuredTemperature": -32768})
+    assert roomStat.setPoint == 20.0
+    assert roomStat.measuredTemperature is None
+
+
+def testNoReadingIsNone(mockHub, hub):
+    mockHub.updateEntity("Room", 1, CalculatedTemperature=-32768)
+    hub.refreshData()
+    assert hub.getEntity("Room", 1).calculatedTemperature is None
@@ -0,0 +1,62 @@
+"""
+Tests of the change events raised between refreshes
+"""
+
+from wiserHeatingAPI.wiserEvents import (diffEntityIndexes, ENTITY_ADDED,
+                                         ENTITY_REMOVED,
+                                         ROOM_TEMPERATURE_CHANGED,
+                                         SMARTPLUG_OUTPUT_CHANGED)
+
+
+def testDiffEntityIndexes():
+    kitchen = {"id": 1, "CalculatedTemperature": 200, "Name": "Kitchen"}
+    hall = {"id": 2, "CalculatedTemperature": 180}
+    study = {"id": 3, "CalculatedTemperature": 190}
+    oldIndex = {"Room": {1: kitchen, 2: hall}}
+    newIndex = {"Room": {1: dict(kitchen, CalculatedTemperature=210,
+                                 Name="Kitchen diner"),
+                         3: study}}
+    events = diffEntityIndexes(oldIndex, newIndex)
+    assert sorted((event.eventType, event.entityId) for event in events) == [
+        (ENTITY_ADDED, 3), (ENTITY_REMOVED, 2),
+        (ROOM_TEMPERATURE_CHANGED, 1)]
+    changed, = [event for event in events
+                if event.eventType == ROOM_TEMPERATURE_CHANGED]
+    assert (changed.field, changed.oldValue, changed.newValue) == \
+        ("CalculatedTemperature", 200, 210)
+    added, = [event for event in events if event.eventType == ENTITY_ADDED]
+    assert added.newValue is study and added.oldValue is None
+    removed, = [event for event in events
+                if event.eventType == ENTITY_REMOVED]
+    assert removed.oldValue is hall and removed.newValue is None
+
+    # Shared entities are skipped without comparing their fields
+    assert diffEntityIndexes(oldIndex, oldIndex) == []
+
+
+def testRefreshPublishesEvents(mockHub, hub):
+    events = []
+    unsubscribe = hub.subscribe(events.append)
+    plugId = hub.getSmartPlugs()[0]["id"]
+    mockHub.updateEntity("SmartPlug", plugId, OutputState="On")
+    removed = mockHub.removeEntity("Room", 4)
+    mockHub.addEntity("Room", dict(removed, id=5, Name="Loft"))
+    hub.refreshData()
+    assert sorted((event.eventType, event.entityType, event.entityId)
+                  for event in events) == [
+        (ENTITY_ADDED, "Room", 5), (ENTITY_REMOVED, "Room", 4),
+        (SMARTPLUG_OUTPUT_CHANGED, "SmartPlug", plugId)]
+
+    unsubscribe()
+    mockHub.updateEntity("SmartPlug", plugId, OutputState="Off")
+    hub.refreshData()
+    assert len(events) == 3
+
+
+def testSubscriberFiltersEventTypes(mockHub, hub):
+    events = []
+    hub.subscribe(events.append, [ROOM_TEMPERATURE_CHANGED])
+    mockHub.changeReadings()
+    hub.refreshData()
+    assert events
+    assert {event.eventType for event in events} == {ROOM_TEMPERATURE_CHANGED}
@@ -0,0 +1,63 @@
+"""
+Tests of WiserFleet against local mock hubs
+"""
+
+import contextlib
+
+from wiserHeatingAPI.wiserFleet import WiserFleet
+from wiserHeatingAPI.wiserHub import (WiserHubAuthenticationException,
+                                      WiserHubConnectionException,
+                                      WiserHubTimeoutException)
+from wiserHeatingAPI.wiserMockHub import WiserMockHub
+
+
+def testFleetReportsUnreachableHub():
+    with WiserMockHub(rooms=2, smartPlugs=0) as mockHub, \
+            WiserFleet([(mockHub.hubIP, mockHub.secret)], timeout=1) as fleet:
+        assert fleet.refreshAll()[mockHub.hubIP].error is None
+        mockHub.stop()
+        result = fleet.refreshAll()[mockHub.hubIP]
+        assert result.data is None
+        assert isinstance(result.error, WiserHubConnectionException)
+
+
+def testFleetReportsHubUnreachableFromTheStart():
+    # Nothing listens on port 1
+    hubIP = "127.0.0.1:1"
+    with WiserFleet([(hubIP, "secret")], timeout=1) as fleet:
+        for _ in range(2):
+            result = fleet.refreshAll()[hubIP]
+            assert result.data is None
+            assert isinstance(result.error, WiserHubConnectionException)
+
+
+def testFleetReportsAuthenticationError(mockHub):
+    with WiserFleet([(mockHub.hubIP, "wrong")]) as fleet:
+        result = fleet.refreshAll()[mockHub.hubIP]
+    assert isinstance(result.error, WiserHubAuthenticationException)
+
+
+def testFleetTimesOutSlowHub(mockHub):
+    with WiserFleet([(mockHub.hubIP, mockHub.secret)], timeout=5,
+                    sweepTimeout=0.2) as fleet:
+        assert fleet.refreshAll()[mockHub.hubIP].error is None
+        mockHub.latency = 0.6
+        result = fleet.refreshAll()[mockHub.hubIP]
+        assert isinstance(result.error, WiserHubTimeoutException)
+        # The earlier refresh is still running
+        result = fleet.refreshAll()[mockHub.hubIP]
+        assert "still busy" in str(result.error)
+
+
+def testFleetDeadlineStartsWithEachHub():
+    with contextlib.ExitStack() as stack:
+        mockHubs = [stack.enter_context(WiserMockHub(rooms=2, smartPlugs=0,
+                                                     latency=0.15))
+                    for _ in range(6)]
+        fleet = stack.enter_context(WiserFleet(
+            [(mockHub.hubIP, mockHub.secret) for mockHub in mockHubs],
+            maxWorkers=2, sweepTimeout=0.4))
+        for _ in range(2):
+            results = fleet.refreshAll()
+            assert [result.error for result in results.values()] == \
+                [None] * len(mockHubs)
@@ -0,0 +1,58 @@
+"""
+Tests of the request metrics recorded by wiserHub
+"""
+
+import pytest
+import requests
+
+from wiserHeatingAPI.wiserHub import (wiserHub, WiserCircuitOpenException,
+                                      WiserNotFound)
+from wiserHeatingAPI.wiserThrottle import WiserRequestScheduler
+
+
+def testPrometheusOutput(mockHub, hub):
+    hub.refreshData()
+    text = hub.metrics.toPrometheus()
+    labels = 'hub="{}",endpoint="domain"'.format(mockHub.hubIP)
+    assert "# TYPE wiser_hub_requests_total counter" in text
+    assert "wiser_hub_requests_total{{{},method=\"GET\"}} 2".format(
+        labels) in text
+    assert "wiser_hub_request_duration_seconds_bucket{{{},le=\"+Inf\"}} 2".\
+        format(labels) in text
+    assert "wiser_hub_request_duration_seconds_count{{{}}} 2".format(
+        labels) in text
+    assert "wiser_hub_errors_total{" not in text
+    assert text.endswith("\n")
+
+
+def testErrorsAreLabelledAsTheCallerSeesThem(mockHub):
+    with wiserHub(mockHub.hubIP, mockHub.secret, timeout=0.2) as hub:
+        with pytest.raises(WiserNotFound):
+            hub.setSmartPlugState(999, "On")
+        assert hub.metrics.errorCount(endpoint="smartplug",
+                                      error="WiserNotFound") == 1
+
+        mockHub.latency = 0.5
+        with pytest.raises(requests.Timeout) as excinfo:
+            hub.setRoomTemperature(1, 21)
+        assert hub.metrics.errorCount(
+            endpoint="room", error=type(excinfo.value).__name__) == 1
+        assert hub.metrics.errorCount(
+            error="WiserHubTimeoutException") == 0
+
+
+def testRejectedRequestsAreCountedApart(mockHub):
+    scheduler = WiserRequestScheduler(backoffBase=0, failureThreshold=1,
+                                      resetTimeout=60)
+    with wiserHub(mockHub.hubIP, mockHub.secret, timeout=1,
+                  scheduler=scheduler) as hub:
+        mockHub.stop()
+        hub.refreshData()
+        before = hub.metrics.requestCount()
+        with pytest.raises(WiserCircuitOpenException):
+            hub.setRoomTemperature(1, 21)
+        assert hub.metrics.requestCount() == before
+        assert hub.metrics.rejectedCount(endpoint="room") == 1
+        assert "wiser_hub_rejected_total{{hub=\"{}\",endpoint=\"room\"," \
+            "method=\"PATCH\"}} 1".format(mockHub.hubIP) in \
+            hub.metrics.toPrometheus()
@@ -0,0 +1,53 @@
+"""
+Tests of refresh profiling
+"""
+
+import tracemalloc
+
+from wiserHeatingAPI.wiserProfiler import WiserRefreshProfiler
+
+
+def testRefreshIsProfiled(hub):
+    profiles = []
+    hub.enableProfiling(traceMemory=True, hook=profiles.append)
+    try:
+        hub.refreshData()
+    finally:
+        hub.disableProfiling()
+    profile, = profiles
+    assert profile.kind == "refreshData"
+    assert {"domainHttp", "networkHttp"} <= set(profile.phases)
+    assert profile.peakMemory is not None
+    assert profile.error is None
+
+
+def testOverlappingTracedRefreshesHaveNoPeak():
+    first = WiserRefreshProfiler(traceMemory=True)
+    second = WiserRefreshProfiler(traceMemory=True)
+    try:
+        outer = first.start("refreshData")
+        inner = second.start("refreshData")
+        second.finish(inner)
+        first.finish(outer)
+        assert outer.peakMemory is None
+        assert inner.peakMemory is None
+
+        alone = first.start("refreshData")
+        first.finish(alone)
+        assert alone.peakMemory is not None
+    finally:
+        first.close()
+        second.close()
+
+
+def testTracingStopsWithTheLastProfiler():
+    assert not tracemalloc.is_tracing()
+    first = WiserRefreshProfiler(traceMemory=True)
+    second = WiserRefreshProfiler(traceMemory=True)
+    first.close()
+    assert tracemalloc.is_tracing()
+    profile = second.start("refreshHubData")
+    second.finish(profile)
+    assert profile.peakMemory is not None
+    second.close()
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,72 @@
+"""
+Tests of the compiled schedules
+"""
+
+import datetime
+
+from wiserHeatingAPI.wiserSchedules import (CompiledSchedule,
+                                            MINUTES_PER_WEEK, weekMinute)
+
+# 2024-01-01 is a Monday
+MONDAY = datetime.datetime(2024, 1, 1)
+
+SCHEDULE = {
+    "id": 7, "Type": "Heating",
+    "Monday": {"SetPoints": [{"Time": 630, "DegreesC": 210},
+                             {"Time": 2200, "DegreesC": 160}]},
+    "Sunday": {"SetPoints": [{"Time": 2300, "DegreesC": 180}]},
+}
+
+
+def testCompiledScheduleValues():
+    schedule = CompiledSchedule(SCHEDULE)
+    assert list(schedule.times) == [390, 1320, 6 * 1440 + 1380]
+    # Before Monday's first change Sunday's last one is still in force
+    assert schedule.decode(schedule.valueAt(0)) == 18.0
+    assert schedule.decode(schedule.valueAt(390)) == 21.0
+    assert schedule.decode(schedule.valueAt(3000)) == 16.0
+    assert schedule.decode(schedule.valueAt(MINUTES_PER_WEEK - 1)) == 18.0
+
+
+def testNextChangeWrapsAroundTheWeek():
+    schedule = CompiledSchedule(SCHEDULE)
+    sundayNight = weekMinute(MONDAY + datetime.timedelta(days=6, hours=23,
+                                                         minutes=30))
+    assert schedule.nextChange(sundayNight) == (30 + 390, 210)
+    assert schedule.nextChange(389) == (1, 210)
+    assert schedule.nextChange(390) == (1320 - 390, 160)
+
+
+def testForecastWrapsAroundTheWeek():
+    schedule = CompiledSchedule(SCHEDULE)
+    start = MINUTES_PER_WEEK - 60
+    values = schedule.forecast(start, 30, 3 * 48)
+    assert len(values) == 3 * 48
+    # Sunday 23:00, Monday 00:00 and 06:30, a week and a day later
+    assert values[0] == 180
+    assert values[2] == 180
+    assert values[2 + 13] == 210
+    assert values[2 + 48 * 2 + 13] == 160
+    assert list(schedule.forecast(start + MINUTES_PER_WEEK, 30, 3 * 48)) \
+        == list(values)
+    assert len(CompiledSchedule({"id": 8}).forecast(0, 15, 10)) == 0
+
+
+def testHubScheduleQueries(mockHub, hub):
+    mockHub.removeEntity("Schedule", 1)
+    mockHub.addEntity("Schedule", dict(SCHEDULE, id=1))
+    for roomId in (2, 3, 4):
+        mockHub.updateEntity("Room", roomId, ScheduleId=None)
+    hub.refreshData()
+
+    assert hub.getRoomSetPointAt(1, MONDAY.replace(hour=7)) == 21.0
+    assert hub.getRoomSetPointAt(2, MONDAY) is None
+    assert hub.getRoomSetPoints(MONDAY.replace(hour=23)) == {1: 16.0}
+
+    sundayNight = MONDAY + datetime.timedelta(days=6, hours=23, minutes=30)
+    assert hub.getNextScheduleChange(when=sundayNight) == (
+        MONDAY + datetime.timedelta(days=7, hours=6, minutes=30), 1, 21.0)
+
+    forecast = hub.forecastRoomSetPoints(sundayNight, step=60, count=8)
+    assert list(forecast) == [1]
+    assert list(forecast[1]) == [18.0] * 7 + [21.0]
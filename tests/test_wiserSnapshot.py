@@ -0,0 +1,49 @@
+"""
+Tests of the on-disk snapshots and warm starts from them
+"""
+
+import time
+
+from wiserHeatingAPI.wiserHub import wiserHub
+from wiserHeatingAPI.wiserSnapshot import WiserSnapshotStore
+
+
+def testStoreRoundTrip(tmp_path):
+    store = WiserSnapshotStore(str(tmp_path / "wiser.snap"))
+    assert store.load() is None
+    store.save(b'{"Room": []}', None, 12.5)
+    snapshot = store.load()
+    assert snapshot == (b'{"Room": []}', None, 12.5)
+    store.save(b'{"Room": []}', b'{"Station": {}}', 13.0)
+    assert store.load().network == b'{"Station": {}}'
+
+
+def testStoreIgnoresDamagedFiles(tmp_path):
+    path = tmp_path / "wiser.snap"
+    store = WiserSnapshotStore(str(path))
+    store.save(b'{"Room": []}', b'{}', 1.0)
+    data = path.read_bytes()
+    path.write_bytes(data[:-1])
+    assert store.load() is None
+    path.write_bytes(data + b"x")
+    assert store.load() is None
+    path.write_bytes(b"XXXX" + data[4:])
+    assert store.load() is None
+
+
+def testSnapshotWarmStart(mockHub, tmp_path):
+    snapshotPath = str(tmp_path / "wiser.snap")
+    with wiserHub(mockHub.hubIP, mockHub.secret,
+                  snapshotPath=snapshotPath) as hub:
+        rooms = hub.getRooms()
+
+    mockHub.latency = 0.5
+    start = time.monotonic()
+    with wiserHub(mockHub.hubIP, mockHub.secret,
+                  snapshotPath=snapshotPath) as hub:
+        # Served from the snapshot while the first refresh runs
+        assert hub.getRooms() == rooms
+        assert time.monotonic() - start < 0.4
+        assert hub.initialRefresh is not None
+        hub.initialRefresh.result(timeout=5)
+        assert hub.lastRefreshChanged["domain"] is False
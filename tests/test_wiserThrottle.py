@@ -0,0 +1,92 @@
+"""
+Tests of the WiserRequestScheduler circuit breaker
+"""
+
+import time
+
+import pytest
+
+from wiserHeatingAPI.wiserHub import wiserHub, WiserCircuitOpenException
+from wiserHeatingAPI.wiserThrottle import (WiserRequestScheduler,
+                                           CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN,
+                                           CIRCUIT_OPEN)
+
+
+def openScheduler():
+    scheduler = WiserRequestScheduler(backoffBase=0, failureThreshold=2,
+                                      resetTimeout=0.1)
+    for _ in range(2):
+        scheduler.acquire()
+        scheduler.recordFailure(time.monotonic())
+    return scheduler
+
+
+def testCircuitOpensAndCloses():
+    scheduler = openScheduler()
+    assert scheduler.state == CIRCUIT_OPEN
+    with pytest.raises(WiserCircuitOpenException):
+        scheduler.acquire()
+
+    time.sleep(0.15)
+    scheduler.acquire()
+    assert scheduler.state == CIRCUIT_HALF_OPEN
+    # Only one trial at a time
+    with pytest.raises(WiserCircuitOpenException):
+        scheduler.acquire()
+    scheduler.recordSuccess()
+    assert scheduler.state == CIRCUIT_CLOSED
+    assert scheduler.consecutiveFailures == 0
+    scheduler.acquire()
+
+
+def testFailedTrialReopensCircuit():
+    scheduler = openScheduler()
+    time.sleep(0.15)
+    scheduler.acquire()
+    scheduler.recordFailure(time.monotonic())
+    assert scheduler.state == CIRCUIT_OPEN
+    with pytest.raises(WiserCircuitOpenException):
+        scheduler.acquire()
+
+
+def testReleasedTrialKeepsCircuitHalfOpen():
+    scheduler = openScheduler()
+    time.sleep(0.15)
+    scheduler.acquire()
+    scheduler.releaseTrial()
+    assert scheduler.state == CIRCUIT_HALF_OPEN
+    assert scheduler.consecutiveFailures == 2
+    # The next request is the trial
+    scheduler.acquire()
+    with pytest.raises(WiserCircuitOpenException):
+        scheduler.acquire()
+
+
+def testRequestsInFlightTogetherFailOnce():
+    scheduler = WiserRequestScheduler(backoffBase=0)
+    sentAt = time.monotonic()
+    scheduler.recordFailure(sentAt)
+    scheduler.recordFailure(sentAt)
+    assert scheduler.consecutiveFailures == 1
+    scheduler.recordFailure(time.monotonic())
+    assert scheduler.consecutiveFailures == 2
+
+
+def testUnreachableHubOpensCircuit(mockHub):
+    scheduler = WiserRequestScheduler(backoffBase=0, failureThreshold=2,
+                                      resetTimeout=60)
+    with wiserHub(mockHub.hubIP, mockHub.secret, timeout=1,
+                  scheduler=scheduler) as hub:
+        mockHub.stop()
+        # The domain and network fetches of a refresh fail together
+        hub.refreshData()
+        assert scheduler.consecutiveFailures == 1
+        assert scheduler.state == CIRCUIT_CLOSED
+        hub.refreshData()
+        assert scheduler.state == CIRCUIT_OPEN
+
+        # Refreshes fail fast and keep serving the cached data
+        start = time.monotonic()
+        assert hub.refreshData() is not None
+        assert time.monotonic() - start < 0.1
+        assert hub.getRoom(1) is not None
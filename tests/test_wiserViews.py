@@ -0,0 +1,54 @@
+"""
+Tests of the derived views memoized per generation of the cached data
+"""
+
+from wiserHeatingAPI.wiserViews import WiserViewCache
+
+
+def testViewIsComputedOncePerGeneration():
+    cache = WiserViewCache()
+    calls = []
+
+    def compute():
+        calls.append(None)
+        return len(calls)
+
+    assert cache.get(1, "view", compute) == 1
+    assert cache.get(1, "view", compute) == 1
+    assert cache.get(1, "other", compute) == 2
+    assert cache.get(2, "view", compute) == 3
+    assert cache.get(2, "view", compute) == 3
+    assert len(calls) == 3
+
+
+def testViewsFollowTheCachedData(mockHub, hub):
+    calling = hub.getRoomsCallingForHeat()
+    assert calling == ()
+    assert hub.getRoomsCallingForHeat() is calling
+    assert hub.getHeatingRelayStatus() == "Off"
+
+    # An unchanged payload keeps the generation and the memo
+    hub.refreshData()
+    assert hub.getRoomsCallingForHeat() is calling
+
+    mockHub.updateEntity("Room", 2, PercentageDemand=40)
+    mockHub.updateEntity("HeatingChannel", 1, HeatingRelayState="On")
+    hub.refreshData()
+    assert hub.getRoomsCallingForHeat() == (2,)
+    assert hub.getHeatingRelayStatus() == "On"
+
+    # Local writes and targeted refreshes start a new generation too
+    calling = hub.getRoomsCallingForHeat()
+    hub.setRoomTemperature(1, 25)
+    assert hub.getRoomsCallingForHeat() is not calling
+    temperatures = hub.getRoomTemperatures()
+    mockHub.updateEntity("Room", 1, CalculatedTemperature=222)
+    hub.refreshRoom(1)
+    assert hub.getRoomTemperatures().temperatures[0] == 22.2
+    assert temperatures.temperatures[0] != 22.2
+
+
+def testRoomTemperaturesAreCopied(hub):
+    temperatures = hub.getRoomTemperatures()
+    temperatures.temperatures[0] = -1
+    assert hub.getRoomTemperatures().temperatures[0] != -1
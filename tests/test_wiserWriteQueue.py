@@ -0,0 +1,51 @@
+"""
+Tests of the optional write queue against the local mock hub
+"""
+
+import time
+
+from wiserHeatingAPI.wiserHub import wiserHub
+
+from conftest import patchCount
+
+
+def testWriteQueueCoalesces(mockHub, hub):
+    before = patchCount(mockHub, "Room")
+    hub.setRoomTemperature(4, 17)
+    perWrite = patchCount(mockHub, "Room") - before
+
+    hub.enableWriteQueue(debounce=5)
+    for temperature in (18, 19, 20):
+        hub.setRoomTemperature(1, temperature)
+    hub.setRoomTemperature(2, 21)
+    before = patchCount(mockHub, "Room")
+    results = hub.flushWrites()
+    assert set(results.values()) == {True}
+    assert patchCount(mockHub, "Room") - before == 2 * perWrite
+    assert mockHub.getEntity("Room", 1)["CurrentSetPoint"] == 200
+    assert mockHub.getEntity("Room", 2)["CurrentSetPoint"] == 210
+
+
+def testWriteQueueKeepsOrder(mockHub, hub):
+    hub.enableWriteQueue(debounce=0.05)
+    mockHub.latency = 0.3
+    hub.setRoomTemperature(1, 15)
+    time.sleep(0.15)
+    # The first flush is sending 15
+    hub.setRoomTemperature(1, 22)
+    deadline = time.monotonic() + 5
+    while mockHub.getEntity("Room", 1)["CurrentSetPoint"] != 220 and \
+            time.monotonic() < deadline:
+        time.sleep(0.05)
+    time.sleep(0.5)
+    assert mockHub.getEntity("Room", 1)["CurrentSetPoint"] == 220
+    assert hub.getRoom(1)["CurrentSetPoint"] == 220
+
+
+def testCloseFlushesWriteQueue(mockHub):
+    hub = wiserHub(mockHub.hubIP, mockHub.secret)
+    hub.enableWriteQueue(debounce=5)
+    hub.setRoomTemperature(1, 23)
+    assert mockHub.getEntity("Room", 1)["CurrentSetPoint"] != 230
+    hub.close()
+    assert mockHub.getEntity("Room", 1)["CurrentSetPoint"] == 230
@@ -0,0 +1,616 @@
+"""
+# Wiser API Facade, asyncio client
+
+AsyncWiserHub mirrors the wiserHub API on top of aiohttp so it can be used
+from an event loop without executor threads. The getters are shared with
+wiserHub through WiserHubBase and read the cached payload, the methods
+which talk to the hub are coroutines. Use it with async with, it is not a
+plain context manager.
+
+    async with AsyncWiserHub(hubIP, secret) as hub:
+        await hub.refreshData()
+        rooms = hub.getRooms()
+        await hub.setRoomMode(rooms[0].get("id"), "auto")
+
+aiohttp is an optional dependency, install it with
+pip install wiser-heating-api[async]
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+import time
+
+import aiohttp
+
+from . import wiserJson
+from .wiserMetrics import WiserMetrics, endpointOf, errorForStatus
+from .wiserProfiler import phase
+from .wiserSnapshot import WiserSnapshotStore
+from .wiserHub import (WiserHubBase, WiserHubDataNull, WiserRESTException,
+                       WiserHubAuthenticationException, WiserNotFound,
+                       WiserHubTimeoutException, WISERHUBURL,
+                       WISERNETWORKURL, WISERMODEURL, WISERROOM,
+                       WISERSCHEDULEURL, WISERSETROOMTEMP, WISERSMARTPLUGURL,
+                       WISERSMARTPLUGSURL, WISERCOLLECTIONURL, WISERENTITYURL,
+                       CANCEL_BOOST_PATCH, POOL_MAXSIZE, TIMEOUT,
+                       WRITE_WORKERS, __VERSION__)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AsyncWiserHub(WiserHubBase):
+
+    def __init__(self, hubIP, secret, session=None,
+                 poolMaxSize=POOL_MAXSIZE, timeout=TIMEOUT, metrics=None,
+                 snapshotPath=None):
+        """
+        No I/O is done here, await refreshData() before using the getters
+
+        param hubIP: IP address or hostname of the wiser hub
+        param secret: The hub secret
+        param session: Optional aiohttp.ClientSession to share between hubs
+        param poolMaxSize: Maximum keep-alive connections to the hub
+        param timeout: Timeout in seconds applied to every hub request
+        param metrics: Optional wiserMetrics.WiserMetrics to record requests
+                       in, one is created if not supplied
+        param snapshotPath: Optional file the last good payloads are saved
+                            to, see wiserSnapshot. A snapshot found there is
+                            loaded here, so the getters work before the
+                            first refresh.
+        """
+        _LOGGER.info(
+            "Async WiserHub API Initialised : Version {}".format(__VERSION__))
+        self._initData()
+        self.hubIP = hubIP
+        self.hubSecret = secret
+        self.timeout = timeout
+        self.metrics = metrics if metrics is not None else WiserMetrics()
+        self.profiler = None
+        self.history = None
+        self.headers = {'SECRET': self.hubSecret,
+                        'Content-Type': 'application/json;charset=UTF-8'}
+        self._ownsSession = session is None
+        self._poolMaxSize = poolMaxSize
+        self.session = session
+        self.snapshotStore = WiserSnapshotStore(snapshotPath) \
+            if snapshotPath is not None else None
+        if self.snapshotStore is not None:
+            self._loadSnapshot()
+
+    async def close(self):
+        """
+        Closes the pooled connections, shared sessions are left open
+        """
+        if self._ownsSession and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError("AsyncWiserHub needs async with")
+
+    def __exit__(self, *exc):
+        raise TypeError("AsyncWiserHub needs async with")
+
+    def _getSession(self):
+        # aiohttp sessions must be created inside a running event loop
+        if self.session is None:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self._poolMaxSize))
+        return self.session
+
+    async def _sendRequest(self, method, url, patchData=None):
+        """
+        Sends a request to the hub and reads the whole body
+        param method: HTTP method, GET or PATCH
+        param url: The full url
+        param patchData: JSON body for PATCH requests
+        return: tuple of status code and body bytes
+        """
+        endpoint = endpointOf(url)
+        start = time.perf_counter()
+        try:
+            async with self._getSession().request(
+                    method, url, headers=self.headers, json=patchData,
+                    timeout=aiohttp.ClientTimeout(total=self.timeout)) as resp:
+                content = await resp.read()
+        except (asyncio.TimeoutError, aiohttp.ClientError) as ex:
+            # Refreshes map timeouts, the setters raise them as they are
+            self.metrics.observe(
+                self.hubIP, endpoint, method, time.perf_counter() - start,
+                "WiserHubTimeoutException" if method == "GET" and
+                isinstance(ex, asyncio.TimeoutError) else type(ex).__name__)
+            raise
+        self.metrics.observe(self.hubIP, endpoint, method,
+                             time.perf_counter() - start,
+                             errorForStatus(resp.status, method, endpoint))
+        return resp.status, content
+
+    def checkHubData(self):
+        """
+        The async client never refreshes implicitly from a getter, it raises
+        if refreshData has not been awaited yet
+        """
+        if self.wiserHubData is None:
+            raise WiserHubDataNull(
+                "Hub data null, await refreshData() first")
+
+    def checkNetworkData(self):
+        if self.wiserNetworkData is None:
+            raise WiserHubDataNull(
+                "Network data null, await refreshData() first")
+
+    def getDeviceRoom(self, deviceId):
+        self.checkHubData()
+        return self.device2roomMap[deviceId]
+
+    async def refreshData(self):
+        """
+        Fetches the domain and network payloads concurrently
+        return: JSON Data
+        """
+        _LOGGER.info("Updating Wiser Hub Data")
+        with self._profiled("refreshData") as profile:
+            await asyncio.gather(self.__refreshHubData(profile),
+                                 self.__refreshNetworkData(profile))
+        await self.__saveSnapshot()
+        return self.wiserHubData
+
+    async def refreshHubData(self):
+        """
+        Refreshes only the domain payload
+        return: JSON Data
+        """
+        with self._profiled("refreshHubData") as profile:
+            await self.__refreshHubData(profile)
+        await self.__saveSnapshot()
+        return self.wiserHubData
+
+    async def __refreshHubData(self, profile):
+        writeSeq = self._writeSeq
+        with phase(profile, "domainHttp"):
+            content = await self._fetch(WISERHUBURL.format(self.hubIP))
+        if content is not None:
+            self._rawPayloads["domain"] = content
+            hubData = None
+            if not self._payloadUnchanged("domain", content):
+                with phase(profile, "domainDecode"):
+                    hubData = wiserJson.loads(content)
+            self._applyHubData(content, hubData, profile, writeSeq)
+
+    async def refreshNetworkData(self):
+        """
+        Refreshes only the network payload
+        return: JSON Data
+        """
+        with self._profiled("refreshNetworkData") as profile:
+            await self.__refreshNetworkData(profile)
+        await self.__saveSnapshot()
+        return self.wiserNetworkData
+
+    async def __refreshNetworkData(self, profile):
+        with phase(profile, "networkHttp"):
+            content = await self._fetch(WISERNETWORKURL.format(self.hubIP))
+        if content is not None:
+            self._rawPayloads["network"] = content
+            self._processNetworkData(content, profile)
+
+    async def __saveSnapshot(self):
+        if self.snapshotStore is not None:
+            # File I/O stays off the event loop
+            await asyncio.get_running_loop().run_in_executor(
+                None, self._saveSnapshot)
+
+    async def refreshRoom(self, roomId):
+        """
+        Fetches a single room and splices it into the cached data
+        return: The room
+        """
+        return await self._refreshEntity("Room", roomId,
+                                         WISERROOM.format(self.hubIP, roomId))
+
+    async def refreshRooms(self):
+        return await self._refreshCollection("Room")
+
+    async def refreshSmartPlug(self, smartPlugId):
+        return await self._refreshEntity(
+            "SmartPlug", smartPlugId,
+            WISERSMARTPLUGURL.format(self.hubIP, smartPlugId))
+
+    async def refreshSmartPlugs(self):
+        return await self._refreshCollection(
+            "SmartPlug", WISERSMARTPLUGSURL.format(self.hubIP))
+
+    async def refreshSchedule(self, scheduleId):
+        return await self._refreshEntity(
+            "Schedule", scheduleId,
+            WISERSCHEDULEURL.format(self.hubIP, scheduleId))
+
+    async def refreshHotwater(self):
+        return await self._refreshCollection("HotWater")
+
+    async def refreshHeatingChannels(self):
+        return await self._refreshCollection("HeatingChannel")
+
+    async def _refreshEntity(self, entityType, entityId, url=None):
+        """
+        GETs one entity of the domain payload and splices it in, see
+        wiserHub._refreshEntity
+        """
+        self.checkHubData()
+        writeSeq = self._writeSeq
+        content = await self._fetch(url or WISERENTITYURL.format(
+            self.hubIP, entityType, entityId))
+        if content is not None:
+            self._spliceEntity(entityType, wiserJson.loads(content),
+                               writeSeq)
+        return (self.entityIndex.get(entityType) or {}).get(entityId)
+
+    async def _refreshCollection(self, entityType, url=None):
+        """
+        GETs one collection of the domain payload and splices it in, see
+        wiserHub._refreshCollection
+        """
+        self.checkHubData()
+        writeSeq = self._writeSeq
+        content = await self._fetch(url or WISERCOLLECTIONURL.format(
+            self.hubIP, entityType))
+        if content is not None:
+            self._spliceCollection(entityType, wiserJson.loads(content),
+                                   writeSeq)
+        return self.wiserHubData.get(entityType)
+
+    async def _fetch(self, url):
+        """
+        GETs a payload, mapping errors like wiserHub.refreshData does
+        return: body bytes, None on connection errors
+        """
+        try:
+            status, content = await self._sendRequest("GET", url)
+        except asyncio.TimeoutError:
+            _LOGGER.debug(
+                "Connection timed out trying to update from Wiser Hub")
+            raise WiserHubTimeoutException("The connection timed out.")
+        except aiohttp.ClientConnectionError:
+            _LOGGER.debug("Connection error trying to update from Wiser Hub")
+            return None
+
+        if status == 401:
+            raise WiserHubAuthenticationException(
+                "Authentication error.  Check secret key.")
+        elif status == 404:
+            raise WiserRESTException("Not Found.")
+        elif status >= 400:
+            raise WiserRESTException("Unknown Error.")
+        return content
+
+    async def _patch(self, url, patchData):
+        status, content = await self._sendRequest("PATCH", url, patchData)
+        return status, content.decode("utf-8", "replace")
+
+    async def setHotwaterMode(self, mode):
+        """
+          Switch Hot Water on or off manually, or reset to 'Auto' (schedule).
+          'mode' can be "on", "off" or "auto".
+        """
+        _url, patchData = self._hotwaterModeRequest(mode)
+        status, text = await self._patch(_url, patchData)
+        if status != 200:
+            _LOGGER.debug("Set DHW Response code = {}".format(status))
+            raise WiserRESTException(
+                "Error setting hot water mode to {}, error {} {}".
+                    format(mode.lower(), status, text))
+        self._recordWrite("HotWater", self.wiserHubData.get("HotWater")[0].
+                          get("id"), patchData)
+        return True
+
+    async def setRoomTemperature(self, roomId, temperature):
+        """
+        Sets the room temperature
+        param roomId:  The Room ID
+        param temperature:  The temperature in celcius from 5 to 30, -20 for Off
+        """
+        patchData = self._roomTemperaturePatchData(temperature)
+        status, text = await self._patch(
+            WISERSETROOMTEMP.format(self.hubIP, roomId), patchData)
+        if status != 200:
+            _LOGGER.error(
+                "Set Room {} Temperature to = {} resulted in {}".format(
+                    roomId, temperature, status))
+            raise WiserRESTException(
+                "Error setting temperature, error {} ".format(text))
+        self._recordWrite("Room", roomId, patchData)
+
+    async def setRoomMode(self, roomId, mode, boost_temp=20,
+                          boost_temp_time=30):
+        """
+        Set the Room Mode, this can be Auto, Manual, off or Boost
+
+        param roomId: RoomId
+        param mode:  Mode (auto, manual off, or boost)
+        param boost_temp:  If boosting enter the temperature here in C
+        param boost_temp_time:  How long to boost for in minutes
+        """
+        patchData = self._roomModePatchData(roomId, mode, boost_temp,
+                                            boost_temp_time)
+        url = WISERROOM.format(self.hubIP, roomId)
+
+        # if not a boost operation cancel any current boost
+        if mode.lower() != "boost":
+            status, text = await self._patch(url, CANCEL_BOOST_PATCH)
+            if status != 200:
+                _LOGGER.error(
+                    "Cancelling boost resulted in {}".format(status))
+                raise WiserRESTException(
+                    "Error cancelling boost {} ".format(mode))
+            self._recordWrite("Room", roomId, CANCEL_BOOST_PATCH)
+
+        status, text = await self._patch(url, patchData)
+        if status != 200:
+            _LOGGER.error("Set Room {} to Mode {} resulted in {}".format(
+                roomId, mode, status))
+            raise WiserRESTException(
+                "Error setting mode to {}, error {} ".format(mode, text))
+        self._recordWrite("Room", roomId, patchData)
+
+    async def setRoomTemperatures(self, roomTemperatures,
+                                  maxWorkers=WRITE_WORKERS):
+        """
+        Sets the temperature of several rooms concurrently, see
+        wiserHub.setRoomTemperatures
+        return: dict of roomId to True or the exception raised for that room
+        """
+        roomPatches = {roomId: [self._roomTemperaturePatchData(temperature)]
+                       for roomId, temperature in roomTemperatures.items()}
+        return await self._sendRoomPatchesBatch(roomPatches, maxWorkers)
+
+    async def setRoomModes(self, roomModes, boost_temp=20, boost_temp_time=30,
+                           maxWorkers=WRITE_WORKERS):
+        """
+        Sets the mode of several rooms concurrently, see wiserHub.setRoomModes
+        return: dict of roomId to True or the exception raised for that room
+        """
+        roomPatches = self._roomModesPatches(roomModes, boost_temp,
+                                             boost_temp_time)
+        return await self._sendRoomPatchesBatch(roomPatches, maxWorkers)
+
+    async def _sendRoomPatchesBatch(self, roomPatches, maxWorkers):
+        semaphore = asyncio.Semaphore(maxWorkers)
+
+        async def sendRoomPatches(roomId, patches):
+            async with semaphore:
+                for patchData in patches:
+                    status, text = await self._patch(
+                        WISERROOM.format(self.hubIP, roomId), patchData)
+                    if status != 200:
+                        raise WiserRESTException(
+                            "Error setting room {}, error {} {}".format(
+                                roomId, status, text))
+                    self._recordWrite("Room", roomId, patchData)
+                return True
+
+        roomIds = list(roomPatches)
+        results = await asyncio.gather(
+            *(sendRoomPatches(roomId, roomPatches[roomId])
+              for roomId in roomIds), return_exceptions=True)
+        return dict(zip(roomIds, results))
+
+    async def setSmartPlugState(self, smartPlugId, smartPlugState):
+        patchData = self._smartPlugStatePatchData(smartPlugState)
+        status, text = await self._patch(
+            WISERSMARTPLUGURL.format(self.hubIP, smartPlugId), patchData)
+        self._checkSmartPlugResponse(smartPlugId, status, text)
+        self._recordWrite("SmartPlug", smartPlugId, patchData)
+
+    async def setSmartPlugMode(self, smartPlugId, smartPlugMode):
+        patchData = self._smartPlugModePatchData(smartPlugMode)
+        status, text = await self._patch(
+            WISERSMARTPLUGURL.format(self.hubIP, smartPlugId), patchData)
+        self._checkSmartPlugResponse(smartPlugId, status, text)
+        self._recordWrite("SmartPlug", smartPlugId, patchData)
+
+    async def setSystemSwitch(self, switch, mode=False):
+        """
+        Sets a system switch
+        :param switch: Name of Switch
+        :param mode: Value of mode
+        """
+        status, text = await self._patch(
+            (WISERHUBURL + "System").format(self.hubIP), {switch: mode})
+        if status != 200:
+            _LOGGER.debug("Set {} Response code = {}".format(switch, status))
+            raise WiserRESTException(
+                "Error setting {} , error {} {}".format(switch, status, text))
+        self._recordWrite("System", None, {switch: mode})
+
+    async def setHomeAwayMode(self, mode, temperature=10):
+        """
+        Sets default Home or Away mode
+
+        param mode: HOME   | AWAY
+        param temperature: Temperature between 5-30C or -20 for OFF
+        """
+        patchData = self._homeAwayPatchData(mode, temperature)
+        status, text = await self._patch(WISERMODEURL.format(self.hubIP),
+                                         patchData)
+        if status != 200:
+            _LOGGER.debug("Set Home/Away Response code = {}".format(status))
+            raise ValueError("Error setting Home/Away , error {} {}".format(
+                status, text))
+
+    async def setRoomSchedule(self, roomId, scheduleData: dict,
+                              force=False):
+        """
+        Sets Room Schedule, only the days which differ from the cached
+        schedule are sent and nothing is sent when none do
+
+        param roomId:
+        param scheduleData: json data for schedule
+        param force: Send every day of scheduleData whatever the cache holds
+        return: True if the schedule was written, False if it was unchanged
+        """
+        scheduleId = self.getRoom(roomId).get("ScheduleId")
+        if scheduleId is None:
+            raise WiserNotFound("No schedule found that matches roomId")
+        patchData = self._schedulePatchData(scheduleId, scheduleData, force)
+        if not patchData:
+            return False
+        await self.__sendSchedulePatch(roomId, scheduleId, patchData)
+        return True
+
+    async def __sendSchedulePatch(self, roomId, scheduleId, patchData):
+        status, text = await self._patch(
+            WISERSCHEDULEURL.format(self.hubIP, scheduleId), patchData)
+        if status != 200:
+            _LOGGER.debug("Set Schedule Response code = {}".format(status))
+            raise WiserRESTException(
+                "Error setting schedule for room {} , error {} {}".format(
+                    roomId, status, text))
+        self._recordWrite("Schedule", scheduleId, patchData)
+        return True
+
+    async def setRoomScheduleFromFile(self, roomId, scheduleFile: str):
+        """
+        Sets Room Schedule from a JSON file
+
+        param roomId:
+        param scheduleFile: path of the schedule file
+        """
+        if not os.path.exists(scheduleFile):
+            raise FileNotFoundError("Schedule file, {}, not found.".format(
+                os.path.abspath(scheduleFile)))
+        try:
+            with open(scheduleFile, 'r') as f:
+                scheduleData = json.load(f)
+        except:
+            raise Exception("Error reading file {}".format(scheduleFile))
+        return await self.setRoomSchedule(roomId, scheduleData)
+
+    async def copyRoomSchedule(self, fromRoomId, toRoomId):
+        """
+        Copies Room Schedule from one room to another
+
+        param fromRoomId:
+        param toRoomId:
+        return: True if the schedule was written, False if it was unchanged
+        """
+        return await self.setRoomSchedule(toRoomId,
+                                          self.getRoomSchedule(fromRoomId))
+
+    async def copyRoomSchedules(self, fromRoomId, toRoomIds,
+                                maxWorkers=WRITE_WORKERS):
+        """
+        Copies the schedule of one room to many rooms. Rooms sharing a
+        schedule are written once and the writes are sent concurrently.
+
+        param fromRoomId: Room to copy the schedule from
+        param toRoomIds: Iterable of rooms to copy it to
+        param maxWorkers: Maximum number of writes in flight
+        return: dict of room id to True if its schedule was written, False
+                if it already matched, or the exception raised for it
+        """
+        scheduleData = self.getRoomSchedule(fromRoomId)
+        return await self._setSchedulesBatch(
+            {roomId: scheduleData for roomId in toRoomIds}, maxWorkers)
+
+    async def _setSchedulesBatch(self, roomSchedules, maxWorkers):
+        """
+        Writes schedules to rooms, once per distinct ScheduleId
+        param roomSchedules: dict of room id to schedule data
+        return: dict of room id to True, False or the exception raised
+        """
+        sharedRooms, results = self._groupRoomsBySchedule(roomSchedules)
+        semaphore = asyncio.Semaphore(maxWorkers)
+
+        async def setSchedule(scheduleId, roomId):
+            patchData = self._schedulePatchData(scheduleId,
+                                                roomSchedules[roomId])
+            if not patchData:
+                return False
+            async with semaphore:
+                return await self.__sendSchedulePatch(roomId, scheduleId,
+                                                      patchData)
+
+        return self.__fanOut(sharedRooms, results, await asyncio.gather(
+            *(setSchedule(scheduleId, roomIds[0])
+              for scheduleId, roomIds in sharedRooms.items()),
+            return_exceptions=True))
+
+    @staticmethod
+    def __fanOut(sharedRooms, results, scheduleResults):
+        # One result per schedule, shared by every room using it
+        for roomIds, result in zip(sharedRooms.values(), scheduleResults):
+            for roomId in roomIds:
+                results[roomId] = result
+        return results
+
+    async def exportRoomSchedules(self, directory, roomIds=None,
+                                  maxWorkers=WRITE_WORKERS):
+        """
+        Writes the cached schedule of each room to directory as
+        room<id>schedule.json, see wiserHub.exportRoomSchedules
+
+        return: dict of room id to the file written, or the exception
+                raised for it
+        """
+        self.checkHubData()
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            None, functools.partial(os.makedirs, directory, exist_ok=True))
+        if roomIds is None:
+            roomIds = [room.get("id") for room in self.getRooms() or ()]
+        roomIds = list(roomIds)
+        semaphore = asyncio.Semaphore(maxWorkers)
+
+        async def export(roomId):
+            async with semaphore:
+                return await loop.run_in_executor(
+                    None, self._exportRoomSchedule, directory, roomId)
+
+        return dict(zip(roomIds, await asyncio.gather(
+            *(export(roomId) for roomId in roomIds),
+            return_exceptions=True)))
+
+    async def importRoomSchedules(self, directory, roomIds=None,
+                                  maxWorkers=WRITE_WORKERS):
+        """
+        Sets room schedules from the room<id>schedule.json files of a
+        directory, see wiserHub.importRoomSchedules. Files are read in the
+        default executor while other schedules are being written.
+
+        return: dict of room id to True if its schedule was written, False
+                if it already matched, or the exception raised for it
+        """
+        loop = asyncio.get_running_loop()
+        roomFiles = await loop.run_in_executor(
+            None, self._scheduleFiles, directory, roomIds)
+        sharedRooms, results = self._groupRoomsBySchedule(roomFiles)
+        semaphore = asyncio.Semaphore(maxWorkers)
+
+        async def importSchedule(scheduleId, roomIds):
+            async with semaphore:
+                roomId = roomIds[0]
+                scheduleData = await loop.run_in_executor(
+                    None, self._readScheduleFile, roomFiles[roomId])
+                await loop.run_in_executor(
+                    None, self._checkSharedScheduleFiles, scheduleId,
+                    scheduleData,
+                    [(other, roomFiles[other]) for other in roomIds[1:]])
+                patchData = self._schedulePatchData(scheduleId, scheduleData)
+                if not patchData:
+                    return False
+                return await self.__sendSchedulePatch(roomId, scheduleId,
+                                                      patchData)
+
+        return self.__fanOut(sharedRooms, results, await asyncio.gather(
+            *(importSchedule(scheduleId, roomIds)
+              for scheduleId, roomIds in sharedRooms.items()),
+            return_exceptions=True))
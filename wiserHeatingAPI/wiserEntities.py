@@ -0,0 +1,214 @@
+"""
+# Wiser API Facade, typed entity views
+
+Optional typed views over the raw hub payload. Each view wraps the raw dict
+of one entity and decodes a field only the first time it is read,
+temperatures come back in degrees C like the setters take them.
+
+    room = hub.getEntity("Room", 1)
+    print(room.name, room.calculatedTemperature)
+
+The views use __slots__, once compact() is called every field is decoded
+and the raw dict is released, which makes them cheap to keep around for
+many snapshots.
+"""
+
+
+# What the hub reports for a temperature it has no reading of
+NO_READING = -32768
+
+
+def fromWiserTemp(temp):
+    """
+    Converts from wiser hub temperature format to decimal value
+    param temp: The wiser temperature to convert
+    return: Float, None if the hub has no reading
+    """
+    if temp <= NO_READING:
+        return None
+    return round(temp / 10, 1)
+
+
+def _toTuple(values):
+    return tuple(values)
+
+
+def _toSetPoints(day):
+    # Heating schedules hold DegreesC, smart plug schedules hold State
+    return tuple(
+        (setPoint.get("Time"),
+         fromWiserTemp(setPoint["DegreesC"]) if "DegreesC" in setPoint
+         else setPoint.get("State"))
+        for setPoint in day.get("SetPoints", ()))
+
+
+class Field:
+    """
+    Lazily decoded field, the decoded value is cached in the slot named
+    after the attribute with a leading underscore
+    """
+    __slots__ = ("key", "convert", "slot")
+
+    def __init__(self, key, convert=None):
+        self.key = key
+        self.convert = convert
+        self.slot = None
+
+    def __set_name__(self, owner, name):
+        self.slot = owner.__dict__["_" + name]
+
+    def __get__(self, entity, owner=None):
+        if entity is None:
+            return self
+        try:
+            return self.slot.__get__(entity, owner)
+        except AttributeError:
+            pass
+        value = entity._data.get(self.key)
+        if value is not None and self.convert is not None:
+            value = self.convert(value)
+        self.slot.__set__(entity, value)
+        return value
+
+
+class WiserEntity:
+    __slots__ = ("_data",)
+
+    def __init__(self, data):
+        self._data = data
+
+    @classmethod
+    def fields(cls):
+        """
+        return: names of the typed fields of this entity
+        """
+        return [name for klass in reversed(cls.__mro__)
+                for name, value in vars(klass).items()
+                if isinstance(value, Field)]
+
+    @property
+    def raw(self):
+        """
+        The raw payload dict, None once compact() has been called
+        """
+        return self._data
+
+    def compact(self):
+        """
+        Decodes every field and drops the reference to the raw payload
+        return: self
+        """
+        if self._data is not None:
+            for name in self.fields():
+                getattr(self, name)
+            self._data = None
+        return self
+
+    def __repr__(self):
+        return "{}(id={})".format(type(self).__name__, self.id)
+
+
+class Room(WiserEntity):
+    __slots__ = ("_id", "_name", "_roomStatId", "_smartValveIds",
+                 "_scheduleId", "_heatingChannelId", "_mode",
+                 "_calculatedTemperature", "_currentSetPoint",
+                 "_scheduledSetPoint", "_setpointOrigin",
+                 "_percentageDemand", "_overrideType")
+    id = Field("id")
+    name = Field("Name")
+    roomStatId = Field("RoomStatId")
+    smartValveIds = Field("SmartValveIds", _toTuple)
+    scheduleId = Field("ScheduleId")
+    heatingChannelId = Field("HeatingChannelId")
+    mode = Field("Mode")
+    calculatedTemperature = Field("CalculatedTemperature", fromWiserTemp)
+    currentSetPoint = Field("CurrentSetPoint", fromWiserTemp)
+    scheduledSetPoint = Field("ScheduledSetPoint", fromWiserTemp)
+    setpointOrigin = Field("SetpointOrigin")
+    percentageDemand = Field("PercentageDemand")
+    overrideType = Field("OverrideType")
+
+
+class Device(WiserEntity):
+    __slots__ = ("_id", "_productType", "_modelIdentifier",
+                 "_serialNumber", "_firmwareVersion", "_signalStrength",
+                 "_batteryVoltage", "_batteryLevel")
+    id = Field("id")
+    productType = Field("ProductType")
+    modelIdentifier = Field("ModelIdentifier")
+    serialNumber = Field("SerialNumber")
+    firmwareVersion = Field("ActiveFirmwareVersion")
+    signalStrength = Field("DisplayedSignalStrength")
+    # Battery voltage is reported in tenths of a volt like temperatures
+    batteryVoltage = Field("BatteryVoltage", fromWiserTemp)
+    batteryLevel = Field("BatteryLevel")
+
+
+class RoomStat(WiserEntity):
+    __slots__ = ("_id", "_setPoint", "_measuredTemperature",
+                 "_measuredHumidity")
+    id = Field("id")
+    setPoint = Field("SetPoint", fromWiserTemp)
+    measuredTemperature = Field("MeasuredTemperature", fromWiserTemp)
+    measuredHumidity = Field("MeasuredHumidity")
+
+
+class SmartPlug(WiserEntity):
+    __slots__ = ("_id", "_name", "_mode", "_outputState", "_manualState",
+                 "_awayAction", "_scheduleId")
+    id = Field("id")
+    name = Field("Name")
+    mode = Field("Mode")
+    outputState = Field("OutputState")
+    manualState = Field("ManualState")
+    awayAction = Field("AwayAction")
+    scheduleId = Field("ScheduleId")
+
+
+class HotWater(WiserEntity):
+    __slots__ = ("_id", "_mode", "_waterHeatingState",
+                 "_hotWaterRelayState", "_scheduleId", "_overrideType")
+    id = Field("id")
+    mode = Field("Mode")
+    waterHeatingState = Field("WaterHeatingState")
+    hotWaterRelayState = Field("HotWaterRelayState")
+    scheduleId = Field("ScheduleId")
+    overrideType = Field("OverrideType")
+
+
+class HeatingChannel(WiserEntity):
+    __slots__ = ("_id", "_name", "_roomIds", "_heatingRelayState",
+                 "_percentageDemand", "_demandOnOffOutput")
+    id = Field("id")
+    name = Field("Name")
+    roomIds = Field("RoomIds", _toTuple)
+    heatingRelayState = Field("HeatingRelayState")
+    percentageDemand = Field("PercentageDemand")
+    demandOnOffOutput = Field("DemandOnOffOutput")
+
+
+class Schedule(WiserEntity):
+    __slots__ = ("_id", "_type", "_monday", "_tuesday", "_wednesday",
+                 "_thursday", "_friday", "_saturday", "_sunday")
+    id = Field("id")
+    type = Field("Type")
+    # Each day is a tuple of (HHMM time, temperature C or plug state)
+    monday = Field("Monday", _toSetPoints)
+    tuesday = Field("Tuesday", _toSetPoints)
+    wednesday = Field("Wednesday", _toSetPoints)
+    thursday = Field("Thursday", _toSetPoints)
+    friday = Field("Friday", _toSetPoints)
+    saturday = Field("Saturday", _toSetPoints)
+    sunday = Field("Sunday", _toSetPoints)
+
+
+# Payload collection name -> view class
+ENTITY_CLASSES = {
+    "Room": Room,
+    "Device": Device,
+    "RoomStat": RoomStat,
+    "SmartPlug": SmartPlug,
+    "HotWater": HotWater,
+    "HeatingChannel": HeatingChannel,
+    "Schedule": Schedule,
+}
@@ -0,0 +1,86 @@
+"""
+# Wiser API Facade, change events
+
+Successive domain payloads are compared per entity id and every change of a
+watched field becomes a WiserChangeEvent. Subscribe to them on a hub with
+
+    def onChange(event):
+        print(event.eventType, event.entityId, event.oldValue, event.newValue)
+
+    unsubscribe = hub.subscribe(onChange, [ROOM_TEMPERATURE_CHANGED])
+
+Values are passed as found in the hub payload, temperatures are in tenths
+of a degree.
+"""
+
+import collections
+
+ROOM_TEMPERATURE_CHANGED = "room_temperature_changed"
+ROOM_SETPOINT_CHANGED = "room_setpoint_changed"
+ROOM_MODE_CHANGED = "room_mode_changed"
+DEVICE_BATTERY_CHANGED = "device_battery_changed"
+DEVICE_SIGNAL_CHANGED = "device_signal_changed"
+ROOMSTAT_HUMIDITY_CHANGED = "roomstat_humidity_changed"
+SMARTPLUG_OUTPUT_CHANGED = "smartplug_output_changed"
+SMARTPLUG_MODE_CHANGED = "smartplug_mode_changed"
+HEATING_RELAY_CHANGED = "heating_relay_changed"
+HOTWATER_STATE_CHANGED = "hotwater_state_changed"
+ENTITY_ADDED = "entity_added"
+ENTITY_REMOVED = "entity_removed"
+
+# Collection -> field -> event type raised when that field changes
+WATCHED_FIELDS = {
+    "Room": {"CalculatedTemperature": ROOM_TEMPERATURE_CHANGED,
+             "CurrentSetPoint": ROOM_SETPOINT_CHANGED,
+             "Mode": ROOM_MODE_CHANGED},
+    "Device": {"BatteryVoltage": DEVICE_BATTERY_CHANGED,
+               "BatteryLevel": DEVICE_BATTERY_CHANGED,
+               "DisplayedSignalStrength": DEVICE_SIGNAL_CHANGED},
+    "RoomStat": {"MeasuredHumidity": ROOMSTAT_HUMIDITY_CHANGED},
+    "SmartPlug": {"OutputState": SMARTPLUG_OUTPUT_CHANGED,
+                  "Mode": SMARTPLUG_MODE_CHANGED},
+    "HeatingChannel": {"HeatingRelayState": HEATING_RELAY_CHANGED},
+    "HotWater": {"WaterHeatingState": HOTWATER_STATE_CHANGED},
+}
+
+# field is None and the values hold the whole entity for ENTITY_ADDED and
+# ENTITY_REMOVED
+WiserChangeEvent = collections.namedtuple(
+    "WiserChangeEvent",
+    ["eventType", "entityType", "entityId", "field", "oldValue", "newValue"])
+
+
+def diffEntityIndexes(oldIndex, newIndex):
+    """
+    Compares two entity indexes, as built by wiserHub on each refresh
+
+    param oldIndex: dict of collection name to dict of id to entity
+    param newIndex: dict of collection name to dict of id to entity
+    return: list of WiserChangeEvent
+    """
+    events = []
+    for entityType, fields in WATCHED_FIELDS.items():
+        oldEntities = oldIndex.get(entityType) or {}
+        newEntities = newIndex.get(entityType) or {}
+        for entityId, newEntity in newEntities.items():
+            oldEntity = oldEntities.get(entityId)
+            if oldEntity is None:
+                events.append(WiserChangeEvent(
+                    ENTITY_ADDED, entityType, entityId, None, None,
+                    newEntity))
+                continue
+            if oldEntity is newEntity:
+                continue
+            for field, eventType in fields.items():
+                oldValue = oldEntity.get(field)
+                newValue = newEntity.get(field)
+                if oldValue != newValue:
+                    events.append(WiserChangeEvent(
+                        eventType, entityType, entityId, field, oldValue,
+                        newValue))
+        for entityId, oldEntity in oldEntities.items():
+            if entityId not in newEntities:
+                events.append(WiserChangeEvent(
+                    ENTITY_REMOVED, entityType, entityId, None, oldEntity,
+                    None))
+    return events
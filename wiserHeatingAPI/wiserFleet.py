@@ -0,0 +1,178 @@
+"""
+# Wiser API Facade, fleet polling
+
+WiserFleet refreshes many hubs in parallel with a bounded number of worker
+threads. Each hub keeps its own wiserHub instance, all of them share one
+pooled session. A sweep waits at most sweepTimeout seconds for each hub,
+counted from when a worker starts refreshing it. A hub which is still busy
+after that is reported as timed out and is skipped by the next sweeps until
+its request returns, so one dead hub never stalls the others. A hub which
+cannot be reached is reported with an error, not with its cached data.
+All hubs record their requests in the fleet's WiserMetrics, export them
+with fleet.metrics.toPrometheus().
+
+    fleet = WiserFleet([("192.168.0.22", "secret"), ...], maxWorkers=32)
+    for hubIP, result in fleet.refreshAll().items():
+        if result.error is not None:
+            ...
+"""
+
+import collections
+import concurrent.futures
+import logging
+import threading
+import time
+
+from .wiserHub import (wiserHub, WiserHubTimeoutException,
+                       WiserHubConnectionException, POOL_MAXSIZE, TIMEOUT)
+from .wiserMetrics import WiserMetrics
+
+_LOGGER = logging.getLogger(__name__)
+
+# Default number of hubs refreshed at the same time
+FLEET_MAX_WORKERS = 16
+
+# Result of refreshing one hub, data is the domain payload and error the
+# exception raised, exactly one of them is set
+WiserFleetResult = collections.namedtuple(
+    "WiserFleetResult", ["hubIP", "data", "error", "elapsed"])
+
+
+class WiserFleet:
+
+    def __init__(self, hubs, maxWorkers=FLEET_MAX_WORKERS, timeout=TIMEOUT,
+                 sweepTimeout=None):
+        """
+        param hubs: Iterable of (hubIP, secret) pairs
+        param maxWorkers: Maximum number of hubs refreshed concurrently
+        param timeout: Request timeout in seconds for each hub
+        param sweepTimeout: Maximum seconds a sweep waits for a single hub
+                            once its refresh started, defaults to twice the
+                            request timeout as a refresh does two requests
+        """
+        self.hubSecrets = collections.OrderedDict(hubs)
+        self.timeout = timeout
+        self.sweepTimeout = sweepTimeout if sweepTimeout is not None \
+            else 2 * timeout
+        self.session = wiserHub.createSession(
+            poolConnections=max(len(self.hubSecrets), 1),
+            poolMaxSize=POOL_MAXSIZE)
+        self.metrics = WiserMetrics()
+        self.hubs = {}
+        self._busy = {}
+        self._lock = threading.Lock()
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=maxWorkers, thread_name_prefix="wiserFleet")
+        # Network payloads are fetched here, at most maxWorkers hubs refresh
+        # at once so a slow hub never waits for another one's fetch
+        self._fetchExecutor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=maxWorkers, thread_name_prefix="wiserFleetFetch")
+
+    def close(self):
+        """
+        Stops the worker threads and closes the shared session
+        """
+        self._executor.shutdown(wait=False)
+        self._fetchExecutor.shutdown(wait=False)
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def getHub(self, hubIP):
+        """
+        Returns the wiserHub for a hub, None until its first refresh has run
+        """
+        return self.hubs.get(hubIP)
+
+    def _refreshHub(self, hubIP, started):
+        start = time.monotonic()
+        # The sweep measures this hub's deadline from here
+        started[hubIP] = start
+        try:
+            hub = self.hubs.get(hubIP)
+            if hub is None:
+                # The constructor issues the first refresh
+                hub = wiserHub(hubIP, self.hubSecrets[hubIP],
+                               session=self.session, timeout=self.timeout,
+                               metrics=self.metrics,
+                               fetchExecutor=self._fetchExecutor)
+                self.hubs[hubIP] = hub
+                data = hub.wiserHubData
+                refreshed = data is not None
+            else:
+                lastRefreshTime = hub.lastRefreshTime
+                data = hub.refreshData()
+                refreshed = hub.lastRefreshTime != lastRefreshTime
+            if not refreshed:
+                # Refreshes log connection errors and keep serving the
+                # cached data, if any, the hub did not answer
+                raise WiserHubConnectionException(
+                    "Hub {} could not be refreshed".format(hubIP))
+            return WiserFleetResult(hubIP, data, None,
+                                    time.monotonic() - start)
+        except Exception as ex:
+            _LOGGER.debug("Refreshing hub {} failed: {}".format(hubIP, ex))
+            return WiserFleetResult(hubIP, None, ex,
+                                    time.monotonic() - start)
+
+    def refreshAll(self, hubIPs=None):
+        """
+        Refreshes every hub concurrently
+
+        param hubIPs: Optional subset of hubs to refresh
+        return: dict of hubIP to WiserFleetResult
+        """
+        hubIPs = list(self.hubSecrets if hubIPs is None else hubIPs)
+        results = {}
+        futures = {}
+        # hubIP -> time.monotonic() a worker started refreshing it
+        started = {}
+        with self._lock:
+            for hubIP in hubIPs:
+                future = self._busy.get(hubIP)
+                if future is not None and not future.done():
+                    # Previous refresh of this hub has not returned yet
+                    results[hubIP] = WiserFleetResult(
+                        hubIP, None, WiserHubTimeoutException(
+                            "Hub {} is still busy with an earlier "
+                            "refresh".format(hubIP)), 0.0)
+                    continue
+                future = self._executor.submit(self._refreshHub, hubIP,
+                                               started)
+                self._busy[hubIP] = future
+                futures[future] = hubIP
+
+        pending = dict(futures)
+        while pending:
+            now = time.monotonic()
+            # Hubs still queued for a worker have no deadline yet, look
+            # again at least every sweepTimeout to start their clock
+            wait = self.sweepTimeout
+            for future, hubIP in list(pending.items()):
+                if future.done():
+                    results[hubIP] = future.result()
+                    del pending[future]
+                    continue
+                start = started.get(hubIP)
+                if start is None:
+                    continue
+                # The deadline is per hub, measured from its own start
+                remaining = start + self.sweepTimeout - now
+                if remaining <= 0:
+                    results[hubIP] = WiserFleetResult(
+                        hubIP, None, WiserHubTimeoutException(
+                            "Hub {} did not answer within {}s".format(
+                                hubIP, self.sweepTimeout)),
+                        now - start)
+                    del pending[future]
+                else:
+                    wait = min(wait, remaining)
+            if pending:
+                concurrent.futures.wait(
+                    pending, timeout=wait,
+                    return_when=concurrent.futures.FIRST_COMPLETED)
+        return {hubIP: results[hubIP] for hubIP in hubIPs}
@@ -0,0 +1,184 @@
+"""
+# Wiser API Facade, reading history
+
+WiserHistory keeps the recent readings of every room in fixed size ring
+buffers instead of a copy of the payload per poll. Each refresh of the
+domain payload appends one sample: per room the calculated temperature,
+the current set point and the humidity of its roomstat, and for the whole
+system the heating and hot water relay states.
+
+    history = hub.enableHistory(capacity=1440)
+    ...
+    series = history.getRoomHistory(roomId, start=time.time() - 3600)
+    print(series.timestamps[-1], series.temperature[-1])
+
+Temperatures are held as the hub's tenths of a degree in 16 bit arrays,
+a sample costs 6 bytes per room. Queries return array slices in time order,
+temperatures converted to degrees C with NaN where there was no reading.
+"""
+
+import array
+import bisect
+import collections
+import math
+import threading
+
+# Default number of samples kept, a day at one refresh per minute
+HISTORY_CAPACITY = 1440
+
+# Stored for readings missing from a sample, also what the hub reports for
+# a room without a temperature reading
+MISSING = -32768
+
+WiserRoomHistory = collections.namedtuple(
+    "WiserRoomHistory", ["timestamps", "temperature", "setPoint", "humidity"])
+
+# Relay states are 1 for On, 0 for Off and -1 when unknown
+WiserRelayHistory = collections.namedtuple(
+    "WiserRelayHistory", ["timestamps", "heatingRelay", "hotWaterRelay"])
+
+
+def _relayState(state):
+    if state is None:
+        return -1
+    return 1 if state == "On" else 0
+
+
+def _reading(value):
+    if value is None or not -32768 <= value <= 32767:
+        return MISSING
+    return int(value)
+
+
+class WiserHistory:
+
+    def __init__(self, capacity=HISTORY_CAPACITY):
+        """
+        param capacity: Number of samples kept, older samples are overwritten
+        """
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._timestamps = array.array("d", bytes(8 * capacity))
+        self._heatingRelay = self._newSeries("b", -1)
+        self._hotWaterRelay = self._newSeries("b", -1)
+        # roomId -> (temperature, setPoint, humidity) arrays
+        self._rooms = {}
+        # Slot the next sample is written to and number of samples held
+        self._next = 0
+        self._size = 0
+
+    def _newSeries(self, typecode, fill):
+        return array.array(typecode, [fill]) * self.capacity
+
+    def __len__(self):
+        return self._size
+
+    def record(self, hubData, entityIndex, timestamp):
+        """
+        Appends one sample taken from a domain payload
+
+        param hubData: Decoded domain JSON
+        param entityIndex: The id indexes built from it
+        param timestamp: time.time() of the sample
+        """
+        roomStats = entityIndex.get("RoomStat") or {}
+        heatingRelay = -1
+        for channel in hubData.get("HeatingChannel") or ():
+            state = _relayState(channel.get("HeatingRelayState"))
+            heatingRelay = max(heatingRelay, state)
+        hotWater = hubData.get("HotWater") or ()
+        hotWaterRelay = _relayState(
+            hotWater[0].get("WaterHeatingState") if hotWater else None)
+
+        with self._lock:
+            slot = self._next
+            self._timestamps[slot] = timestamp
+            self._heatingRelay[slot] = heatingRelay
+            self._hotWaterRelay[slot] = hotWaterRelay
+            seen = set()
+            for room in hubData.get("Room") or ():
+                roomId = room.get("id")
+                series = self._rooms.get(roomId)
+                if series is None:
+                    series = tuple(self._newSeries("h", MISSING)
+                                   for _ in range(3))
+                    self._rooms[roomId] = series
+                roomStat = roomStats.get(room.get("RoomStatId")) or {}
+                series[0][slot] = _reading(room.get("CalculatedTemperature"))
+                series[1][slot] = _reading(room.get("CurrentSetPoint"))
+                series[2][slot] = _reading(roomStat.get("MeasuredHumidity"))
+                seen.add(roomId)
+            for roomId, series in self._rooms.items():
+                if roomId not in seen:
+                    for values in series:
+                        values[slot] = MISSING
+            self._next = (slot + 1) % self.capacity
+            self._size = min(self._size + 1, self.capacity)
+
+    def getRoomIds(self):
+        """
+        return: ids of the rooms seen in any sample
+        """
+        with self._lock:
+            return list(self._rooms)
+
+    def getTimestamps(self, start=None, end=None):
+        """
+        return: array of the sample times between start and end, oldest first
+        """
+        with self._lock:
+            timestamps, (low, high) = self.__range(start, end)
+        return timestamps[low:high]
+
+    def getRoomHistory(self, roomId, start=None, end=None):
+        """
+        Readings of one room
+
+        param roomId: The room id
+        param start: Optional time.time() of the oldest sample wanted
+        param end: Optional time.time() of the newest sample wanted
+        return: WiserRoomHistory of arrays, temperatures in degrees C
+        """
+        with self._lock:
+            series = self._rooms.get(roomId)
+            if series is None:
+                raise KeyError("No history for room {}".format(roomId))
+            timestamps, (low, high) = self.__range(start, end)
+            temperature, setPoint, humidity = (
+                self.__ordered(values)[low:high] for values in series)
+        return WiserRoomHistory(
+            timestamps[low:high],
+            array.array("d", [math.nan if value == MISSING else value / 10
+                              for value in temperature]),
+            array.array("d", [math.nan if value == MISSING else value / 10
+                              for value in setPoint]),
+            array.array("d", [math.nan if value == MISSING else value
+                              for value in humidity]))
+
+    def getRelayHistory(self, start=None, end=None):
+        """
+        Heating and hot water relay states
+
+        param start: Optional time.time() of the oldest sample wanted
+        param end: Optional time.time() of the newest sample wanted
+        return: WiserRelayHistory of arrays
+        """
+        with self._lock:
+            timestamps, (low, high) = self.__range(start, end)
+            return WiserRelayHistory(
+                timestamps[low:high],
+                self.__ordered(self._heatingRelay)[low:high],
+                self.__ordered(self._hotWaterRelay)[low:high])
+
+    def __ordered(self, values):
+        # The ring in time order
+        if self._size < self.capacity:
+            return values[:self._size]
+        return values[self._next:] + values[:self._next]
+
+    def __range(self, start, end):
+        timestamps = self.__ordered(self._timestamps)
+        low = 0 if start is None else bisect.bisect_left(timestamps, start)
+        high = len(timestamps) if end is None \
+            else bisect.bisect_right(timestamps, end)
+        return timestamps, (low, high)
@@ -12,11 +12,31 @@ This API is used by the homeassistant integration available at
 https://github.com/asantaga/wiserHomeAssistantPlatform
 """
 
+import array
+import concurrent.futures
+import contextlib
+import datetime
+import functools
 import logging
 import requests
+from requests.adapters import HTTPAdapter
 import json
 import os
 import re
+import threading
+import time
+
+from . import wiserJson
+from .wiserEntities import ENTITY_CLASSES
+from .wiserEvents import diffEntityIndexes
+from .wiserHistory import WiserHistory, HISTORY_CAPACITY
+from .wiserMetrics import WiserMetrics, endpointOf, errorForStatus
+from .wiserProfiler import WiserRefreshProfiler, PROFILE_KEEP, phase
+from .wiserSchedules import WiserScheduleIndex, weekMinute
+from .wiserSnapshot import WiserSnapshotStore
+from . import wiserState
+from . import wiserViews
+from .wiserWriteQueue import WiserWriteQueue, WRITE_DEBOUNCE
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -31,6 +51,12 @@ WISERROOM = "http://{}//data/domain/Room/{}"
 WISERSCHEDULEURL = "http://{}/data/domain/Schedule/{}"
 WISERSMARTPLUGURL = "http://{}/data/domain/SmartPlug/{}"
 WISERSMARTPLUGSURL = "http://{}/data/domain/SmartPlug"
+WISERCOLLECTIONURL = "http://{}/data/domain/{}"
+WISERENTITYURL = "http://{}/data/domain/{}/{}"
+
+# File name of a room schedule in an export directory
+SCHEDULE_FILE = "room{}schedule.json"
+SCHEDULE_FILE_PATTERN = re.compile(r"^room(\d+)schedule\.json$")
 
 TEMP_MINIMUM = 5
 TEMP_MAXIMUM = 30
@@ -38,8 +64,24 @@ TEMP_OFF = -20
 
 TIMEOUT = 5
 
+# Entity collections of the domain payload which get an id index
+INDEXED_ENTITIES = ("Room", "Device", "RoomStat", "SmartPlug", "Schedule",
+                    "HeatingChannel", "HotWater")
+
+# Sent before every non boost mode change to cancel a running boost
+CANCEL_BOOST_PATCH = {
+    "RequestOverride": {"Type": "None", "DurationMinutes": 0,
+                        "SetPoint": 0, "Originator": "App"}}
+
+# Connection pool sizing for the keep-alive HTTP transport
+POOL_CONNECTIONS = 10
+POOL_MAXSIZE = 10
+
 __VERSION__ = "1.0.3"
 
+# Maximum number of concurrent PATCHes sent by the batch setters
+WRITE_WORKERS = 4
+
 """
 Exception Handlers
 """
@@ -84,21 +126,100 @@ class WiserHubAuthenticationException(Error):
 class WiserHubTimeoutException(Error):
     pass
 
+class WiserHubConnectionException(Error):
+    pass
 
-class wiserHub:
+class WiserCircuitOpenException(Error):
+    pass
 
-    def __init__(self, hubIP, secret):
-        _LOGGER.info(
-            "WiserHub API Initialised : Version {}".format(__VERSION__))
-        self.wiserHubData = None
-        self.wiserNetworkData = None
-        self.hubIP = hubIP
-        self.hubSecret = secret
-        self.headers = {'SECRET': self.hubSecret,
-                        'Content-Type': 'application/json;charset=UTF-8'}
-        # Dict holding Valve2Room mapping convinience variable
-        self.device2roomMap = {}
-        self.refreshData()  # Issue first refresh in init
+
+class WiserHubBase:
+    """
+    Cached hub state, getters and request builders shared by wiserHub and
+    asyncWiserHub.AsyncWiserHub. Nothing here talks to the hub, subclasses
+    provide the transport, the refreshes and setters, and checkHubData and
+    checkNetworkData.
+    """
+
+    def _initData(self):
+        """
+        Sets up the empty cached hub state and change listeners
+        """
+        # WiserHubState holding the payloads, the indexes and the
+        # device to room map. It is never modified, changes publish a new
+        # state with a single assignment so readers need no lock.
+        self._state = wiserState.EMPTY_STATE
+        # Serialises the writers building and publishing new states
+        self._stateLock = threading.RLock()
+        # time.monotonic() of the last domain payload received
+        self.lastRefreshTime = None
+        # List of (callback, eventTypes) registered through subscribe
+        self._subscribers = []
+        # (entityType, entityId) -> field -> (value, write sequence number)
+        # of fields written locally and not yet confirmed by a refresh, see
+        # _recordWrite
+        self.pendingWrites = {}
+        # Sequence number of the last recorded write. A refresh only settles
+        # the writes recorded before its request was sent.
+        self._writeSeq = 0
+        # Raw bytes of the last domain and network payloads received and of
+        # those last written to the snapshot store
+        self._rawPayloads = {"domain": None, "network": None}
+        self._savedPayloads = (None, None)
+        # Raw bytes the cached domain and network data were decoded from,
+        # None once the cached data was changed locally. A refresh which
+        # receives the same bytes again skips decoding and rebuilding.
+        self._fingerprints = {"domain": None, "network": None}
+        # Whether the last refresh of each payload changed it, None before
+        # the first refresh
+        self.lastRefreshChanged = {"domain": None, "network": None}
+        # Derived views are memoized per generation of the state
+        self._viewCache = wiserViews.WiserViewCache()
+        # (generation, WiserScheduleIndex) compiled on first use
+        self._scheduleIndex = None
+
+    @property
+    def state(self):
+        """
+        The current WiserHubState, read it once when using several parts of
+        it so they all come from the same payload
+        """
+        return self._state
+
+    @property
+    def wiserHubData(self):
+        """
+        Decoded domain payload, None before the first refresh
+        """
+        return self._state.hubData
+
+    @property
+    def wiserNetworkData(self):
+        """
+        Decoded network payload, None before the first refresh
+        """
+        return self._state.networkData
+
+    @property
+    def entityIndex(self):
+        """
+        Dicts of entity id to entity, one per INDEXED_ENTITIES collection
+        """
+        return self._state.entityIndex
+
+    @property
+    def device2roomMap(self):
+        """
+        Dict of roomstat or smart valve id to the id and name of its room
+        """
+        return self._state.device2roomMap
+
+    @property
+    def generation(self):
+        """
+        Bumped whenever the cached domain data changes
+        """
+        return self._state.generation
 
     def __toWiserTemp(self, temp):
         """
@@ -129,79 +250,426 @@ class wiserHub:
         else:
             return True
 
-    def checkHubData(self):
+    def _spliceEntity(self, entityType, entity, writeSeq=None):
         """
-        Method checks the hub data object is populated, if it is not then it
-        executes the refresh method, if the hubdata object is still null then
-        it raises an error
-
+        Replaces one cached entity with a freshly fetched one
+        param entityType: Collection name
+        param entity: The entity as returned by the hub
+        param writeSeq: Write sequence number when the GET was sent, see
+                        __reconcileWrites
         """
-        if self.wiserHubData is None:
-            self.refreshData()
-        if self.wiserHubData is None:
-            raise WiserHubDataNull(
-                "Hub data null even after refresh, aborting request")
-        # Otherwise continue
+        entityId = entity.get("id")
+        with self._stateLock:
+            state = self._state
+            if (entityType, entityId) in self.pendingWrites:
+                self.__reconcileWrites([(entityType, entityId)],
+                                       lambda *key: entity, writeSeq)
+            hubData, entityIndex, cached = wiserState.withEntity(
+                state.hubData, state.entityIndex, entityType, entity)
+            self.__publishSplice(state, entityType, hubData, entityIndex)
+        if self._subscribers:
+            self._publishEvents(diffEntityIndexes(
+                {entityType: {} if cached is None else {entityId: cached}},
+                {entityType: {entityId: entity}}))
+
+    def _spliceCollection(self, entityType, entities, writeSeq=None):
+        """
+        Replaces one cached collection with a freshly fetched one
+        param entityType: Collection name
+        param entities: List of entities as returned by the hub
+        param writeSeq: Write sequence number when the GET was sent, see
+                        __reconcileWrites
+        """
+        fresh = {entity.get("id"): entity for entity in entities}
+        with self._stateLock:
+            state = self._state
+            previous = {entity.get("id"): entity
+                        for entity in state.hubData.get(entityType) or ()}
+            self.__reconcileWrites(
+                [key for key in self.pendingWrites if key[0] == entityType],
+                lambda entityType, entityId: fresh.get(entityId), writeSeq)
+            hubData, entityIndex = wiserState.withCollection(
+                state.hubData, state.entityIndex, entityType, entities)
+            self.__publishSplice(state, entityType, hubData, entityIndex)
+        if self._subscribers:
+            self._publishEvents(diffEntityIndexes(
+                {entityType: previous}, {entityType: fresh}))
+
+    def __publishSplice(self, state, entityType, hubData, entityIndex):
+        """
+        Publishes the state with a spliced entity or collection, called
+        holding the state lock
+        """
+        device2roomMap = self._buildDeviceRoomMap(hubData) \
+            if entityType == "Room" else state.device2roomMap
+        self._fingerprints["domain"] = None
+        self._state = state._replace(
+            hubData=hubData, entityIndex=entityIndex,
+            device2roomMap=device2roomMap, generation=state.generation + 1)
+
+    def _payloadUnchanged(self, kind, content):
+        # The raw bytes are their own fingerprint, comparing them is a
+        # memcmp and cheaper than hashing them
+        return content is not None and content == self._fingerprints[kind]
+
+    def _applyHubData(self, content, hubData, profile=None, writeSeq=None):
+        """
+        Takes a fetched domain payload. When hubData is None its bytes were
+        unchanged, the data is then only marked fresh and decoding,
+        indexing and change events are skipped.
+
+        param content: Raw bytes of the payload
+        param hubData: Decoded payload, None if unchanged
+        param profile: WiserRefreshProfile of the refresh, if profiling
+        param writeSeq: Write sequence number when the GET was sent, see
+                        __reconcileWrites
+        """
+        if hubData is None:
+            self.lastRefreshTime = time.monotonic()
+            self.lastRefreshChanged["domain"] = False
+            if profile is not None:
+                profile.unchanged.append("domain")
+            if self.history is not None:
+                state = self._state
+                with phase(profile, "history"):
+                    self.history.record(state.hubData, state.entityIndex,
+                                        time.time())
+            return
+        self._processHubData(hubData, profile, writeSeq)
+        with self._stateLock:
+            # Writes still pending were applied over the payload, it then no
+            # longer matches its bytes
+            self._fingerprints["domain"] = \
+                None if self.pendingWrites else content
+        self.lastRefreshChanged["domain"] = True
+
+    def _loadSnapshot(self):
+        """
+        Starts from the payloads in the snapshot store
+        return: True if a snapshot was loaded
+        """
+        snapshot = self.snapshotStore.load()
+        if snapshot is None:
+            return False
+        try:
+            self._applyHubData(snapshot.domain,
+                               wiserJson.loads(snapshot.domain))
+            if snapshot.network is not None:
+                self._processNetworkData(snapshot.network)
+        except ValueError as ex:
+            _LOGGER.warning("Ignoring unreadable snapshot {}: {}".format(
+                self.snapshotStore.path, ex))
+            self._initData()
+            return False
+        self._rawPayloads = {"domain": snapshot.domain,
+                             "network": snapshot.network}
+        self._savedPayloads = (snapshot.domain, snapshot.network)
+        # The data is as old as the snapshot, maxAge applies to it
+        self.lastRefreshTime = time.monotonic() - max(
+            0.0, time.time() - snapshot.savedAt)
+        _LOGGER.info("Loaded Wiser Hub snapshot saved {:.0f}s ago".format(
+            time.time() - snapshot.savedAt))
+        return True
 
-    def refreshData(self):
+    def _saveSnapshot(self):
         """
-        Forces a refresh of data from the wiser hub
-        return: JSON Data
+        Writes the last payloads received to the snapshot store if they
+        changed since the last save
         """
+        if self.snapshotStore is None:
+            return
+        payloads = (self._rawPayloads["domain"], self._rawPayloads["network"])
+        if payloads[0] is None or payloads == self._savedPayloads:
+            return
+        try:
+            self.snapshotStore.save(payloads[0], payloads[1], time.time())
+        except OSError as ex:
+            _LOGGER.warning("Saving Wiser Hub snapshot failed: {}".format(ex))
+        else:
+            self._savedPayloads = payloads
 
-        _LOGGER.info("Updating Wiser Hub Data")
+    @contextlib.contextmanager
+    def _profiled(self, kind):
+        """
+        Profiles one refresh when profiling is enabled
+        param kind: Name of the refresh method
+        return: context manager yielding the WiserRefreshProfile or None
+        """
+        profiler = self.profiler
+        if profiler is None:
+            yield None
+            return
+        profile = profiler.start(kind)
         try:
-            resp = requests.get(WISERHUBURL.format(
-                self.hubIP), headers=self.headers, timeout=TIMEOUT)
-                
-            resp.raise_for_status()
-            self.wiserHubData = resp.json()
-            
-            _LOGGER.debug(
-                "Wiser Hub Data received {} ".format(self.wiserHubData))
-            if self.getRooms() is not None:
-                for room in self.getRooms():
-                    roomStatId = room.get("RoomStatId")
-                    if roomStatId is not None:
-                        # RoomStat found add it to the list
-                        self.device2roomMap[roomStatId] = {
+            yield profile
+        except BaseException as ex:
+            profile.error = type(ex).__name__
+            raise
+        finally:
+            profiler.finish(profile)
+
+    def _processHubData(self, hubData, profile=None, writeSeq=None):
+        """
+        Builds the state of a freshly fetched domain payload, its indexes
+        and device to room map, and publishes it in one assignment
+        param hubData: Decoded domain JSON
+        param profile: WiserRefreshProfile of the refresh, if profiling
+        param writeSeq: Write sequence number when the GET was sent, see
+                        __reconcileWrites
+        """
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            _LOGGER.debug("Wiser Hub Data received {} ".format(hubData))
+        with phase(profile, "entityIndex"):
+            entityIndex = self._buildEntityIndex(hubData)
+        with phase(profile, "roomMap"):
+            device2roomMap = self._buildDeviceRoomMap(hubData)
+        with self._stateLock:
+            previous = self._state
+            if self.pendingWrites:
+                with phase(profile, "reconcile"):
+                    self.__reconcileWrites(
+                        list(self.pendingWrites),
+                        lambda entityType, entityId: hubData.get("System")
+                        if entityType == "System" else
+                        (entityIndex.get(entityType) or {}).get(entityId),
+                        writeSeq)
+            self._state = previous._replace(
+                hubData=hubData, entityIndex=entityIndex,
+                device2roomMap=device2roomMap,
+                generation=previous.generation + 1)
+            self.lastRefreshTime = time.monotonic()
+        if self._subscribers and previous.entityIndex:
+            with phase(profile, "events"):
+                self._publishEvents(
+                    diffEntityIndexes(previous.entityIndex, entityIndex))
+        if self.history is not None:
+            with phase(profile, "history"):
+                self.history.record(hubData, entityIndex, time.time())
+
+    @staticmethod
+    def _buildDeviceRoomMap(hubData):
+        """
+        param hubData: Decoded domain JSON
+        return: new dict of roomstat and smart valve ids to their room
+        """
+        device2roomMap = {}
+        if hubData.get("Room") is not None:
+            for room in hubData.get("Room"):
+                roomStatId = room.get("RoomStatId")
+                if roomStatId is not None:
+                    # RoomStat found add it to the list
+                    device2roomMap[roomStatId] = {
+                        "roomId": room.get("id"),
+                        "roomName": room.get("Name")}
+                smartValves = room.get("SmartValveIds")
+                if smartValves is not None:
+                    for valveId in smartValves:
+                        device2roomMap[valveId] = {
                             "roomId": room.get("id"),
                             "roomName": room.get("Name")}
-                    smartValves = room.get("SmartValveIds")
-                    if smartValves is not None:
-                        for valveId in smartValves:
-                            self.device2roomMap[valveId] = {
-                                "roomId": room.get("id"),
-                                "roomName": room.get("Name")}
-                    # Show warning if room contains no devices.
-                    if roomStatId is None and smartValves is None:
-                        # No devices in room
-                        _LOGGER.warning(
-                            "Room {} doesn't contain any smart valves or thermostats.".format(
-                                room.get("Name")))
-                _LOGGER.debug(" valve2roomMap{} ".format(self.device2roomMap))
+                # Show warning if room contains no devices.
+                if roomStatId is None and smartValves is None:
+                    # No devices in room
+                    _LOGGER.warning(
+                        "Room {} doesn't contain any smart valves or thermostats.".format(
+                            room.get("Name")))
+            if _LOGGER.isEnabledFor(logging.DEBUG):
+                _LOGGER.debug(" valve2roomMap{} ".format(device2roomMap))
+        else:
+            _LOGGER.warning("Wiser found no rooms")
+        return device2roomMap
+
+    @staticmethod
+    def _buildEntityIndex(hubData):
+        """
+        Builds the id to entity dicts used by the single entity getters
+        param hubData: Decoded domain JSON
+        return: dict of collection name to dict of id to entity, collections
+                missing from the payload map to None
+        """
+        entityIndex = {}
+        for entityType in INDEXED_ENTITIES:
+            entities = hubData.get(entityType)
+            entityIndex[entityType] = None if entities is None else {
+                entity.get("id"): entity for entity in entities}
+        return entityIndex
+
+    def _recordWrite(self, entityType, entityId, patchData):
+        """
+        Applies a successful PATCH to the cached payload so getters see the
+        new value straight away. The written fields stay pending until the
+        next refresh confirms or replaces them. Subscribers get the change
+        events of the write now, the refresh confirming it has nothing left
+        to report.
+
+        param entityType: Room, SmartPlug, HotWater, Schedule or System
+        param entityId: id of the entity, None for System
+        param patchData: The patch data the hub accepted
+        """
+        with self._stateLock:
+            state = self._state
+            if state.hubData is None:
+                return
+            if entityType == "System":
+                cached = state.hubData.get("System")
             else:
-                _LOGGER.warning("Wiser found no rooms")
+                cached = (state.entityIndex.get(entityType) or {}).get(
+                    entityId)
+            if cached is None:
+                return
+            fields = self.__writtenFields(entityType, cached, patchData)
+            if not fields:
+                return
+            # Published entities are never modified, write to a copy
+            entity = dict(cached)
+            entity.update(fields)
+            if entityType == "System":
+                hubData = dict(state.hubData)
+                hubData["System"] = entity
+                entityIndex = state.entityIndex
+            else:
+                hubData, entityIndex, _ = wiserState.withEntity(
+                    state.hubData, state.entityIndex, entityType, entity)
+            self._writeSeq += 1
+            pending = self.pendingWrites.setdefault((entityType, entityId), {})
+            for field, value in fields.items():
+                pending[field] = (value, self._writeSeq)
+            # The cache no longer matches the bytes it was decoded from
+            self._fingerprints["domain"] = None
+            self._state = state._replace(
+                hubData=hubData, entityIndex=entityIndex,
+                generation=state.generation + 1)
+        if self._subscribers:
+            self._publishEvents(diffEntityIndexes(
+                {entityType: {entityId: cached}},
+                {entityType: {entityId: entity}}))
+
+    @staticmethod
+    def __writtenFields(entityType, entity, patchData):
+        """
+        Works out the payload fields a PATCH changes once the hub applies it
+        return: dict of field to expected value
+        """
+        fields = {}
+        override = patchData.get("RequestOverride") or {}
+        if entityType == "Room":
+            if "Mode" in patchData:
+                fields["Mode"] = patchData["Mode"]
+            if override.get("Type") == "Manual":
+                fields["CurrentSetPoint"] = override.get("SetPoint")
+                fields["OverrideType"] = "Manual"
+            elif override.get("Type") == "None":
+                fields["OverrideType"] = "None"
+                if patchData.get("Mode") == "Auto" and \
+                        entity.get("ScheduledSetPoint") is not None:
+                    fields["CurrentSetPoint"] = entity["ScheduledSetPoint"]
+        elif entityType == "SmartPlug":
+            if "RequestOutput" in patchData:
+                fields["OutputState"] = patchData["RequestOutput"]
+            if "Mode" in patchData:
+                fields["Mode"] = patchData["Mode"]
+        elif entityType == "HotWater":
+            if override.get("Type") == "Manual":
+                fields["WaterHeatingState"] = \
+                    "On" if override.get("SetPoint", 0) > 0 else "Off"
+                fields["OverrideType"] = "Manual"
+            elif override.get("Type") == "None":
+                fields["OverrideType"] = "None"
+        elif entityType in ("System", "Schedule"):
+            fields.update(patchData)
+        return fields
+
+    def isWritePending(self, entityType, entityId=None):
+        """
+        return: True if the entity holds locally written values which no
+                refresh has confirmed yet
+        """
+        return (entityType, entityId) in self.pendingWrites
 
-            # The Wiser Heat Hub can return invalid JSON, so remove all non-printable characters before trying to parse JSON
-            responseContent = requests.get(WISERNETWORKURL.format(self.hubIP), headers=self.headers, timeout=TIMEOUT).content
-            responseContent = re.sub(rb'[^\x20-\x7F]+', b'', responseContent)
-            self.WiserNetworkData = json.loads(responseContent)
+    def __reconcileWrites(self, keys, freshEntity, writeSeq):
+        """
+        Settles pending writes against freshly fetched entities, called
+        holding the state lock before they are published. The fresh data is
+        authoritative for the writes recorded before its GET was sent, those
+        are dropped and logged when the hub reports something else. Newer
+        writes may have missed the GET, they stay pending and their fields
+        are applied over the fresh entities.
+
+        param keys: (entityType, entityId) of the pending writes covered
+        param freshEntity: Callable taking entityType and entityId returning
+                           the fresh entity, None if the hub no longer has it
+        param writeSeq: Write sequence number when the GET was sent, None
+                        settles every write
+        """
+        for key in keys:
+            entityType, entityId = key
+            entity = freshEntity(entityType, entityId)
+            newer = {}
+            for field, (value, seq) in self.pendingWrites.pop(key).items():
+                if writeSeq is not None and seq > writeSeq:
+                    newer[field] = (value, seq)
+                elif entity is None or entity.get(field) != value:
+                    _LOGGER.debug(
+                        "Hub reports {} {} {} as {}, written value was {}".
+                        format(entityType, entityId, field,
+                               None if entity is None else entity.get(field),
+                               value))
+            if newer and entity is not None:
+                # The fresh entity is not published yet, update it in place
+                entity.update((field, value)
+                              for field, (value, _) in newer.items())
+                self.pendingWrites[key] = newer
+
+    def subscribe(self, callback, eventTypes=None):
+        """
+        Registers a callback for the change events computed on each refresh,
+        see wiserEvents for the event types
 
-        except requests.Timeout:
-            _LOGGER.debug(
-                "Connection timed out trying to update from Wiser Hub")
-            raise WiserHubTimeoutException("The connection timed out.")
-        except requests.HTTPError:
-            if self.wiserHubData.status_code == 401:
-                raise WiserHubAuthenticationException("Authentication error.  Check secret key.")
-            elif self.wiserHubData.status_code == 404:
-                raise WiserRESTException("Not Found.")
-            else:
-                raise WiserRESTException("Unknown Error.")
-        except requests.ConnectionError:
-            _LOGGER.debug("Connection error trying to update from Wiser Hub")
-        return self.wiserHubData
+        param callback: Called with a WiserChangeEvent per change
+        param eventTypes: Optional iterable of event types to receive,
+                          all events are received when None
+        return: function which removes the subscription
+        """
+        subscription = (callback,
+                        None if eventTypes is None else frozenset(eventTypes))
+        self._subscribers.append(subscription)
+
+        def unsubscribe():
+            if subscription in self._subscribers:
+                self._subscribers.remove(subscription)
+        return unsubscribe
+
+    def _publishEvents(self, events):
+        for callback, eventTypes in list(self._subscribers):
+            for event in events:
+                if eventTypes is not None and event.eventType not in eventTypes:
+                    continue
+                try:
+                    callback(event)
+                except Exception:
+                    _LOGGER.exception(
+                        "Change event subscriber failed on {}".format(event))
+
+    def _processNetworkData(self, responseContent, profile=None):
+        """
+        Stores the network payload, the raw bytes are cleaned of
+        non-printable characters first as the hub can send invalid JSON
+        param responseContent: Raw bytes of the network response
+        param profile: WiserRefreshProfile of the refresh, if profiling
+        """
+        if self._payloadUnchanged("network", responseContent):
+            self.lastRefreshChanged["network"] = False
+            if profile is not None:
+                profile.unchanged.append("network")
+            return
+        with phase(profile, "networkSanitize"):
+            content = wiserJson.sanitize(responseContent)
+        with phase(profile, "networkDecode"):
+            networkData = wiserJson.loads(content)
+        with self._stateLock:
+            self._state = self._state._replace(networkData=networkData)
+        self._fingerprints["network"] = responseContent
+        self.lastRefreshChanged["network"] = True
 
     def getHubData(self):
         """
@@ -213,12 +681,43 @@ class wiserHub:
         self.checkHubData()
         return self.wiserHubData
 
+    def getEntities(self, entityType):
+        """
+        Typed views of one payload collection, see wiserEntities
+
+        param entityType: Room, Device, RoomStat, SmartPlug, HotWater,
+                          HeatingChannel or Schedule
+        return: list of entity views, empty if the collection is missing
+        """
+        self.checkHubData()
+        entityClass = ENTITY_CLASSES[entityType]
+        return [entityClass(entity)
+                for entity in self.wiserHubData.get(entityType) or ()]
+
+    def getEntity(self, entityType, entityId):
+        """
+        Typed view of a single entity, see wiserEntities
+
+        param entityType: Room, Device, RoomStat, SmartPlug, HotWater,
+                          HeatingChannel or Schedule
+        param entityId: id of the entity
+        return: entity view
+        """
+        self.checkHubData()
+        entity = (self.entityIndex.get(entityType) or {}).get(entityId)
+        if entity is None:
+            raise WiserNotFound(
+                "{} {} not found".format(entityType, entityId))
+        return ENTITY_CLASSES[entityType](entity)
+
     def getWiserHubName(self):
+        self.checkNetworkData()
         return self.wiserNetworkData.get("Station").get("MdnsHostname")
-        
+
     def getMACAddress(self):
+        self.checkNetworkData()
         return self.wiserNetworkData.get("Station").get("MacAddress")
-        
+
     def getRooms(self):
         """
         Gets Room Data as JSON Payload
@@ -234,13 +733,14 @@ class wiserHub:
         return:
         """
         self.checkHubData()
-        if self.wiserHubData.get("Room") is None:
+        rooms = self.entityIndex.get("Room")
+        if rooms is None:
             _LOGGER.warning("getRoom called but no rooms found")
             raise WiserNoRoomsFound("No rooms found in Wiser payload")
-        for room in (self.wiserHubData.get("Room")):
-            if room.get("id") == roomId:
-                return room
-        raise WiserNotFound("Room {} not found".format(roomId))
+        room = rooms.get(roomId)
+        if room is None:
+            raise WiserNotFound("Room {} not found".format(roomId))
+        return room
 
     def getSystem(self):
         """
@@ -289,64 +789,80 @@ class wiserHub:
         """
         self.checkHubData()
 
-        if self.wiserHubData.get("Device") is None:
+        devices = self.entityIndex.get("Device")
+        if devices is None:
             _LOGGER.warning("getRoom called but no rooms found")
             raise WiserNoRoomsFound("getRoom called but no rooms found")
-        for device in (self.wiserHubData.get("Device")):
-            if device.get("id") == deviceId:
-                return device
-        raise WiserNotFound("Device {} not found ".format(deviceId))
-
-    def getDeviceRoom(self, deviceId):
-        """
-        Convinience function to return the name of a room which is associated
-        with a device (roomstat or trf)
-        param deviceId:
-        return: Name of Room associated with a device ID
-        """
-        self.checkHubData()
-        _LOGGER.debug(" getDeviceRoom called, valve2roomMap is {} ".format(
-            self.device2roomMap))
-        if not self.device2roomMap:
-            self.refreshData()
-        # This will return None if no device found, thats ok
-        return self.device2roomMap[deviceId]
+        device = devices.get(deviceId)
+        if device is None:
+            raise WiserNotFound("Device {} not found ".format(deviceId))
+        return device
 
     def getHeatingRelayStatus(self):
         """
         Returns heating relay status
         return:  On or Off
         """
-        # self.checkHubData()
-        heatingRelayStatus = "Off"
-        # There could be multiple heating channels, 
-        heatingChannels = self.getHeatingChannels()
-        for heatingChannel in heatingChannels:
-            if heatingChannel.get("HeatingRelayState") == "On":
-                heatingRelayStatus = "On"
-        return heatingRelayStatus
+        return self._derivedView("heatingRelayStatus",
+                                 wiserViews.heatingRelayStatus)
 
     def getHotwaterRelayStatus(self):
         """
          Returns hotwater relay status
-        return:  On or Off
+        return:  On or Off, False if there is no hot water
+        """
+        return self._derivedView("hotWaterRelayStatus",
+                                 wiserViews.hotWaterRelayStatus)
 
+    def getRoomsCallingForHeat(self):
         """
-        self.checkHubData()
+        return: tuple of the ids of the rooms with a heat demand
         """
-        If there is no hotwater object then return false
+        return self._derivedView("roomsCallingForHeat",
+                                 wiserViews.roomsCallingForHeat)
+
+    def getRoomTemperatures(self):
         """
-        if len(self.wiserHubData.get("HotWater")) < 1:
-            return False
+        Calculated temperature of every room at once
 
-        return self.wiserHubData.get("HotWater")[0].get("WaterHeatingState")
+        return: WiserRoomTemperatures of a tuple of room ids and an array of
+                their temperatures in degrees C, NaN without a reading
+        """
+        roomTemperatures = self._derivedView("roomTemperatures",
+                                             wiserViews.roomTemperatures)
+        # The memo is shared, hand out a copy of the mutable array
+        return wiserViews.WiserRoomTemperatures(
+            roomTemperatures.roomIds,
+            array.array("d", roomTemperatures.temperatures))
+
+    def getLowBatteryDevices(self, levels=wiserViews.LOW_BATTERY_LEVELS):
+        """
+        param levels: BatteryLevel values counted as low
+        return: tuple of the devices with a low battery
+        """
+        levels = tuple(levels)
+        return self._derivedView(
+            ("lowBatteryDevices", levels),
+            functools.partial(wiserViews.lowBatteryDevices, levels=levels))
 
-    def setHotwaterMode(self, mode):
+    def _derivedView(self, key, compute):
         """
-          Switch Hot Water on or off manually, or reset to 'Auto' (schedule).
-          'mode' can be "on", "off" or "auto".
+        Serves a view derived from the domain payload, computed at most
+        once per generation of the cached data
+        param key: Name of the view and its arguments
+        param compute: Callable taking the domain payload
         """
+        self.checkHubData()
+        state = self._state
+        return self._viewCache.get(state.generation, key,
+                                   functools.partial(compute, state.hubData))
 
+    def _hotwaterModeRequest(self, mode):
+        """
+        Validates a hot water mode and builds the PATCH for it
+        param mode: on, off or auto
+        return: tuple of url and patch data
+        """
         # Wiser requires a temperature when patching the Hot Water state,
         # reflecting 'on' or 'off'
         DHWOnTemp = 1100
@@ -366,45 +882,13 @@ class wiserHub:
                 "Hot Water can be either 'on', 'off' or 'auto' - not '%s'" % _mode)
 
         # Obtain our DHW control ID
-        if self.wiserHubData is None:
-            self.refreshData()
+        self.checkHubData()
         DHWId = self.wiserHubData.get("HotWater")[0].get("id")
 
         _url = WISERHUBURL.format(self.hubIP) + "/HotWater/{}/".format(DHWId)
         _LOGGER.debug("Sending Patch Data: {}, to URL [{}]".format(
             modeMapping.get(_mode), _url))
-        response = requests.patch(url=_url, headers=self.headers,
-                                       json=modeMapping.get(_mode))
-        if response.status_code != 200:
-            _LOGGER.debug(
-                "Set DHW Response code = {}".format(response.status_code))
-            raise WiserRESTException(
-                "Error setting hot water mode to {}, error {} {}".
-                    format(_mode, response.status_code, response.text))
-
-        return True
-
-    def setSystemSwitch(self, switch, mode=False):
-        """
-        Sets a system switch. For details of which switches to set look at the System section of the payload from the wiserhub
-        :param switch: Name of Switch
-        :param mode: Value of mode
-        :return:
-        """
-        patchData = {switch: mode}
-        url = WISERHUBURL + "System"
-
-        _LOGGER.debug("patchdata {} ".format(patchData))
-        response = requests.patch(url=url.format(self.hubIP),
-                                       headers=self.headers,
-                                       json=patchData, timeout=TIMEOUT)
-        if response.status_code != 200:
-            _LOGGER.debug("Set {} Response code = {}".format(switch,
-                                                             response.status_code))
-            raise WiserRESTException(
-                "Error setting {} , error {} {}".format(switch,
-                                                        response.status_code,
-                                                        response.text))
+        return _url, modeMapping.get(_mode)
 
     def getRoomStatData(self, deviceId):
         """
@@ -415,13 +899,14 @@ class wiserHub:
         """
         self.checkHubData()
 
-        if self.wiserHubData['RoomStat'] is None:
+        roomStats = self.entityIndex.get("RoomStat")
+        if roomStats is None:
             _LOGGER.warning("getRoomStatData called but no RoomStats found")
             raise WiserNotFound("deviceID {} not found ".format(deviceId))
 
-        for roomStat in self.wiserHubData['RoomStat']:
-            if roomStat.get("id") == deviceId:
-                return roomStat
+        roomStat = roomStats.get(deviceId)
+        if roomStat is not None:
+            return roomStat
         """
         If we get here then the deviceId was not found
         """
@@ -435,120 +920,219 @@ class wiserHub:
         param roomId:
         return: json data
         """
-        self.checkHubData()
-
-        if self.getRoom(roomId) is None:
-            raise WiserNotFound(
-                "getRoomSchedule for room {} not found ".format(roomId))
-
         scheduleId = self.getRoom(roomId).get("ScheduleId")
-        if scheduleId is not None:
-            for schedule in (self.wiserHubData.get("Schedule")):
-                if schedule.get("id") == scheduleId:
-                    return schedule
-            raise WiserNotFound(
-                "getRoomSchedule for room {} not found ".format(roomId))
-        else:
+        schedules = self.entityIndex.get("Schedule") or {}
+        schedule = schedules.get(scheduleId)
+        if scheduleId is None or schedule is None:
             raise WiserNotFound(
                 "getRoomSchedule for room {} not found ".format(roomId))
+        return schedule
 
-    def setRoomSchedule(self, roomId, scheduleData: dict):
+    def getScheduleIndex(self):
         """
-        Sets Room Schedule
+        All schedules compiled for time queries, see wiserSchedules. The
+        index is compiled once per generation of the cached data.
 
-        param roomId:
-        param scheduleData: json data for schedule
-        return:
+        return: WiserScheduleIndex
         """
-        scheduleId = self.getRoom(roomId).get("ScheduleId")
-
-        if scheduleId is not None:
-            patchData = scheduleData
-            response = requests.patch(
-                url=WISERSCHEDULEURL.format(self.hubIP, scheduleId),
-                headers=self.headers, json=patchData, timeout=TIMEOUT)
-
-            if response.status_code != 200:
-                _LOGGER.debug("Set Schedule Response code = {}".format(
-                    response.status_code))
-                raise WiserRESTException(
-                    "Error setting schedule for room {} , error {} {}".format(
-                        roomId, response.status_code, response.text))
-        else:
-            raise WiserNotFound("No schedule found that matches roomId")
-
-    def setRoomScheduleFromFile(self, roomId, scheduleFile: str):
+        self.checkHubData()
+        state = self._state
+        cached = self._scheduleIndex
+        if cached is not None and cached[0] == state.generation:
+            return cached[1]
+        scheduleIndex = WiserScheduleIndex(state.hubData.get("Schedule"))
+        self._scheduleIndex = (state.generation, scheduleIndex)
+        return scheduleIndex
+
+    def __roomSchedules(self, roomIds):
         """
-        Sets Room Schedule
-
-        param roomId:
-        param scheduleData: json data for schedule
-        return:
+        return: list of (roomId, CompiledSchedule) of the rooms which have a
+                schedule, all rooms when roomIds is None
         """
-        scheduleId = self.getRoom(roomId).get("ScheduleId")
-
-
-        if scheduleId is not None:
-            if os.path.exists(scheduleFile):
-                try:
-                    with open(scheduleFile, 'r') as f:
-                        scheduleData = json.load(f)
-                except:
-                    raise Exception(
-                        "Error reading file {}".format(scheduleFile))
-
-                patchData = scheduleData
-                response = requests.patch(
-                    url=WISERSCHEDULEURL.format(self.hubIP, scheduleId),
-                    headers=self.headers, json=patchData, timeout=TIMEOUT)
-
-                if response.status_code != 200:
-                    _LOGGER.debug("Set Schedule Response code = {}".format(
-                        response.status_code))
-                    raise WiserRESTException(
-                        "Error setting schedule for room {} , error {} {}".format(
-                            roomId, response.status_code,
-                            response.text))
-            else:
-                raise FileNotFoundError("Schedule file, {}, not found.".format(
-                    os.path.abspath(scheduleFile)))
+        scheduleIndex = self.getScheduleIndex()
+        if roomIds is None:
+            rooms = self.getRooms() or ()
         else:
-            raise WiserNotFound("No schedule found that matches roomId")
-
-    def copyRoomSchedule(self, fromRoomId, toRoomId):
+            rooms = [self.getRoom(roomId) for roomId in roomIds]
+        roomSchedules = []
+        for room in rooms:
+            schedule = scheduleIndex.get(room.get("ScheduleId"))
+            if schedule is not None and schedule.times:
+                roomSchedules.append((room.get("id"), schedule))
+        return roomSchedules
+
+    def getRoomSetPointAt(self, roomId, when=None):
         """
-        Copies Room Schedule from one room to another
+        Scheduled set point of a room, from the cached schedules
 
-        param fromRoomId:
-        param toRoomId:
-        return: boolean
+        param roomId: The room id
+        param when: Local datetime, now if not given
+        return: Degrees C, None if the room has no schedule
         """
-        scheduleData = self.getRoomSchedule(fromRoomId)
-
-        print(json.dumps(scheduleData))
-
-        print("TYPE:{}".format(type(scheduleData)))
+        roomSchedules = self.__roomSchedules([roomId])
+        if not roomSchedules:
+            return None
+        schedule = roomSchedules[0][1]
+        return schedule.decode(schedule.valueAt(
+            weekMinute(when or datetime.datetime.now())))
+
+    def getRoomSetPoints(self, when=None, roomIds=None):
+        """
+        Scheduled set points of many rooms at one time
 
-        if scheduleData is not None:
-            self.setRoomSchedule(toRoomId, scheduleData)
-        else:
-            raise WiserNotFound(
-                "Error copying schedule.  One of the room Ids is not valid")
+        param when: Local datetime, now if not given
+        param roomIds: Optional rooms to include, all rooms if not given
+        return: dict of room id to degrees C
+        """
+        minute = weekMinute(when or datetime.datetime.now())
+        return {roomId: schedule.decode(schedule.valueAt(minute))
+                for roomId, schedule in self.__roomSchedules(roomIds)}
 
-    def setHomeAwayMode(self, mode, temperature=10):
+    def getNextScheduleChange(self, roomIds=None, when=None):
         """
-        Sets default Home or Away mode, optionally allows you to set a temperature for away mode
+        Next scheduled set point change of any of the rooms
 
+        param roomIds: Optional rooms to consider, all rooms if not given
+        param when: Local datetime to look from, now if not given
+        return: tuple of the local datetime of the change, the room id and
+                the new set point in degrees C, None if no room has a
+                schedule
+        """
+        when = (when or datetime.datetime.now()).replace(second=0,
+                                                         microsecond=0)
+        minute = weekMinute(when)
+        nextChange = None
+        for roomId, schedule in self.__roomSchedules(roomIds):
+            minutes, value = schedule.nextChange(minute)
+            if nextChange is None or minutes < nextChange[0]:
+                nextChange = (minutes, roomId, schedule.decode(value))
+        if nextChange is None:
+            return None
+        minutes, roomId, setPoint = nextChange
+        return when + datetime.timedelta(minutes=minutes), roomId, setPoint
+
+    def forecastRoomSetPoints(self, start=None, step=15, count=7 * 24 * 4,
+                              roomIds=None):
+        """
+        Scheduled set points on a regular grid of times, a week at 15
+        minute steps by default
+
+        param start: Local datetime of the first time, now if not given
+        param step: Whole minutes between times
+        param count: Number of times
+        param roomIds: Optional rooms to include, all rooms if not given
+        return: dict of room id to array of degrees C, one per time, see
+                WiserScheduleIndex.gridTimes for the times
+        """
+        if step < 1 or int(step) != step:
+            raise ValueError("step must be a whole number of minutes")
+        startMinute = weekMinute(start or datetime.datetime.now())
+        forecasts = {}
+        for roomId, schedule in self.__roomSchedules(roomIds):
+            forecasts[roomId] = array.array("d", [
+                value / 10 for value in
+                schedule.forecast(startMinute, int(step), count)])
+        return forecasts
+
+    def _schedulePatchData(self, scheduleId, scheduleData, force=False):
+        """
+        Works out the PATCH which turns the cached schedule into scheduleData
+        return: dict of the differing days, empty if nothing differs
+        """
+        cached = {} if force else \
+            (self.entityIndex.get("Schedule") or {}).get(scheduleId) or {}
+        return {key: value for key, value in scheduleData.items()
+                if key != "id" and self._scheduleValue(cached.get(key)) !=
+                self._scheduleValue(value)}
+
+    @staticmethod
+    def _scheduleValue(value):
+        # Set points compare equal whatever order they are listed in
+        if isinstance(value, dict) and \
+                isinstance(value.get("SetPoints"), list):
+            return dict(value, SetPoints=sorted(
+                value["SetPoints"],
+                key=lambda setPoint: setPoint.get("Time", 0)))
+        return value
+
+    def _groupRoomsBySchedule(self, roomIds):
+        """
+        param roomIds: Iterable of room ids
+        return: tuple of a dict of ScheduleId to the rooms using it, in the
+                order given, and a dict of room id to the exception raised
+                for rooms without a schedule
+        """
+        sharedRooms = {}
+        errors = {}
+        for roomId in roomIds:
+            try:
+                scheduleId = self.getRoom(roomId).get("ScheduleId")
+                if scheduleId is None:
+                    raise WiserNotFound(
+                        "No schedule found that matches roomId")
+            except Error as ex:
+                errors[roomId] = ex
+                continue
+            sharedRooms.setdefault(scheduleId, []).append(roomId)
+        return sharedRooms, errors
+
+    def _exportRoomSchedule(self, directory, roomId):
+        path = os.path.join(directory, SCHEDULE_FILE.format(roomId))
+        scheduleData = self.getRoomSchedule(roomId)
+        with open(path, "w") as f:
+            json.dump(scheduleData, f)
+        return path
+
+    @staticmethod
+    def _scheduleFiles(directory, roomIds):
+        """
+        return: dict of room id to the path of its schedule file
+        """
+        if roomIds is None:
+            roomIds = sorted(
+                int(match.group(1)) for match in
+                map(SCHEDULE_FILE_PATTERN.match, os.listdir(directory))
+                if match is not None)
+        return {roomId: os.path.join(directory, SCHEDULE_FILE.format(roomId))
+                for roomId in roomIds}
+
+    @staticmethod
+    def _readScheduleFile(path):
+        """
+        return: the schedule data of a schedule file
+        """
+        if not os.path.exists(path):
+            raise FileNotFoundError("Schedule file, {}, not found.".format(
+                os.path.abspath(path)))
+        try:
+            with open(path, "r") as f:
+                return json.load(f)
+        except ValueError as ex:
+            raise ValueError("Error reading file {}: {}".format(path, ex))
+
+    def _checkSharedScheduleFiles(self, scheduleId, scheduleData, roomFiles):
+        # Rooms sharing a schedule can only get one of their files
+        for roomId, path in roomFiles:
+            try:
+                otherData = self._readScheduleFile(path)
+            except (OSError, ValueError):
+                continue
+            if {key: self._scheduleValue(value)
+                    for key, value in otherData.items() if key != "id"} != \
+                    {key: self._scheduleValue(value)
+                     for key, value in scheduleData.items() if key != "id"}:
+                _LOGGER.warning(
+                    "Room {} shares schedule {} with other rooms, its file "
+                    "{} differs and is not applied".format(
+                        roomId, scheduleId, path))
+
+    def _homeAwayPatchData(self, mode, temperature=10):
+        """
+        Validates a Home or Away mode and builds the PATCH body for it
         param mode: HOME   | AWAY
-
         param temperature: Temperature between 5-30C or -20 for OFF
-
-        return:
+        return: patch data
         """
-        _LOGGER.info(
-            "Setting Home/Away mode to : {} {} C".format(mode, temperature))
-
-
         if mode not in ['HOME', 'AWAY']:
             raise ValueError("setAwayHome can only be HOME or AWAY")
 
@@ -568,63 +1152,38 @@ class wiserHub:
         else:
             patchData = {"type": 0, "setPoint": 0}
         _LOGGER.debug("patchdata {} ".format(patchData))
-        response = requests.patch(url=WISERMODEURL.format(self.hubIP),
-                                       headers=self.headers,
-                                       json=patchData, timeout=TIMEOUT)
-        if response.status_code != 200:
-            _LOGGER.debug("Set Home/Away Response code = {}".format(
-                response.status_code))
-            raise ValueError("Error setting Home/Away , error {} {}".format(
-                response.status_code, response.text))
+        return patchData
 
-    def setRoomTemperature(self, roomId, temperature):
+    def _roomTemperaturePatchData(self, temperature):
         """
-        Sets the room temperature
-        param roomId:  The Room ID
+        Validates a room temperature and builds the PATCH body for it
         param temperature:  The temperature in celcius from 5 to 30, -20 for Off
+        return: patch data
         """
-        _LOGGER.info(
-            "Set Room {} Temperature to = {} ".format(roomId, temperature))
         if not (self.__checkTempRange(temperature)):
             raise ValueError(
                 "SetRoomTemperature : value of temperature must be between {} and {} OR {} (off)".format(
                     TEMP_MINIMUM, TEMP_MAXIMUM, TEMP_OFF))
-        patchData = {"RequestOverride": {"Type": "Manual",
-                                         "SetPoint": self.__toWiserTemp(
-                                             temperature)}}
-        response = requests.patch(WISERSETROOMTEMP.format(
-            self.hubIP, roomId), headers=self.headers, json=patchData,
-            timeout=TIMEOUT)
-        if response.status_code != 200:
-            _LOGGER.error(
-                "Set Room {} Temperature to = {} resulted in {}".format(roomId,
-                                                                        temperature,
-                                                                        response.status_code))
-            raise WiserRESTException(
-                "Error setting temperature, error {} ".format(
-                    response.text))
-        _LOGGER.debug(
-            "Set room Temp, error {} ({})".format(response.status_code,
-                                                  response.text))
+        return {"RequestOverride": {"Type": "Manual",
+                                    "SetPoint": self.__toWiserTemp(
+                                        temperature)}}
 
     # Set Room Mode (Manual, Boost,Off or Auto )
     # If set to off then the trv goes to manual and temperature of -200
     #
-    def setRoomMode(self, roomId, mode, boost_temp=20, boost_temp_time=30):
+
+    def _roomModePatchData(self, roomId, mode, boost_temp=20,
+                           boost_temp_time=30):
         """
-        Set the Room Mode, this can be Auto, Manual, off or Boost. When you set the mode back to Auto it will automatically take the scheduled temperature
+        Validates a room mode and builds the PATCH body which sets it. The
+        boost cancel sent before non boost modes is not included.
 
         param roomId: RoomId
-
         param mode:  Mode (auto, manual off, or boost)
-
-        param boost_temp:  If boosting enter the temperature here in C, can be between 5-30
-
+        param boost_temp:  Boost temperature in C
         param boost_temp_time:  How long to boost for in minutes
-
+        return: patch data
         """
-        # TODO
-        _LOGGER.debug("Set Mode {} for a room {} ".format(mode, roomId))
         if mode.lower() == "auto":
             # Do Auto
             patchData = {"Mode": "Auto"}
@@ -661,26 +1220,892 @@ class wiserHub:
             raise ValueError(
                 "Error setting setting room mode, received  {} but should be auto,boost,off or manual ".format(
                     mode))
+        return patchData
+
+    def _roomModesPatches(self, roomModes, boost_temp=20,
+                          boost_temp_time=30):
+        """
+        Validates a batch of room modes and builds the PATCHes for each room
+        param roomModes: dict of roomId to mode
+        return: dict of roomId to list of patch data, sent in order
+        """
+        roomPatches = {}
+        for roomId, mode in roomModes.items():
+            patchData = self._roomModePatchData(roomId, mode, boost_temp,
+                                                boost_temp_time)
+            if mode.lower() == "boost":
+                roomPatches[roomId] = [patchData]
+            elif "RequestOverride" not in patchData:
+                roomPatches[roomId] = [dict(CANCEL_BOOST_PATCH, **patchData)]
+            else:
+                # The mode brings its own override, cancel the boost first
+                roomPatches[roomId] = [CANCEL_BOOST_PATCH, patchData]
+        return roomPatches
+
+    def enableProfiling(self, keep=PROFILE_KEEP, traceMemory=False,
+                        hook=None):
+        """
+        Records a phase by phase timing of every refresh, see wiserProfiler
+
+        param keep: Number of most recent profiles kept
+        param traceMemory: Also record the peak memory of each refresh
+        param hook: Optional callable called with each WiserRefreshProfile
+        return: The WiserRefreshProfiler
+        """
+        self.disableProfiling()
+        self.profiler = WiserRefreshProfiler(keep, traceMemory, hook)
+        return self.profiler
+
+    def disableProfiling(self):
+        profiler, self.profiler = self.profiler, None
+        if profiler is not None:
+            profiler.close()
+
+    def getRefreshProfiles(self):
+        """
+        return: list of the most recent WiserRefreshProfile, oldest first
+        """
+        return list(self.profiler.profiles) if self.profiler is not None \
+            else []
+
+    def enableHistory(self, capacity=HISTORY_CAPACITY):
+        """
+        Records room readings and relay states on every domain refresh, see
+        wiserHistory
+
+        param capacity: Number of samples kept
+        return: The WiserHistory, the current data is its first sample
+        """
+        if self.history is None or self.history.capacity != capacity:
+            self.history = WiserHistory(capacity)
+            if self.wiserHubData is not None:
+                self.history.record(self.wiserHubData, self.entityIndex,
+                                    time.time())
+        return self.history
+
+    def disableHistory(self):
+        self.history = None
+
+    def getSmartPlugs(self):
+        self.checkHubData()
+        return self.getHubData().get("SmartPlug")
+
+    def getSmartPlug(self,smartPlugId):
+        self.checkHubData()
+        plug = (self.entityIndex.get("SmartPlug") or {}).get(smartPlugId)
+        if plug is None:
+            # The plug was not found
+            raise WiserNotFound(
+                "Unable to find smartPlug {}".format(smartPlugId))
+        return plug
+
+    def getSmartPlugState(self, smartPlugId):
+        return self.getSmartPlug(smartPlugId).get("OutputState")
+
+    def getSmartPlugMode(self, smartPlugId):
+        return self.getSmartPlug(smartPlugId).get("Mode")
+
+    def _smartPlugStatePatchData(self, smartPlugState):
+        if smartPlugState.title() not in ["On", "Off"]:
+            _LOGGER.error("SmartPlug State must be either On or Off")
+            raise ValueError("SmartPlug State must be either On or Off")
+        return {"RequestOutput": smartPlugState.title()}
+
+    def _smartPlugModePatchData(self, smartPlugMode):
+        if smartPlugMode.title() not in ["Auto", "Manual"]:
+            _LOGGER.error("SmartPlug Mode must be either Auto or Manual")
+            raise ValueError("SmartPlug Mode must be either Auto or Manual")
+        return {"Mode": smartPlugMode.title()}
+
+    def _checkSmartPlugResponse(self, smartPlugId, statusCode, text):
+        """
+        Raises the matching exception for a failed smart plug PATCH
+        """
+        if statusCode != 200:
+            if statusCode == 404:
+                _LOGGER.debug("Set smart plug not found error ")
+                raise WiserNotFound(
+                    "Set smart plug {} not found error".format(smartPlugId))
+            else:
+                _LOGGER.debug(
+                    "Set smart plug error {} Response code = {}".format(
+                        text, statusCode))
+                raise WiserRESTException(
+                    "Error setting smartplug mode, msg {} , error {}".format(
+                        statusCode, text))
+
+
+class wiserHub(WiserHubBase):
+
+    def __init__(self, hubIP, secret, session=None,
+                 poolConnections=POOL_CONNECTIONS, poolMaxSize=POOL_MAXSIZE,
+                 timeout=TIMEOUT, maxAge=None, lazy=False, scheduler=None,
+                 metrics=None, snapshotPath=None, fetchExecutor=None):
+        """
+        param hubIP: IP address or hostname of the wiser hub
+        param secret: The hub secret
+        param session: Optional requests.Session to share a connection pool
+                       between several hubs, one is created if not supplied
+        param poolConnections: Number of host pools cached by the session
+        param poolMaxSize: Maximum keep-alive connections kept per host
+        param timeout: Timeout in seconds applied to every hub request
+        param maxAge: When set, getters transparently refresh the domain
+                      data once it is older than this many seconds. While
+                      the hub cannot be reached they serve the stale data
+                      and retry once per maxAge.
+        param lazy: When True nothing is fetched here, the domain and network
+                    payloads are each fetched the first time they are used
+        param scheduler: Optional wiserThrottle.WiserRequestScheduler which
+                         rate limits, backs off and opens a circuit for this
+                         hub
+        param metrics: Optional wiserMetrics.WiserMetrics to record requests
+                       in, share one between hubs to export a fleet, one is
+                       created if not supplied
+        param snapshotPath: Optional file the last good payloads are saved
+                            to, see wiserSnapshot. When it holds a snapshot
+                            the hub starts from it straight away and the
+                            first refresh runs in the background.
+        param fetchExecutor: Optional concurrent.futures.Executor the network
+                             payload is fetched on while refreshData fetches
+                             the domain payload. Hubs sharing one must not
+                             refresh more often at once than it has workers,
+                             a slow hub would hold up the others. Each hub
+                             starts its own worker thread if not supplied.
+        """
+        _LOGGER.info(
+            "WiserHub API Initialised : Version {}".format(__VERSION__))
+        self._initData()
+        self.hubIP = hubIP
+        self.hubSecret = secret
+        self.timeout = timeout
+        self.maxAge = maxAge
+        self.lazy = lazy
+        # Optional WiserWriteQueue, see enableWriteQueue
+        self.writeQueue = None
+        self.scheduler = scheduler
+        self.metrics = metrics if metrics is not None else WiserMetrics()
+        # Optional WiserRefreshProfiler, see enableProfiling
+        self.profiler = None
+        # Optional WiserHistory, see enableHistory
+        self.history = None
+        # Serialises refreshes triggered by expired data, see checkHubData
+        self._refreshLock = threading.Lock()
+        self._refreshCount = 0
+        # monotonic time of the last refresh triggered by expired data,
+        # failed or not
+        self._lastRefreshAttempt = None
+        self.headers = {'SECRET': self.hubSecret,
+                        'Content-Type': 'application/json;charset=UTF-8'}
+        # Persistent keep-alive transport, every hub call goes through it
+        self._ownsSession = session is None
+        if session is None:
+            session = self.createSession(poolConnections, poolMaxSize)
+        self.session = session
+        self._ownsFetchExecutor = fetchExecutor is None
+        if fetchExecutor is None:
+            # The thread is only started by the first refreshData
+            fetchExecutor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="wiserFetch")
+        self.fetchExecutor = fetchExecutor
+        self.snapshotStore = WiserSnapshotStore(snapshotPath) \
+            if snapshotPath is not None else None
+        # Future of the background refresh after a warm start from a
+        # snapshot, None otherwise
+        self.initialRefresh = None
+        if self.snapshotStore is not None and self._loadSnapshot():
+            if not lazy:
+                self.initialRefresh = self.__startBackgroundRefresh()
+        elif not lazy:
+            self.refreshData()  # Issue first refresh in init
+
+    @staticmethod
+    def createSession(poolConnections=POOL_CONNECTIONS,
+                      poolMaxSize=POOL_MAXSIZE):
+        """
+        Creates a keep-alive requests session with a bounded connection pool.
+        The session can be passed to several wiserHub instances so they
+        share one pool, connections are reused per hub.
+
+        param poolConnections: Number of host pools to cache
+        param poolMaxSize: Maximum number of connections kept per host
+        return: requests.Session
+        """
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=poolConnections,
+                              pool_maxsize=poolMaxSize, max_retries=0)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        return session
+
+    def close(self):
+        """
+        Sends any queued writes, then closes the pooled connections and
+        stops the fetch worker, shared sessions and executors are left open
+        """
+        self.disableWriteQueue()
+        if self._ownsSession:
+            self.session.close()
+        if self._ownsFetchExecutor:
+            self.fetchExecutor.shutdown(wait=False)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _sendRequest(self, method, url, patchData=None):
+        """
+        Sends a request to the hub over the pooled session
+        param method: HTTP method, GET or PATCH
+        param url: The full url
+        param patchData: JSON body for PATCH requests
+        return: requests.Response
+        """
+        endpoint = endpointOf(url)
+        if self.scheduler is not None:
+            try:
+                self.scheduler.acquire()
+            except WiserCircuitOpenException:
+                self.metrics.reject(self.hubIP, endpoint, method)
+                raise
+        sentAt = time.monotonic()
+        start = time.perf_counter()
+        try:
+            response = self.session.request(
+                method, url, headers=self.headers, json=patchData,
+                timeout=self.timeout)
+        except requests.RequestException as ex:
+            # Refreshes map timeouts, the setters raise them as they are
+            self.metrics.observe(
+                self.hubIP, endpoint, method, time.perf_counter() - start,
+                "WiserHubTimeoutException" if method == "GET" and
+                isinstance(ex, requests.Timeout) else type(ex).__name__)
+            if self.scheduler is not None:
+                self.scheduler.recordFailure(sentAt)
+            raise
+        except BaseException:
+            if self.scheduler is not None:
+                # Not the hub's fault, only release a half open trial
+                self.scheduler.releaseTrial()
+            raise
+        self.metrics.observe(self.hubIP, endpoint, method,
+                             time.perf_counter() - start,
+                             errorForStatus(response.status_code, method,
+                                            endpoint))
+        if self.scheduler is not None:
+            if response.status_code >= 500:
+                self.scheduler.recordFailure(sentAt)
+            else:
+                self.scheduler.recordSuccess()
+        return response
+
+    def checkHubData(self):
+        """
+        Method checks the hub data object is populated, if it is not then it
+        executes the refresh method, if the hubdata object is still null then
+        it raises an error
+
+        """
+        if self.wiserHubData is None or self.__refreshDue():
+            self.__refreshOnce()
+        if self.wiserHubData is None:
+            raise WiserHubDataNull(
+                "Hub data null even after refresh, aborting request")
+        # Otherwise continue
+
+    def checkNetworkData(self):
+        """
+        Fetches the network payload if it has not been received yet
+        """
+        if self.wiserNetworkData is None:
+            self.refreshNetworkData()
+        if self.wiserNetworkData is None:
+            raise WiserHubDataNull(
+                "Network data null even after refresh, aborting request")
+
+    def isDataStale(self):
+        """
+        Checks the age of the cached data against maxAge
+        return: True if maxAge is set and the data is older than it
+        """
+        if self.maxAge is None or self.lastRefreshTime is None:
+            return False
+        return time.monotonic() - self.lastRefreshTime > self.maxAge
+
+    def __refreshDue(self):
+        """
+        Expired data is refreshed at most once per maxAge, so getters do not
+        each retry a hub which cannot be reached
+        """
+        if not self.isDataStale():
+            return False
+        lastAttempt = self._lastRefreshAttempt
+        return lastAttempt is None or \
+            time.monotonic() - lastAttempt > self.maxAge
+
+    def __refreshOnce(self):
+        """
+        Refreshes the domain data with at most one refresh in flight.
+        Callers arriving while a refresh runs wait for it and use its result
+        instead of issuing their own. The getters only need the domain
+        payload, checkNetworkData fetches the network payload when it is
+        used.
+        """
+        refreshCount = self._refreshCount
+        with self._refreshLock:
+            if self._refreshCount != refreshCount:
+                # Another caller refreshed while we were waiting
+                return
+            self._lastRefreshAttempt = time.monotonic()
+            try:
+                self.refreshHubData()
+            finally:
+                self._refreshCount += 1
+
+    def refreshData(self):
+        """
+        Forces a refresh of data from the wiser hub, the domain and network
+        payloads are fetched concurrently
+        return: JSON Data
+        """
+
+        _LOGGER.info("Updating Wiser Hub Data")
+        with self._profiled("refreshData") as profile, self.__hubErrors():
+            networkFuture = self.fetchExecutor.submit(
+                self.__fetchNetworkData, profile)
+            writeSeq = self._writeSeq
+            self._applyHubData(*self.__fetchHubData(profile), profile=profile,
+                               writeSeq=writeSeq)
+            self._processNetworkData(networkFuture.result(), profile)
+            self._saveSnapshot()
+        return self.wiserHubData
+
+    def refreshHubData(self):
+        """
+        Refreshes only the domain payload (rooms, devices, schedules...)
+        return: JSON Data
+        """
+        _LOGGER.info("Updating Wiser Hub Domain Data")
+        with self._profiled("refreshHubData") as profile, self.__hubErrors():
+            writeSeq = self._writeSeq
+            self._applyHubData(*self.__fetchHubData(profile), profile=profile,
+                               writeSeq=writeSeq)
+            self._saveSnapshot()
+        return self.wiserHubData
+
+    def refreshNetworkData(self):
+        """
+        Refreshes only the network payload
+        return: JSON Data
+        """
+        _LOGGER.info("Updating Wiser Hub Network Data")
+        with self._profiled("refreshNetworkData") as profile, \
+                self.__hubErrors():
+            self._processNetworkData(self.__fetchNetworkData(profile), profile)
+            self._saveSnapshot()
+        return self.wiserNetworkData
+
+    def refreshRoom(self, roomId):
+        """
+        Fetches a single room and splices it into the cached data, cheaper
+        than refreshHubData when only one room is watched
+        return: The room
+        """
+        return self._refreshEntity("Room", roomId,
+                                   WISERROOM.format(self.hubIP, roomId))
+
+    def refreshRooms(self):
+        """
+        Fetches the rooms only and splices them into the cached data
+        return: list of rooms
+        """
+        return self._refreshCollection("Room")
+
+    def refreshSmartPlug(self, smartPlugId):
+        """
+        Fetches a single smart plug and splices it into the cached data
+        return: The smart plug
+        """
+        return self._refreshEntity(
+            "SmartPlug", smartPlugId,
+            WISERSMARTPLUGURL.format(self.hubIP, smartPlugId))
+
+    def refreshSmartPlugs(self):
+        """
+        Fetches the smart plugs only and splices them into the cached data
+        return: list of smart plugs
+        """
+        return self._refreshCollection(
+            "SmartPlug", WISERSMARTPLUGSURL.format(self.hubIP))
+
+    def refreshSchedule(self, scheduleId):
+        """
+        Fetches a single schedule and splices it into the cached data
+        return: The schedule
+        """
+        return self._refreshEntity(
+            "Schedule", scheduleId,
+            WISERSCHEDULEURL.format(self.hubIP, scheduleId))
+
+    def refreshHotwater(self):
+        """
+        Fetches the hot water state only and splices it into the cached data
+        return: list of hot water entities
+        """
+        return self._refreshCollection("HotWater")
+
+    def refreshHeatingChannels(self):
+        """
+        Fetches the heating channels, which hold the heating relay state,
+        and splices them into the cached data
+        return: list of heating channels
+        """
+        return self._refreshCollection("HeatingChannel")
+
+    def _refreshEntity(self, entityType, entityId, url=None):
+        """
+        GETs one entity of the domain payload and splices it in
+        param entityType: Collection name, e.g. Room
+        param entityId: The entity id
+        param url: Entity url, derived from the collection name if not given
+        return: The fresh entity, the cached one on connection errors
+        """
+        self.checkHubData()
+        with self.__hubErrors():
+            writeSeq = self._writeSeq
+            entity = self.__fetchDomainPart(
+                url or WISERENTITYURL.format(self.hubIP, entityType,
+                                             entityId))
+            self._spliceEntity(entityType, entity, writeSeq)
+        return (self.entityIndex.get(entityType) or {}).get(entityId)
+
+    def _refreshCollection(self, entityType, url=None):
+        """
+        GETs one collection of the domain payload and splices it in
+        param entityType: Collection name, e.g. SmartPlug
+        param url: Collection url, derived from the name if not given
+        return: The fresh collection, the cached one on connection errors
+        """
+        self.checkHubData()
+        with self.__hubErrors():
+            writeSeq = self._writeSeq
+            entities = self.__fetchDomainPart(
+                url or WISERCOLLECTIONURL.format(self.hubIP, entityType))
+            self._spliceCollection(entityType, entities, writeSeq)
+        return self.wiserHubData.get(entityType)
+
+    def __fetchDomainPart(self, url):
+        resp = self._sendRequest("GET", url)
+        resp.raise_for_status()
+        return wiserJson.loads(resp.content)
+
+    def __fetchHubData(self, profile=None):
+        """
+        return: tuple of the raw bytes and the decoded payload, which is None
+                when the bytes are those the cached data was decoded from
+        """
+        with phase(profile, "domainHttp"):
+            resp = self._sendRequest("GET", WISERHUBURL.format(self.hubIP))
+            resp.raise_for_status()
+            content = resp.content
+            self._rawPayloads["domain"] = content
+        if self._payloadUnchanged("domain", content):
+            return content, None
+        with phase(profile, "domainDecode"):
+            try:
+                return content, wiserJson.loads(content)
+            except ValueError:
+                # Not UTF-8, let requests guess the encoding
+                return content, resp.json()
+
+    def __fetchNetworkData(self, profile=None):
+        # The Wiser Heat Hub can return invalid JSON, the raw bytes are
+        # cleaned in _processNetworkData before parsing
+        with phase(profile, "networkHttp"):
+            resp = self._sendRequest("GET", WISERNETWORKURL.format(self.hubIP))
+            resp.raise_for_status()
+            self._rawPayloads["network"] = resp.content
+            return resp.content
+
+    def __startBackgroundRefresh(self):
+        """
+        Runs the first refresh on its own thread
+        return: concurrent.futures.Future of the domain payload
+        """
+        future = concurrent.futures.Future()
+
+        def run():
+            try:
+                self.__refreshOnce()
+            except Exception as ex:
+                _LOGGER.warning(
+                    "Background refresh of Wiser Hub {} failed: {}".format(
+                        self.hubIP, ex))
+                future.set_exception(ex)
+            else:
+                future.set_result(self.wiserHubData)
+
+        threading.Thread(target=run, name="wiserHubRefresh",
+                         daemon=True).start()
+        return future
+
+    @contextlib.contextmanager
+    def __hubErrors(self):
+        """
+        Maps transport errors raised while refreshing to the module
+        exceptions, connection errors and responses cut off mid body are
+        logged and leave the data as is
+        """
+        try:
+            yield
+        except requests.Timeout:
+            _LOGGER.debug(
+                "Connection timed out trying to update from Wiser Hub")
+            raise WiserHubTimeoutException("The connection timed out.")
+        except requests.HTTPError as ex:
+            if ex.response.status_code == 401:
+                raise WiserHubAuthenticationException("Authentication error.  Check secret key.")
+            elif ex.response.status_code == 404:
+                raise WiserRESTException("Not Found.")
+            else:
+                raise WiserRESTException("Unknown Error.")
+        except (requests.ConnectionError,
+                requests.exceptions.ChunkedEncodingError):
+            _LOGGER.debug("Connection error trying to update from Wiser Hub")
+        except WiserCircuitOpenException:
+            if self.wiserHubData is None:
+                raise
+            # Fail fast and keep serving the cached data
+            _LOGGER.debug("Circuit open, serving cached Wiser Hub data")
+
+    def getDeviceRoom(self, deviceId):
+        """
+        Convinience function to return the name of a room which is associated
+        with a device (roomstat or trf)
+        param deviceId:
+        return: Name of Room associated with a device ID
+        """
+        self.checkHubData()
+        if _LOGGER.isEnabledFor(logging.DEBUG):
+            # Formatting the whole map is not free, only do it when logged
+            _LOGGER.debug(" getDeviceRoom called, valve2roomMap is {} ".format(
+                self.device2roomMap))
+        if not self.device2roomMap:
+            self.refreshData()
+        # This will return None if no device found, thats ok
+        return self.device2roomMap[deviceId]
+
+    def setHotwaterMode(self, mode):
+        """
+          Switch Hot Water on or off manually, or reset to 'Auto' (schedule).
+          'mode' can be "on", "off" or "auto".
+        """
+        _url, patchData = self._hotwaterModeRequest(mode)
+        if self.__queueWrite(("HotWater", None), self.setHotwaterMode, mode):
+            return True
+        response = self._sendRequest("PATCH", _url, patchData)
+        if response.status_code != 200:
+            _LOGGER.debug(
+                "Set DHW Response code = {}".format(response.status_code))
+            raise WiserRESTException(
+                "Error setting hot water mode to {}, error {} {}".
+                    format(mode.lower(), response.status_code, response.text))
+        self._recordWrite("HotWater", self.wiserHubData.get("HotWater")[0].
+                          get("id"), patchData)
+        return True
+
+    def setSystemSwitch(self, switch, mode=False):
+        """
+        Sets a system switch. For details of which switches to set look at the System section of the payload from the wiserhub
+        :param switch: Name of Switch
+        :param mode: Value of mode
+        :return:
+        """
+        patchData = {switch: mode}
+        url = WISERHUBURL + "System"
+
+        _LOGGER.debug("patchdata {} ".format(patchData))
+        response = self._sendRequest("PATCH", url.format(self.hubIP),
+                                     patchData)
+        if response.status_code != 200:
+            _LOGGER.debug("Set {} Response code = {}".format(switch,
+                                                             response.status_code))
+            raise WiserRESTException(
+                "Error setting {} , error {} {}".format(switch,
+                                                        response.status_code,
+                                                        response.text))
+        self._recordWrite("System", None, patchData)
+
+    def setRoomSchedule(self, roomId, scheduleData: dict, force=False):
+        """
+        Sets Room Schedule, only the days which differ from the cached
+        schedule are sent and nothing is sent when none do
+
+        param roomId:
+        param scheduleData: json data for schedule
+        param force: Send every day of scheduleData whatever the cache holds
+        return: True if the schedule was written, False if it was unchanged
+        """
+        scheduleId = self.getRoom(roomId).get("ScheduleId")
+
+        if scheduleId is not None:
+            patchData = self._schedulePatchData(scheduleId, scheduleData,
+                                                force)
+            if not patchData:
+                _LOGGER.debug("Schedule of room {} unchanged".format(roomId))
+                return False
+            response = self._sendRequest(
+                "PATCH", WISERSCHEDULEURL.format(self.hubIP, scheduleId),
+                patchData)
+
+            if response.status_code != 200:
+                _LOGGER.debug("Set Schedule Response code = {}".format(
+                    response.status_code))
+                raise WiserRESTException(
+                    "Error setting schedule for room {} , error {} {}".format(
+                        roomId, response.status_code, response.text))
+            self._recordWrite("Schedule", scheduleId, patchData)
+            return True
+        else:
+            raise WiserNotFound("No schedule found that matches roomId")
+
+    def setRoomScheduleFromFile(self, roomId, scheduleFile: str):
+        """
+        Sets Room Schedule
+
+        param roomId:
+        param scheduleData: json data for schedule
+        return: True if the schedule was written, False if it was unchanged
+        """
+        scheduleId = self.getRoom(roomId).get("ScheduleId")
+
+
+        if scheduleId is not None:
+            if os.path.exists(scheduleFile):
+                try:
+                    with open(scheduleFile, 'r') as f:
+                        scheduleData = json.load(f)
+                except:
+                    raise Exception(
+                        "Error reading file {}".format(scheduleFile))
+
+                return self.setRoomSchedule(roomId, scheduleData)
+            else:
+                raise FileNotFoundError("Schedule file, {}, not found.".format(
+                    os.path.abspath(scheduleFile)))
+        else:
+            raise WiserNotFound("No schedule found that matches roomId")
+
+    def copyRoomSchedule(self, fromRoomId, toRoomId):
+        """
+        Copies Room Schedule from one room to another
+
+        param fromRoomId:
+        param toRoomId:
+        return: True if the schedule was written, False if it was unchanged
+        """
+        scheduleData = self.getRoomSchedule(fromRoomId)
+
+        if scheduleData is not None:
+            return self.setRoomSchedule(toRoomId, scheduleData)
+        else:
+            raise WiserNotFound(
+                "Error copying schedule.  One of the room Ids is not valid")
+
+    def copyRoomSchedules(self, fromRoomId, toRoomIds,
+                          maxWorkers=WRITE_WORKERS):
+        """
+        Copies the schedule of one room to many rooms. Rooms sharing a
+        schedule are written once and the writes are sent concurrently.
+
+        param fromRoomId: Room to copy the schedule from
+        param toRoomIds: Iterable of rooms to copy it to
+        param maxWorkers: Maximum number of writes in flight
+        return: dict of room id to True if its schedule was written, False
+                if it already matched, or the exception raised for it
+        """
+        scheduleData = self.getRoomSchedule(fromRoomId)
+        return self.__setSchedules(
+            {roomId: scheduleData for roomId in toRoomIds}, maxWorkers)
+
+    def __setSchedules(self, roomSchedules, maxWorkers):
+        """
+        Writes schedules to rooms, once per distinct ScheduleId
+        param roomSchedules: dict of room id to schedule data
+        return: dict of room id to True, False or the exception raised
+        """
+        sharedRooms, results = self._groupRoomsBySchedule(roomSchedules)
+        tasks = {}
+        for scheduleId, roomIds in sharedRooms.items():
+            patchData = self._schedulePatchData(
+                scheduleId, roomSchedules[roomIds[0]])
+            if patchData:
+                tasks[scheduleId] = functools.partial(
+                    self.__sendSchedulePatch, roomIds[0], scheduleId,
+                    patchData)
+        sent = self._runBatch(tasks, maxWorkers)
+        for scheduleId, roomIds in sharedRooms.items():
+            for roomId in roomIds:
+                results[roomId] = sent.get(scheduleId, False)
+        return results
+
+    def exportRoomSchedules(self, directory, roomIds=None,
+                            maxWorkers=WRITE_WORKERS):
+        """
+        Writes the cached schedule of each room to directory as
+        room<id>schedule.json, the files setRoomScheduleFromFile and
+        importRoomSchedules read. No hub calls are made.
+
+        param directory: Directory to write to, created if missing
+        param roomIds: Optional rooms to export, all rooms if not given
+        param maxWorkers: Maximum number of files written at once
+        return: dict of room id to the file written, or the exception
+                raised for it
+        """
+        self.checkHubData()
+        os.makedirs(directory, exist_ok=True)
+        if roomIds is None:
+            roomIds = [room.get("id") for room in self.getRooms() or ()]
+        return self._runBatch(
+            {roomId: functools.partial(self._exportRoomSchedule, directory,
+                                       roomId)
+             for roomId in roomIds}, maxWorkers)
+
+    def importRoomSchedules(self, directory, roomIds=None,
+                            maxWorkers=WRITE_WORKERS):
+        """
+        Sets room schedules from the room<id>schedule.json files of a
+        directory, e.g. one written by exportRoomSchedules. Each file is
+        read by the worker which then writes it, so reads and hub writes
+        overlap. Rooms sharing a schedule are written once, from the file
+        of the first of them, and only the days which differ from the cached
+        schedules are sent.
+
+        param directory: Directory holding the schedule files
+        param roomIds: Optional rooms to import, every room with a file in
+                       directory if not given
+        param maxWorkers: Maximum number of files read and written at once
+        return: dict of room id to True if its schedule was written, False
+                if it already matched, or the exception raised for it
+        """
+        roomFiles = self._scheduleFiles(directory, roomIds)
+        sharedRooms, results = self._groupRoomsBySchedule(roomFiles)
+        sent = self._runBatch(
+            {scheduleId: functools.partial(
+                self.__importSchedule, scheduleId,
+                [(roomId, roomFiles[roomId]) for roomId in roomIds])
+             for scheduleId, roomIds in sharedRooms.items()}, maxWorkers)
+        for scheduleId, roomIds in sharedRooms.items():
+            for roomId in roomIds:
+                results[roomId] = sent[scheduleId]
+        return results
+
+    def __importSchedule(self, scheduleId, roomFiles):
+        roomId, path = roomFiles[0]
+        scheduleData = self._readScheduleFile(path)
+        self._checkSharedScheduleFiles(scheduleId, scheduleData,
+                                       roomFiles[1:])
+        patchData = self._schedulePatchData(scheduleId, scheduleData)
+        if not patchData:
+            return False
+        return self.__sendSchedulePatch(roomId, scheduleId, patchData)
+
+    def __sendSchedulePatch(self, roomId, scheduleId, patchData):
+        response = self._sendRequest(
+            "PATCH", WISERSCHEDULEURL.format(self.hubIP, scheduleId),
+            patchData)
+        if response.status_code != 200:
+            raise WiserRESTException(
+                "Error setting schedule for room {} , error {} {}".format(
+                    roomId, response.status_code, response.text))
+        self._recordWrite("Schedule", scheduleId, patchData)
+        return True
+
+    def setHomeAwayMode(self, mode, temperature=10):
+        """
+        Sets default Home or Away mode, optionally allows you to set a temperature for away mode
+
+        param mode: HOME   | AWAY
+
+        param temperature: Temperature between 5-30C or -20 for OFF
+
+        return:
+        """
+        _LOGGER.info(
+            "Setting Home/Away mode to : {} {} C".format(mode, temperature))
+        patchData = self._homeAwayPatchData(mode, temperature)
+        response = self._sendRequest("PATCH", WISERMODEURL.format(self.hubIP),
+                                     patchData)
+        if response.status_code != 200:
+            _LOGGER.debug("Set Home/Away Response code = {}".format(
+                response.status_code))
+            raise ValueError("Error setting Home/Away , error {} {}".format(
+                response.status_code, response.text))
+
+    def setRoomTemperature(self, roomId, temperature):
+        """
+        Sets the room temperature
+        param roomId:  The Room ID
+        param temperature:  The temperature in celcius from 5 to 30, -20 for Off
+        """
+        _LOGGER.info(
+            "Set Room {} Temperature to = {} ".format(roomId, temperature))
+        patchData = self._roomTemperaturePatchData(temperature)
+        if self.__queueWrite(("Room", roomId), self.setRoomTemperature,
+                             roomId, temperature):
+            return
+        response = self._sendRequest("PATCH", WISERSETROOMTEMP.format(
+            self.hubIP, roomId), patchData)
+        if response.status_code != 200:
+            _LOGGER.error(
+                "Set Room {} Temperature to = {} resulted in {}".format(roomId,
+                                                                        temperature,
+                                                                        response.status_code))
+            raise WiserRESTException(
+                "Error setting temperature, error {} ".format(
+                    response.text))
+        self._recordWrite("Room", roomId, patchData)
+        _LOGGER.debug(
+            "Set room Temp, error {} ({})".format(response.status_code,
+                                                  response.text))
+
+    def setRoomMode(self, roomId, mode, boost_temp=20, boost_temp_time=30):
+        """
+        Set the Room Mode, this can be Auto, Manual, off or Boost. When you set the mode back to Auto it will automatically take the scheduled temperature
+
+        param roomId: RoomId
+
+        param mode:  Mode (auto, manual off, or boost)
+
+        param boost_temp:  If boosting enter the temperature here in C, can be between 5-30
+
+        param boost_temp_time:  How long to boost for in minutes
+
+        """
+        # TODO
+        _LOGGER.debug("Set Mode {} for a room {} ".format(mode, roomId))
+        patchData = self._roomModePatchData(roomId, mode, boost_temp,
+                                            boost_temp_time)
+        if self.__queueWrite(("Room", roomId), self.setRoomMode, roomId, mode,
+                             boost_temp, boost_temp_time):
+            return
 
         # if not a boost operation cancel any current boost
         if mode.lower() != "boost":
-            cancelBoostPostData = {
-                "RequestOverride": {"Type": "None", "DurationMinutes": 0,
-                                    "SetPoint": 0, "Originator": "App"}}
-
-            response = requests.patch(
-                WISERROOM.format(self.hubIP, roomId), headers=self.headers,
-                json=cancelBoostPostData, timeout=TIMEOUT)
+            response = self._sendRequest(
+                "PATCH", WISERROOM.format(self.hubIP, roomId),
+                CANCEL_BOOST_PATCH)
             if response.status_code != 200:
                 _LOGGER.error("Cancelling boost resulted in {}".format(
                     response.status_code))
                 raise WiserRESTException(
                     "Error cancelling boost {} ".format(mode))
+            self._recordWrite("Room", roomId, CANCEL_BOOST_PATCH)
 
         # Set new mode
-        response = requests.patch(WISERROOM.format(
-            self.hubIP, roomId), headers=self.headers, json=patchData,
-            timeout=TIMEOUT)
+        response = self._sendRequest("PATCH", WISERROOM.format(
+            self.hubIP, roomId), patchData)
         if response.status_code != 200:
             _LOGGER.error(
                 "Set Room {} to Mode {} resulted in {}".format(roomId, mode,
@@ -688,97 +2113,155 @@ class wiserHub:
             raise WiserRESTException(
                 "Error setting mode to {}, error {} ".format(mode,
                                                              response.text))
+        self._recordWrite("Room", roomId, patchData)
         _LOGGER.debug(
             "Set room mode, error {} ({})".format(response.status_code,
                                                   response.text))
 
-    def getSmartPlugs(self):
-        self.checkHubData()
-        return self.getHubData().get("SmartPlug")
+    def setRoomTemperatures(self, roomTemperatures, maxWorkers=WRITE_WORKERS):
+        """
+        Sets the temperature of several rooms. Every temperature is validated
+        before anything is sent, the rooms are then set concurrently.
 
-    def getSmartPlug(self,smartPlugId):
-        self.checkHubData()
-        if self.getHubData().get("SmartPlug") is not None:
-            for plug in self.getHubData().get("SmartPlug"):
-                if plug.get("id") == smartPlugId:
-                    return plug
-        # If we get here then the plug was not found
-        raise WiserNotFound("Unable to find smartPlug {}".format(smartPlugId))
+        param roomTemperatures: dict of roomId to temperature in C
+        param maxWorkers: Maximum number of PATCHes in flight
+        return: dict of roomId to True or the exception raised for that room
+        """
+        roomPatches = {roomId: [self._roomTemperaturePatchData(temperature)]
+                       for roomId, temperature in roomTemperatures.items()}
+        return self._runBatch(
+            {roomId: functools.partial(self.__sendRoomPatches, roomId,
+                                       patches)
+             for roomId, patches in roomPatches.items()}, maxWorkers)
+
+    def setRoomModes(self, roomModes, boost_temp=20, boost_temp_time=30,
+                     maxWorkers=WRITE_WORKERS):
+        """
+        Sets the mode of several rooms, see setRoomMode. Every mode is
+        validated before anything is sent, the rooms are then set
+        concurrently. For auto the boost cancel and the mode change are
+        merged into a single PATCH.
+
+        param roomModes: dict of roomId to mode (auto, manual, off or boost)
+        param boost_temp:  Boost temperature in C for rooms set to boost
+        param boost_temp_time:  Boost duration in minutes
+        param maxWorkers: Maximum number of rooms being written at once
+        return: dict of roomId to True or the exception raised for that room
+        """
+        roomPatches = self._roomModesPatches(roomModes, boost_temp,
+                                             boost_temp_time)
+        return self._runBatch(
+            {roomId: functools.partial(self.__sendRoomPatches, roomId,
+                                       patches)
+             for roomId, patches in roomPatches.items()}, maxWorkers)
+
+    def __sendRoomPatches(self, roomId, patches):
+        for patchData in patches:
+            response = self._sendRequest(
+                "PATCH", WISERROOM.format(self.hubIP, roomId), patchData)
+            if response.status_code != 200:
+                _LOGGER.error("Patching room {} resulted in {}".format(
+                    roomId, response.status_code))
+                raise WiserRESTException(
+                    "Error setting room {}, error {} {}".format(
+                        roomId, response.status_code, response.text))
+            self._recordWrite("Room", roomId, patchData)
+        return True
 
-    def getSmartPlugState(self, smartPlugId):
-        self.checkHubData()
-        if self.getHubData().get("SmartPlug") is not None:
-            for plug in self.getHubData().get("SmartPlug"):
-                if plug.get("id") == smartPlugId:
-                    return plug.get("OutputState")
-        # If we get here then the plug was not found
-        raise WiserNotFound("Unable to find smartPlug {}".format(smartPlugId))
+    def enableWriteQueue(self, debounce=WRITE_DEBOUNCE):
+        """
+        Queues room, smart plug and hot water writes instead of sending them
+        straight away. Only the latest value per target is sent, debounce
+        seconds after the first queued write. Setter arguments are still
+        validated when the setter is called.
 
-    def setSmartPlugState(self, smartPlugId, smartPlugState):
+        param debounce: Seconds to collect writes before flushing
+        return: The WiserWriteQueue
+        """
+        if self.writeQueue is None:
+            self.writeQueue = WiserWriteQueue(self, debounce)
+        self.writeQueue.debounce = debounce
+        return self.writeQueue
 
-        if smartPlugState.title() not in ["On", "Off"]:
-            _LOGGER.error("SmartPlug State must be either On or Off")
-            raise ValueError("SmartPlug State must be either On or Off")
+    def disableWriteQueue(self):
+        """
+        Flushes any queued writes and goes back to sending writes directly
+        return: dict of target to True or the exception raised by its write
+        """
+        writeQueue, self.writeQueue = self.writeQueue, None
+        return writeQueue.flush() if writeQueue is not None else {}
+
+    def flushWrites(self):
+        """
+        Sends all queued writes now
+        return: dict of target to True or the exception raised by its write
+        """
+        return self.writeQueue.flush() if self.writeQueue is not None else {}
+
+    def __queueWrite(self, key, setter, *args):
+        """
+        Hands a write to the write queue when one is enabled
+        return: True if the write was queued
+        """
+        if self.writeQueue is None or self.writeQueue.isFlushing():
+            return False
+        self.writeQueue.submit(key, setter, args)
+        return True
+
+    def _runBatch(self, tasks, maxWorkers=WRITE_WORKERS):
+        """
+        Runs independent hub calls concurrently
+
+        param tasks: dict of key to callable taking no arguments
+        param maxWorkers: Maximum number of calls in flight
+        return: dict of key to the callable's result, or the exception it
+                raised
+        """
+        results = {}
+        if not tasks:
+            return results
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=min(maxWorkers, len(tasks))) as executor:
+            futures = {key: executor.submit(task)
+                       for key, task in tasks.items()}
+            for key, future in futures.items():
+                try:
+                    results[key] = future.result()
+                except Exception as ex:
+                    results[key] = ex
+        return results
+
+    def setSmartPlugState(self, smartPlugId, smartPlugState):
 
         url = WISERSMARTPLUGURL.format(self.hubIP, smartPlugId)
-        patchData = {"RequestOutput": smartPlugState.title()}
+        patchData = self._smartPlugStatePatchData(smartPlugState)
+        if self.__queueWrite(("SmartPlugState", smartPlugId),
+                             self.setSmartPlugState, smartPlugId,
+                             smartPlugState):
+            return
 
         _LOGGER.debug(
             "Setting smartplug status patchdata {} ".format(patchData))
-        response = requests.patch(url=url.format(self.hubIP),
-                                  headers=self.headers,
-                                  json=patchData,
-                                  timeout=TIMEOUT)
+        response = self._sendRequest("PATCH", url, patchData)
         if response.status_code != 200:
-            if response.status_code == 404:
-                _LOGGER.debug("Set smart plug not found error ")
-                raise WiserNotFound(
-                    "Set smart plug {} not found error".format(smartPlugId))
-            else:
-                _LOGGER.debug(
-                    "Set smart plug error {} Response code = {}".format(
-                        response.text, response.status_code))
-                raise WiserRESTException(
-                    "Error setting smartplug mode, msg {} , error {}".format(
-                        response.status_code,
-                        response.text))
-
-    def getSmartPlugMode(self, smartPlugId):
-        self.checkHubData()
-        if self.getHubData().get("SmartPlug") is not None:
-            for plug in self.getHubData().get("SmartPlug"):
-                if plug.get("id") == smartPlugId:
-                    return plug.get("Mode")
-        # If we get here then the plug was not found
-        raise WiserNotFound("Unable to find smartPlug {}".format(smartPlugId))
+            self._checkSmartPlugResponse(smartPlugId, response.status_code,
+                                         response.text)
+        self._recordWrite("SmartPlug", smartPlugId, patchData)
 
     def setSmartPlugMode(self, smartPlugId, smartPlugMode):
 
-        if smartPlugMode.title() not in ["Auto", "Manual"]:
-            _LOGGER.error("SmartPlug Mode must be either Auto or Manual")
-            raise ValueError("SmartPlug Mode must be either Auto or Manual")
-
         url = WISERSMARTPLUGURL.format(self.hubIP, smartPlugId)
-        patchData = {"Mode": smartPlugMode.title()}
+        patchData = self._smartPlugModePatchData(smartPlugMode)
+        if self.__queueWrite(("SmartPlugMode", smartPlugId),
+                             self.setSmartPlugMode, smartPlugId,
+                             smartPlugMode):
+            return
 
         _LOGGER.debug(
             "Setting smartplug status patchdata {} ".format(patchData))
-        response = requests.patch(url=url.format(self.hubIP),
-                                  headers=self.headers,
-                                  json=patchData,
-                                  timeout=TIMEOUT)
+        response = self._sendRequest("PATCH", url, patchData)
         if response.status_code != 200:
-            if response.status_code == 404:
-                _LOGGER.debug("Set smart plug not found error ")
-                raise WiserNotFound(
-                    "Set smart plug {} not found error".format(smartPlugId))
-            else:
-                _LOGGER.debug(
-                    "Set smart plug error {} Response code = {}".format(
-                        response.text, response.status_code))
-                raise WiserRESTException(
-                    "Error setting smartplug mode, msg {} , error {}".format(
-                        response.status_code,
-                        response.text))
-
+            self._checkSmartPlugResponse(smartPlugId, response.status_code,
+                                         response.text)
+        self._recordWrite("SmartPlug", smartPlugId, patchData)
 
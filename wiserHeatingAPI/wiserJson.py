@@ -0,0 +1,80 @@
+"""
+# Wiser API Facade, JSON decoding
+
+Hub payloads are decoded with the fastest JSON library installed, orjson
+then ujson, falling back to the standard library. useBackend() forces one.
+
+The hub can send invalid JSON in the network payload, sanitize() removes the
+offending bytes in a single pass and returns the payload untouched, without
+copying it, when there is nothing to remove.
+"""
+
+import json
+import logging
+import re
+
+_LOGGER = logging.getLogger(__name__)
+
+# Every byte outside the printable range 0x20-0x7F is dropped by sanitize
+_INVALID_BYTES = bytes(range(0x20)) + bytes(range(0x80, 0x100))
+_INVALID_BYTE_RE = re.compile(rb'[^\x20-\x7F]')
+
+
+def _loadBackends():
+    backends = {"json": json.loads}
+    try:
+        import ujson
+        backends["ujson"] = ujson.loads
+    except ImportError:
+        pass
+    try:
+        import orjson
+        backends["orjson"] = orjson.loads
+    except ImportError:
+        pass
+    return backends
+
+
+BACKENDS = _loadBackends()
+
+# Preferred order when picking the default backend
+BACKEND_PREFERENCE = ("orjson", "ujson", "json")
+
+backendName = next(name for name in BACKEND_PREFERENCE if name in BACKENDS)
+_loads = BACKENDS[backendName]
+
+
+def useBackend(name):
+    """
+    Selects the JSON library used to decode hub payloads
+
+    param name: orjson, ujson or json
+    """
+    global backendName, _loads
+    if name not in BACKENDS:
+        raise ValueError("JSON backend {} is not installed, available {}".
+                         format(name, sorted(BACKENDS)))
+    backendName = name
+    _loads = BACKENDS[name]
+    _LOGGER.debug("Using JSON backend {}".format(name))
+
+
+def loads(data):
+    """
+    Decodes a JSON payload
+    param data: bytes or str
+    return: decoded JSON
+    """
+    return _loads(data)
+
+
+def sanitize(content):
+    """
+    Removes all non-printable characters from a raw hub payload
+
+    param content: bytes
+    return: bytes, the same object when it was already clean
+    """
+    if _INVALID_BYTE_RE.search(content) is None:
+        return content
+    return content.translate(None, _INVALID_BYTES)
@@ -0,0 +1,236 @@
+"""
+# Wiser API Facade, request metrics
+
+Every wiserHub records each request it sends in a WiserMetrics object:
+request counts, errors by the exception class the caller sees and a latency
+histogram, all per hub and per endpoint (domain, network, room, schedule,
+smartplug, hotwater, system). Requests an open circuit fails fast are never
+sent, they are counted apart as rejected. Share one WiserMetrics between
+many hubs to export a whole fleet at once:
+
+    metrics = WiserMetrics()
+    hub = wiserHub(hubIP, secret, metrics=metrics)
+    ...
+    text = metrics.toPrometheus()
+
+toPrometheus returns the Prometheus text exposition format.
+"""
+
+import threading
+
+# Upper bounds in seconds of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRIC_PREFIX = "wiser_hub"
+
+
+def endpointOf(url):
+    """
+    Names the endpoint a hub url belongs to
+    param url: The full url
+    return: domain, network or the lower case domain collection, e.g. room
+    """
+    path = url.split("/data/", 1)[-1]
+    parts = [part for part in path.split("/") if part]
+    if not parts:
+        return "unknown"
+    if parts[0] != "domain":
+        return parts[0]
+    if len(parts) == 1:
+        return "domain"
+    return parts[1].lower()
+
+
+def errorForStatus(status, method="GET", endpoint=None):
+    """
+    Refreshes (GET) raise WiserHubAuthenticationException or
+    WiserRESTException for a failed response, the setters (PATCH) raise
+    WiserRESTException for anything but 200, WiserNotFound for a smart plug
+    which does not exist
+
+    return: name of the exception the caller sees for a response status,
+            None for a successful response
+    """
+    if method == "PATCH":
+        if status == 200:
+            return None
+        if status == 404 and endpoint == "smartplug":
+            return "WiserNotFound"
+        return "WiserRESTException"
+    if status < 400:
+        return None
+    if status == 401:
+        return "WiserHubAuthenticationException"
+    return "WiserRESTException"
+
+
+def _escapeLabel(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").\
+        replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(
+        "{}=\"{}\"".format(name, _escapeLabel(value))
+        for name, value in labels.items()) + "}"
+
+
+class WiserMetrics:
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        """
+        param buckets: Increasing upper bounds in seconds of the latency
+                       histogram buckets
+        """
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # (hubIP, endpoint, method) -> number of requests
+        self._requests = {}
+        # (hubIP, endpoint, error) -> number of errors
+        self._errors = {}
+        # (hubIP, endpoint, method) -> number of requests never sent
+        self._rejected = {}
+        # (hubIP, endpoint) -> [count per bucket, sum, count]
+        self._latency = {}
+
+    def observe(self, hubIP, endpoint, method, elapsed, error=None):
+        """
+        Records one request
+
+        param hubIP: The hub the request went to
+        param endpoint: Endpoint name, see endpointOf
+        param method: HTTP method
+        param elapsed: Seconds until the response was read, None when the
+                       request was never sent
+        param error: Name of the exception the request ended in, if any
+        """
+        with self._lock:
+            key = (hubIP, endpoint, method)
+            self._requests[key] = self._requests.get(key, 0) + 1
+            if error is not None:
+                key = (hubIP, endpoint, error)
+                self._errors[key] = self._errors.get(key, 0) + 1
+            if elapsed is None:
+                return
+            histogram = self._latency.get((hubIP, endpoint))
+            if histogram is None:
+                histogram = [[0] * len(self.buckets), 0.0, 0]
+                self._latency[(hubIP, endpoint)] = histogram
+            for index, bound in enumerate(self.buckets):
+                if elapsed <= bound:
+                    histogram[0][index] += 1
+                    break
+            histogram[1] += elapsed
+            histogram[2] += 1
+
+    def reject(self, hubIP, endpoint, method):
+        """
+        Records a request an open circuit failed fast without sending it
+        """
+        with self._lock:
+            key = (hubIP, endpoint, method)
+            self._rejected[key] = self._rejected.get(key, 0) + 1
+
+    def requestCount(self, hubIP=None, endpoint=None):
+        """
+        return: number of requests, optionally only to one hub or endpoint
+        """
+        with self._lock:
+            return sum(count for (hub, name, _), count
+                       in self._requests.items()
+                       if hubIP in (None, hub) and endpoint in (None, name))
+
+    def errorCount(self, hubIP=None, endpoint=None, error=None):
+        """
+        return: number of errors, optionally only of one hub, endpoint or
+                exception class name
+        """
+        with self._lock:
+            return sum(count for (hub, name, errorName), count
+                       in self._errors.items()
+                       if hubIP in (None, hub) and endpoint in (None, name)
+                       and error in (None, errorName))
+
+    def rejectedCount(self, hubIP=None, endpoint=None):
+        """
+        return: number of rejected requests, optionally only to one hub or
+                endpoint
+        """
+        with self._lock:
+            return sum(count for (hub, name, _), count
+                       in self._rejected.items()
+                       if hubIP in (None, hub) and endpoint in (None, name))
+
+    def meanLatency(self, hubIP=None, endpoint=None):
+        """
+        return: mean latency in seconds, None if nothing was recorded
+        """
+        with self._lock:
+            histograms = [histogram for (hub, name), histogram
+                          in self._latency.items()
+                          if hubIP in (None, hub)
+                          and endpoint in (None, name)]
+        count = sum(histogram[2] for histogram in histograms)
+        if not count:
+            return None
+        return sum(histogram[1] for histogram in histograms) / count
+
+    def reset(self):
+        with self._lock:
+            self._requests.clear()
+            self._errors.clear()
+            self._rejected.clear()
+            self._latency.clear()
+
+    def toPrometheus(self):
+        """
+        return: all metrics in the Prometheus text exposition format
+        """
+        with self._lock:
+            requests = sorted(self._requests.items())
+            errors = sorted(self._errors.items())
+            rejected = sorted(self._rejected.items())
+            latency = sorted((key, (list(histogram[0]),) + tuple(
+                histogram[1:])) for key, histogram in self._latency.items())
+        lines = [
+            "# HELP {}_requests_total Requests sent to the hub".format(
+                METRIC_PREFIX),
+            "# TYPE {}_requests_total counter".format(METRIC_PREFIX)]
+        for (hubIP, endpoint, method), count in requests:
+            lines.append("{}_requests_total{} {}".format(
+                METRIC_PREFIX,
+                _labels(hub=hubIP, endpoint=endpoint, method=method), count))
+        lines += [
+            "# HELP {}_errors_total Failed hub requests by exception".format(
+                METRIC_PREFIX),
+            "# TYPE {}_errors_total counter".format(METRIC_PREFIX)]
+        for (hubIP, endpoint, error), count in errors:
+            lines.append("{}_errors_total{} {}".format(
+                METRIC_PREFIX,
+                _labels(hub=hubIP, endpoint=endpoint, error=error), count))
+        lines += [
+            "# HELP {}_rejected_total Requests failed fast by an open "
+            "circuit".format(METRIC_PREFIX),
+            "# TYPE {}_rejected_total counter".format(METRIC_PREFIX)]
+        for (hubIP, endpoint, method), count in rejected:
+            lines.append("{}_rejected_total{} {}".format(
+                METRIC_PREFIX,
+                _labels(hub=hubIP, endpoint=endpoint, method=method), count))
+        name = "{}_request_duration_seconds".format(METRIC_PREFIX)
+        lines += ["# HELP {} Hub request latency".format(name),
+                  "# TYPE {} histogram".format(name)]
+        for (hubIP, endpoint), (bucketCounts, total, count) in latency:
+            cumulative = 0
+            for bound, bucketCount in zip(self.buckets, bucketCounts):
+                cumulative += bucketCount
+                lines.append("{}_bucket{} {}".format(
+                    name, _labels(hub=hubIP, endpoint=endpoint, le=bound),
+                    cumulative))
+            lines.append("{}_bucket{} {}".format(
+                name, _labels(hub=hubIP, endpoint=endpoint, le="+Inf"),
+                count))
+            lines.append("{}_sum{} {}".format(
+                name, _labels(hub=hubIP, endpoint=endpoint), total))
+            lines.append("{}_count{} {}".format(
+                name, _labels(hub=hubIP, endpoint=endpoint), count))
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,395 @@
+"""
+# Wiser API Facade, local mock hub
+
+A small HTTP server speaking the hub's /data/domain/ and /data/network/
+endpoints over a synthetic install of any size. PATCHes to rooms, smart
+plugs, schedules, hot water and the system are applied to the install so
+the next refresh sees them. Used by the benchmarks, and handy for trying
+the API without a hub.
+
+    with WiserMockHub(rooms=50, smartPlugs=10) as mockHub:
+        hub = wiserHub(mockHub.hubIP, mockHub.secret)
+
+Run it standalone with: python -m wiserHeatingAPI.wiserMockHub 50
+"""
+
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_LOGGER = logging.getLogger(__name__)
+
+MOCK_SECRET = "mocksecret"
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
+        "Sunday")
+
+
+def generateInstall(rooms=10, smartPlugs=2, seed=0):
+    """
+    Builds a synthetic install, two smart valves and a roomstat per room
+
+    param rooms: Number of rooms
+    param smartPlugs: Number of smart plugs
+    param seed: Seed for the random readings
+    return: tuple of domain and network payloads
+    """
+    rand = random.Random(seed)
+    domain = {
+        "System": {"HeatingButtonOverrideState": "Off",
+                   "HotWaterButtonOverrideState": "Off",
+                   "AwayModeAffectsHotWater": True,
+                   "ActiveSystemVersion": "2.50.0"},
+        "HeatingChannel": [{"id": 1, "Name": "Channel-1",
+                            "RoomIds": list(range(1, rooms + 1)),
+                            "PercentageDemand": 0,
+                            "DemandOnOffOutput": "Off",
+                            "HeatingRelayState": "Off"}],
+        "HotWater": [{"id": 2, "Mode": "Auto", "OverrideType": "None",
+                      "ScheduleId": 1000, "WaterHeatingState": "Off",
+                      "HotWaterRelayState": "Off"}],
+        "Room": [], "Device": [], "RoomStat": [], "SmartValve": [],
+        "SmartPlug": [], "Schedule": [],
+    }
+    deviceId = 1
+    for roomId in range(1, rooms + 1):
+        roomStatId = deviceId
+        valveIds = [deviceId + 1, deviceId + 2]
+        deviceId += 3
+        setPoint = rand.choice((160, 180, 200, 210))
+        domain["Room"].append({
+            "id": roomId, "Name": "Room {}".format(roomId),
+            "ScheduleId": roomId, "HeatingChannelId": 1,
+            "RoomStatId": roomStatId, "SmartValveIds": valveIds,
+            "Mode": "Auto", "OverrideType": "None", "SetpointOrigin":
+                "FromSchedule", "PercentageDemand": 0,
+            "CalculatedTemperature": rand.randint(150, 230),
+            "CurrentSetPoint": setPoint, "ScheduledSetPoint": setPoint})
+        domain["RoomStat"].append({
+            "id": roomStatId, "SetPoint": setPoint,
+            "MeasuredTemperature": rand.randint(150, 230),
+            "MeasuredHumidity": rand.randint(35, 65)})
+        for productType, roomDeviceId in (("RoomStat", roomStatId),) + \
+                tuple(("iTRV", valveId) for valveId in valveIds):
+            domain["Device"].append({
+                "id": roomDeviceId, "ProductType": productType,
+                "ModelIdentifier": productType,
+                "SerialNumber": "{:016X}".format(rand.getrandbits(64)),
+                "ActiveFirmwareVersion": "0201000E",
+                "DisplayedSignalStrength": rand.choice(
+                    ("VeryGood", "Good", "Medium", "Poor")),
+                "BatteryVoltage": rand.randint(23, 31),
+                "BatteryLevel": "Normal"})
+        for valveId in valveIds:
+            domain["SmartValve"].append({
+                "id": valveId, "SetPoint": setPoint,
+                "MeasuredTemperature": rand.randint(150, 230),
+                "PercentageDemand": 0, "WindowState": "Closed"})
+        domain["Schedule"].append({
+            "id": roomId, "Type": "Heating",
+            **{day: {"SetPoints": [
+                {"Time": 630, "DegreesC": setPoint},
+                {"Time": 900, "DegreesC": 160},
+                {"Time": 1700, "DegreesC": setPoint},
+                {"Time": 2230, "DegreesC": -200}]} for day in DAYS}})
+    for plugId in range(1, smartPlugs + 1):
+        scheduleId = 2000 + plugId
+        domain["SmartPlug"].append({
+            "id": deviceId, "Name": "Plug {}".format(plugId),
+            "ScheduleId": scheduleId, "Mode": "Manual",
+            "AwayAction": "NoChange", "OutputState": "Off",
+            "ManualState": "Off"})
+        domain["Device"].append({
+            "id": deviceId, "ProductType": "SmartPlug",
+            "ModelIdentifier": "SmartPlug",
+            "SerialNumber": "{:016X}".format(rand.getrandbits(64)),
+            "DisplayedSignalStrength": "Good"})
+        domain["Schedule"].append({
+            "id": scheduleId, "Type": "OnOff",
+            **{day: {"SetPoints": [{"Time": 1800, "State": "On"},
+                                   {"Time": 2300, "State": "Off"}]}
+               for day in DAYS}})
+        deviceId += 1
+    domain["Schedule"].append({
+        "id": 1000, "Type": "OnOff",
+        **{day: {"SetPoints": [{"Time": 600, "State": "On"},
+                               {"Time": 800, "State": "Off"}]}
+           for day in DAYS}})
+    network = {"Station": {"MdnsHostname": "WiserHeatMOCK",
+                           "MacAddress": "00:00:5E:00:53:01",
+                           "NetworkInterface": {"HostName": "WiserHeatMOCK"},
+                           "ConnectedSsid": "mock"}}
+    return domain, network
+
+
+class WiserMockHub:
+
+    def __init__(self, rooms=10, smartPlugs=2, secret=MOCK_SECRET,
+                 latency=0.0, host="127.0.0.1", port=0, seed=0):
+        """
+        param rooms: Number of rooms of the synthetic install
+        param smartPlugs: Number of smart plugs
+        param secret: Secret the hub accepts, other secrets get a 401
+        param latency: Seconds added to every response
+        param host: Address to listen on
+        param port: Port to listen on, 0 picks a free one
+        param seed: Seed for the random readings
+        """
+        self.domain, self.network = generateInstall(rooms, smartPlugs, seed)
+        self.secret = secret
+        self.latency = latency
+        # (method, first path segment after /data/) -> number of requests
+        self.requestCounts = {}
+        self._lock = threading.Lock()
+        self._domainBytes = None
+        # Direction of the next changeReadings step
+        self._drift = 0
+        # Set by stop, kept-alive connections are then dropped unanswered
+        self._stopped = False
+        self._server = ThreadingHTTPServer((host, port), self._handlerClass())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def hubIP(self):
+        """
+        Address to pass to wiserHub as hubIP
+        """
+        host, port = self._server.server_address[:2]
+        return "{}:{}".format(host, port)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name="wiserMockHub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped = True
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def domainBytes(self):
+        with self._lock:
+            if self._domainBytes is None:
+                self._domainBytes = json.dumps(self.domain).encode()
+            return self._domainBytes
+
+    def changeReadings(self):
+        """
+        Moves every room temperature by a tenth of a degree, like between
+        two polls of a real hub, so the next domain payload differs
+        """
+        with self._lock:
+            self._drift = 1 - self._drift
+            for room in self.domain.get("Room") or ():
+                temperature = room.get("CalculatedTemperature")
+                if temperature is not None and temperature > -32768:
+                    room["CalculatedTemperature"] = \
+                        temperature + (1 if self._drift else -1)
+            self._domainBytes = None
+
+    def getEntity(self, collection, entityId):
+        """
+        return: copy of an entity of the install, None if there is none
+        """
+        with self._lock:
+            entity = self._find(collection, str(entityId))
+            return None if entity is None else json.loads(json.dumps(entity))
+
+    def updateEntity(self, collection, entityId, **fields):
+        """
+        Changes fields of an entity, like another client or a device would,
+        the next domain payload holds the new values
+        return: True if the entity exists
+        """
+        with self._lock:
+            entity = self._find(collection, str(entityId))
+            if entity is None:
+                return False
+            entity.update(fields)
+            self._domainBytes = None
+            return True
+
+    def addEntity(self, collection, entity):
+        """
+        Adds an entity to a collection of the install
+        """
+        with self._lock:
+            self.domain.setdefault(collection, []).append(entity)
+            self._domainBytes = None
+
+    def removeEntity(self, collection, entityId):
+        """
+        Removes an entity from the install
+        return: The removed entity, None if there was none
+        """
+        with self._lock:
+            entity = self._find(collection, str(entityId))
+            if entity is not None:
+                self.domain[collection].remove(entity)
+                self._domainBytes = None
+            return entity
+
+    def networkBytes(self):
+        # Trailing control character, the real hub sends invalid JSON too
+        return json.dumps(self.network).encode() + b"\x00"
+
+    def _find(self, collection, entityId):
+        for entity in self.domain.get(collection) or ():
+            if str(entity.get("id")) == entityId:
+                return entity
+        return None
+
+    def applyPatch(self, path, patchData):
+        """
+        Applies a PATCH to the install
+        param path: Path parts after /data/domain/
+        return: True if the target exists
+        """
+        with self._lock:
+            self._domainBytes = None
+            if path == ["System"]:
+                self.domain["System"].update(patchData)
+                return True
+            if path == ["System", "RequestOverride"]:
+                self.domain["System"]["OverrideType"] = \
+                    "Away" if patchData.get("type") == 2 else "None"
+                return True
+            if len(path) != 2:
+                return False
+            entity = self._find(path[0], path[1])
+            if entity is None:
+                return False
+            override = patchData.get("RequestOverride") or {}
+            if path[0] == "Room":
+                if "Mode" in patchData:
+                    entity["Mode"] = patchData["Mode"]
+                if override.get("Type") == "Manual":
+                    entity["CurrentSetPoint"] = override.get("SetPoint")
+                    entity["OverrideType"] = "Manual"
+                elif override.get("Type") == "None":
+                    entity["OverrideType"] = "None"
+                    entity["CurrentSetPoint"] = entity["ScheduledSetPoint"]
+            elif path[0] == "SmartPlug":
+                if "RequestOutput" in patchData:
+                    entity["OutputState"] = patchData["RequestOutput"]
+                if "Mode" in patchData:
+                    entity["Mode"] = patchData["Mode"]
+            elif path[0] == "HotWater":
+                if override.get("Type") == "Manual":
+                    entity["WaterHeatingState"] = \
+                        "On" if override.get("SetPoint", 0) > 0 else "Off"
+                    entity["OverrideType"] = "Manual"
+                elif override.get("Type") == "None":
+                    entity["OverrideType"] = "None"
+            elif path[0] == "Schedule":
+                entity.update({key: value for key, value in patchData.items()
+                               if key != "id"})
+            return True
+
+    def _handlerClass(self):
+        mockHub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body are written separately, without this every
+            # keep-alive response waits out a delayed ACK
+            disable_nagle_algorithm = True
+
+            def log_message(self, format, *args):
+                _LOGGER.debug(format % args)
+
+            def _path(self):
+                return [part for part in self.path.split("/") if part]
+
+            def _count(self, parts):
+                key = (self.command, "/".join(parts[1:3]))
+                with mockHub._lock:
+                    mockHub.requestCounts[key] = \
+                        mockHub.requestCounts.get(key, 0) + 1
+
+            def _send(self, status, body=b""):
+                if mockHub.latency:
+                    time.sleep(mockHub.latency)
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _authorised(self):
+                if self.headers.get("SECRET") != mockHub.secret:
+                    self._send(401)
+                    return False
+                return True
+
+            def _refused(self):
+                # Like a hub gone offline, also on kept-alive connections
+                if mockHub._stopped:
+                    self.close_connection = True
+                return mockHub._stopped
+
+            def do_GET(self):
+                if self._refused():
+                    return
+                parts = self._path()
+                self._count(parts)
+                if not self._authorised():
+                    return
+                if parts == ["data", "domain"]:
+                    return self._send(200, mockHub.domainBytes())
+                if parts == ["data", "network"]:
+                    return self._send(200, mockHub.networkBytes())
+                if parts[:2] == ["data", "domain"] and len(parts) in (3, 4):
+                    with mockHub._lock:
+                        collection = mockHub.domain.get(parts[2])
+                        if collection is not None and len(parts) == 4:
+                            collection = mockHub._find(parts[2], parts[3])
+                        body = None if collection is None \
+                            else json.dumps(collection).encode()
+                    if body is not None:
+                        return self._send(200, body)
+                self._send(404)
+
+            def do_PATCH(self):
+                if self._refused():
+                    return
+                parts = self._path()
+                self._count(parts)
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length)
+                if not self._authorised():
+                    return
+                try:
+                    patchData = json.loads(body or b"{}")
+                except ValueError:
+                    return self._send(400)
+                if parts[:2] != ["data", "domain"] or \
+                        not mockHub.applyPatch(parts[2:], patchData):
+                    return self._send(404)
+                self._send(200, json.dumps(patchData).encode())
+
+        return Handler
+
+
+if __name__ == "__main__":
+    import sys
+    logging.basicConfig(level=logging.INFO)
+    mockHub = WiserMockHub(rooms=int(sys.argv[1]) if len(sys.argv) > 1
+                           else 10, port=8080).start()
+    print("Mock hub listening on {} with secret {}".format(
+        mockHub.hubIP, mockHub.secret))
+    try:
+        mockHub._thread.join()
+    except KeyboardInterrupt:
+        mockHub.stop()
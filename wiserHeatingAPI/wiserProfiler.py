@@ -0,0 +1,193 @@
+"""
+# Wiser API Facade, refresh profiling
+
+Opt-in breakdown of where a refresh spends its time. Once profiling is
+enabled on a hub every refreshData, refreshHubData and refreshNetworkData
+records the wall time of each phase:
+
+- domainHttp, networkHttp: request round trip including reading the body
+- domainDecode, networkDecode: JSON decoding
+- networkSanitize: cleaning the network payload of invalid characters
+- entityIndex: building the id indexes
+- roomMap: rebuilding the device to room map
+- reconcile: settling pending writes against the fresh payload, only when
+  there are any
+- events: diffing the indexes and calling the subscribers
+- history: recording the sample when history is enabled
+
+    hub.enableProfiling(keep=20, traceMemory=True, hook=print)
+    hub.refreshData()
+    profile = hub.getRefreshProfiles()[-1]
+
+refreshData fetches both payloads concurrently, so the phases of one profile
+can add up to more than its elapsed time. With traceMemory the peak of
+memory allocated during the refresh is recorded with tracemalloc, which
+slows every allocation in the process down while it is enabled.
+tracemalloc keeps a single peak for the whole process, so a refresh which
+overlaps another traced refresh, of any hub, gets no peakMemory. Tracing
+stops when the last profiler tracing memory is closed, unless it was
+already running before the first one.
+"""
+
+import collections
+import contextlib
+import logging
+import threading
+import time
+import tracemalloc
+
+_LOGGER = logging.getLogger(__name__)
+
+# Default number of profiles kept
+PROFILE_KEEP = 10
+
+# Guards the tracemalloc state shared by all profilers
+_tracingLock = threading.Lock()
+# Number of open profilers tracing memory
+_tracingUsers = 0
+# True when tracemalloc was started by a profiler, not by the application
+_startedTracing = False
+# Traced profiles of the refreshes in flight
+_tracedProfiles = set()
+
+
+def _startTracing():
+    global _tracingUsers, _startedTracing
+    with _tracingLock:
+        if _tracingUsers == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            _startedTracing = True
+        _tracingUsers += 1
+
+
+def _stopTracing():
+    global _tracingUsers, _startedTracing
+    with _tracingLock:
+        _tracingUsers -= 1
+        if _tracingUsers == 0 and _startedTracing:
+            tracemalloc.stop()
+            _startedTracing = False
+
+
+def phase(profile, name):
+    """
+    Times a phase of a refresh
+    param profile: WiserRefreshProfile, None when profiling is off
+    param name: Name of the phase
+    return: context manager
+    """
+    if profile is None:
+        return contextlib.nullcontext()
+    return profile.phase(name)
+
+
+class WiserRefreshProfile:
+
+    def __init__(self, kind):
+        """
+        param kind: Name of the refresh method, e.g. refreshData
+        """
+        self.kind = kind
+        # time.time() when the refresh started
+        self.startTime = time.time()
+        # Phase name -> seconds, in the order the phases finished
+        self.phases = collections.OrderedDict()
+        # Seconds for the whole refresh
+        self.elapsed = None
+        # Peak bytes allocated during the refresh on top of what was
+        # allocated before it, None without traceMemory or when another
+        # traced refresh overlapped it
+        self.peakMemory = None
+        self._baseMemory = 0
+        self._traced = False
+        self._overlapped = False
+        # Payloads, domain or network, received byte for byte unchanged
+        # so their decoding and rebuild were skipped
+        self.unchanged = []
+        # Name of the exception the refresh raised, if any
+        self.error = None
+        self._start = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + elapsed
+
+    def __repr__(self):
+        return "WiserRefreshProfile({} {:.1f}ms: {}{}{}{})".format(
+            self.kind, (self.elapsed or 0) * 1000,
+            ", ".join("{} {:.1f}ms".format(name, elapsed * 1000)
+                      for name, elapsed in self.phases.items()),
+            "" if self.peakMemory is None
+            else ", peak {:.1f}KB".format(self.peakMemory / 1024),
+            "" if not self.unchanged
+            else ", unchanged " + " ".join(self.unchanged),
+            "" if self.error is None else ", failed " + self.error)
+
+
+class WiserRefreshProfiler:
+
+    def __init__(self, keep=PROFILE_KEEP, traceMemory=False, hook=None):
+        """
+        param keep: Number of most recent profiles kept
+        param traceMemory: Record the peak memory of each refresh
+        param hook: Optional callable called with each finished profile
+        """
+        self.profiles = collections.deque(maxlen=keep)
+        self.traceMemory = traceMemory
+        self.hook = hook
+        self._tracing = traceMemory
+        if traceMemory:
+            _startTracing()
+
+    def start(self, kind):
+        """
+        return: a new WiserRefreshProfile for a refresh starting now
+        """
+        profile = WiserRefreshProfile(kind)
+        if self._tracing:
+            with _tracingLock:
+                # Resetting the peak spoils the peaks of the others
+                for other in _tracedProfiles:
+                    other._overlapped = True
+                profile._overlapped = bool(_tracedProfiles)
+                profile._traced = True
+                _tracedProfiles.add(profile)
+                tracemalloc.reset_peak()
+                profile._baseMemory = tracemalloc.get_traced_memory()[0]
+        return profile
+
+    def finish(self, profile):
+        """
+        Completes a profile, keeps it and hands it to the hook
+        """
+        profile.elapsed = time.perf_counter() - profile._start
+        if profile._traced:
+            with _tracingLock:
+                _tracedProfiles.discard(profile)
+                if not profile._overlapped and tracemalloc.is_tracing():
+                    profile.peakMemory = \
+                        tracemalloc.get_traced_memory()[1] - \
+                        profile._baseMemory
+        self.profiles.append(profile)
+        if self.hook is not None:
+            try:
+                self.hook(profile)
+            except Exception:
+                _LOGGER.exception(
+                    "Refresh profile hook failed on {}".format(profile))
+
+    def close(self):
+        """
+        Stops tracemalloc if no other profiler traces memory and it was not
+        running before the first one started it
+        """
+        if self._tracing:
+            self._tracing = False
+            _stopTracing()
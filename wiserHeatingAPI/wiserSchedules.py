@@ -0,0 +1,150 @@
+"""
+# Wiser API Facade, compiled schedules
+
+Compiles the hub's Schedule entries into sorted change points over the week
+so the set point or plug state in force at any time is a binary search
+away, without any hub call:
+
+    hub.getRoomSetPointAt(roomId, datetime(2020, 1, 6, 7, 0))
+    hub.getNextScheduleChange()
+    hub.forecastRoomSetPoints(step=15, count=7 * 96)
+
+Schedule times are the hub's local time, datetimes passed in are taken as
+local times too. A week of a schedule is also expanded into a table with
+one value per minute the first time a forecast needs it, a forecast on a
+regular grid is then a strided slice of that table.
+"""
+
+import array
+import bisect
+import datetime
+
+DAYS = ("Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday",
+        "Sunday")
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def weekMinute(when):
+    """
+    param when: datetime
+    return: minutes since Monday 00:00 of its week
+    """
+    return when.weekday() * MINUTES_PER_DAY + when.hour * 60 + when.minute
+
+
+def _encode(setPoint):
+    # Heating schedules hold tenths of a degree, on/off schedules a state
+    if "DegreesC" in setPoint:
+        return setPoint["DegreesC"]
+    return 1 if setPoint.get("State") == "On" else 0
+
+
+class CompiledSchedule:
+    __slots__ = ("id", "type", "times", "values", "_table")
+
+    def __init__(self, schedule):
+        """
+        param schedule: A Schedule entry of the domain payload
+        """
+        self.id = schedule.get("id")
+        self.type = schedule.get("Type")
+        changes = []
+        for day, dayName in enumerate(DAYS):
+            for setPoint in (schedule.get(dayName) or {}).get(
+                    "SetPoints") or ():
+                hhmm = setPoint.get("Time", 0)
+                changes.append((day * MINUTES_PER_DAY + hhmm // 100 * 60 +
+                                hhmm % 100, _encode(setPoint)))
+        changes.sort()
+        # Week minutes of the changes and the value each one sets
+        self.times = array.array("l", [change[0] for change in changes])
+        self.values = array.array("h", [change[1] for change in changes])
+        self._table = None
+
+    def decode(self, value):
+        """
+        return: degrees C for heating schedules, On or Off otherwise
+        """
+        if self.type == "Heating" or self.type is None:
+            return round(value / 10, 1)
+        return "On" if value else "Off"
+
+    def valueAt(self, minute):
+        """
+        param minute: Week minute, see weekMinute
+        return: encoded value in force, None for an empty schedule
+        """
+        if not self.times:
+            return None
+        # Before the first change of the week the last one is still in force
+        return self.values[bisect.bisect_right(self.times, minute) - 1]
+
+    def nextChange(self, minute):
+        """
+        param minute: Week minute, see weekMinute
+        return: tuple of minutes until the next change and the encoded value
+                it sets, None for an empty schedule
+        """
+        if not self.times:
+            return None
+        index = bisect.bisect_right(self.times, minute)
+        if index == len(self.times):
+            return self.times[0] + MINUTES_PER_WEEK - minute, self.values[0]
+        return self.times[index] - minute, self.values[index]
+
+    def weekTable(self):
+        """
+        return: array of the encoded value in force at every minute of the
+                week
+        """
+        if self._table is None and self.times:
+            table = array.array("h", [self.values[-1]]) * MINUTES_PER_WEEK
+            bounds = list(self.times) + [MINUTES_PER_WEEK]
+            for index, value in enumerate(self.values):
+                start, end = bounds[index], bounds[index + 1]
+                table[start:end] = array.array("h", [value]) * (end - start)
+            self._table = table
+        return self._table
+
+    def forecast(self, startMinute, step, count):
+        """
+        Values on a regular grid of times
+
+        param startMinute: Week minute of the first time
+        param step: Minutes between times
+        param count: Number of times
+        return: array of encoded values
+        """
+        table = self.weekTable()
+        if table is None or count <= 0:
+            return array.array("h")
+        startMinute %= MINUTES_PER_WEEK
+        end = startMinute + step * (count - 1) + 1
+        weeks = -(-end // MINUTES_PER_WEEK)
+        return (table * weeks)[startMinute:end:step]
+
+
+class WiserScheduleIndex:
+
+    def __init__(self, schedules):
+        """
+        param schedules: The Schedule collection of the domain payload
+        """
+        self.schedules = {schedule.get("id"): CompiledSchedule(schedule)
+                          for schedule in schedules or ()}
+
+    def get(self, scheduleId):
+        """
+        return: CompiledSchedule, None if there is no such schedule
+        """
+        return self.schedules.get(scheduleId)
+
+    @staticmethod
+    def gridTimes(start, step, count):
+        """
+        return: list of the datetimes of a regular grid
+        """
+        delta = datetime.timedelta(minutes=step)
+        return [start + delta * index for index in range(count)]
@@ -0,0 +1,103 @@
+"""
+# Wiser API Facade, on-disk snapshots
+
+WiserSnapshotStore keeps the last good domain and network payloads in a
+local file so a new process can answer reads before the hub does:
+
+    hub = wiserHub(hubIP, secret, snapshotPath="/var/cache/wiser.snap")
+
+When the file exists the hub starts from it and refreshes in the
+background, after every refresh which changed a payload the file is
+rewritten.
+
+The file is a fixed header followed by the raw payload bytes exactly as the
+hub sent them, so saving costs no encoding:
+
+    magic b"WSNP", format version (uint16), flags (uint16),
+    saved at (float64 time.time()), domain length (uint32),
+    network length (uint32), domain bytes, network bytes
+
+Each payload is read straight into its own bytes object, those are kept as
+the fingerprints of the cached data, and the file is replaced atomically
+when written.
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import struct
+import tempfile
+
+_LOGGER = logging.getLogger(__name__)
+
+SNAPSHOT_MAGIC = b"WSNP"
+SNAPSHOT_VERSION = 1
+_HEADER = struct.Struct("<4sHHdII")
+
+# A loaded snapshot, domain and network are the raw payload bytes, network
+# is None if it was never received
+WiserSnapshot = collections.namedtuple(
+    "WiserSnapshot", ["domain", "network", "savedAt"])
+
+
+class WiserSnapshotStore:
+
+    def __init__(self, path):
+        """
+        param path: File the snapshot is kept in
+        """
+        self.path = path
+
+    def load(self):
+        """
+        Reads the snapshot file
+        return: WiserSnapshot, None if there is no usable snapshot
+        """
+        try:
+            with open(self.path, "rb") as snapshotFile:
+                header = snapshotFile.read(_HEADER.size)
+                if len(header) < _HEADER.size:
+                    raise ValueError("file too short")
+                magic, version, _, savedAt, domainLength, networkLength = \
+                    _HEADER.unpack(header)
+                if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_VERSION:
+                    raise ValueError("not a version {} snapshot".format(
+                        SNAPSHOT_VERSION))
+                domain = snapshotFile.read(domainLength)
+                network = snapshotFile.read(networkLength)
+                if len(domain) != domainLength or not domainLength or \
+                        len(network) != networkLength or snapshotFile.read(1):
+                    raise ValueError("payload lengths do not match header")
+                network = network or None
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, struct.error) as ex:
+            _LOGGER.warning("Ignoring snapshot {}: {}".format(self.path, ex))
+            return None
+        return WiserSnapshot(domain, network, savedAt)
+
+    def save(self, domain, network, savedAt):
+        """
+        Replaces the snapshot file
+
+        param domain: Raw domain payload bytes
+        param network: Raw network payload bytes, None if not received
+        param savedAt: time.time() the payloads were received
+        """
+        network = network or b""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tempPath = tempfile.mkstemp(dir=directory, prefix=".wiser",
+                                        suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as snapshotFile:
+                snapshotFile.write(_HEADER.pack(
+                    SNAPSHOT_MAGIC, SNAPSHOT_VERSION, 0, savedAt,
+                    len(domain), len(network)))
+                snapshotFile.write(domain)
+                snapshotFile.write(network)
+            os.replace(tempPath, self.path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.unlink(tempPath)
+            raise
@@ -0,0 +1,78 @@
+"""
+# Wiser API Facade, published hub state
+
+Everything a wiserHub serves reads from one WiserHubState: the domain and
+network payloads, the entity indexes and the device to room map. A refresh
+builds a complete new state and publishes it with a single attribute
+assignment, local writes and targeted refreshes publish a copy with the
+changed entities replaced. A published state is never modified, so reader
+threads need no lock and never see a payload next to indexes built from
+another one.
+
+Take the state once when reading several parts of it:
+
+    state = hub.state
+    room = state.entityIndex["Room"][roomId]
+    roomName = state.device2roomMap[deviceId]["roomName"]
+"""
+
+import collections
+
+WiserHubState = collections.namedtuple(
+    "WiserHubState", ["hubData", "networkData", "entityIndex",
+                      "device2roomMap", "generation"])
+
+# State of a hub which has not received any data yet
+EMPTY_STATE = WiserHubState(None, None, {}, {}, 0)
+
+
+def withEntity(hubData, entityIndex, entityType, entity):
+    """
+    Copy of the payload and indexes with one entity replaced, or added if
+    the collection does not hold it yet. Only the containers on the path to
+    the entity are copied, all other entities are shared.
+
+    param hubData: Domain payload
+    param entityIndex: Its entity indexes
+    param entityType: Collection name, e.g. Room
+    param entity: The new entity
+    return: tuple of the new payload, the new indexes and the entity which
+            was replaced, None if it was added
+    """
+    entityId = entity.get("id")
+    collection = list(hubData.get(entityType) or ())
+    replaced = None
+    for index, cached in enumerate(collection):
+        if cached.get("id") == entityId:
+            replaced = cached
+            collection[index] = entity
+            break
+    else:
+        collection.append(entity)
+    hubData = dict(hubData)
+    hubData[entityType] = collection
+    if entityType in entityIndex:
+        entities = dict(entityIndex[entityType] or {})
+        entities[entityId] = entity
+        entityIndex = dict(entityIndex)
+        entityIndex[entityType] = entities
+    return hubData, entityIndex, replaced
+
+
+def withCollection(hubData, entityIndex, entityType, entities):
+    """
+    Copy of the payload and indexes with one collection replaced
+
+    param hubData: Domain payload
+    param entityIndex: Its entity indexes
+    param entityType: Collection name, e.g. SmartPlug
+    param entities: List of the new entities
+    return: tuple of the new payload and the new indexes
+    """
+    hubData = dict(hubData)
+    hubData[entityType] = entities
+    if entityType in entityIndex:
+        entityIndex = dict(entityIndex)
+        entityIndex[entityType] = {entity.get("id"): entity
+                                   for entity in entities}
+    return hubData, entityIndex
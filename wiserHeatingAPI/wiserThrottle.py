@@ -0,0 +1,140 @@
+"""
+# Wiser API Facade, per hub request scheduling
+
+WiserRequestScheduler protects a slow hub from being hammered. Pass one per
+hub to wiserHub:
+
+    hub = wiserHub(hubIP, secret,
+                   scheduler=WiserRequestScheduler(rate=2, burst=4))
+
+- Requests are limited to rate per second with a token bucket.
+- After a timeout or connection error the next requests are delayed by an
+  exponential backoff with full jitter.
+- After failureThreshold consecutive failures the circuit opens, requests
+  then fail fast with WiserCircuitOpenException, and refreshes keep
+  serving the cached data, until resetTimeout has passed. A single trial
+  request then decides whether the circuit closes again.
+- Requests in flight together count as one failure when they all fail, so
+  a refresh fetching the domain and network payloads at once counts once.
+
+A healthy hub never waits unless rate is set.
+"""
+
+import logging
+import random
+import threading
+import time
+
+from .wiserHub import WiserCircuitOpenException
+
+_LOGGER = logging.getLogger(__name__)
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+
+class WiserRequestScheduler:
+
+    def __init__(self, rate=None, burst=1, backoffBase=0.5, backoffMax=30,
+                 failureThreshold=5, resetTimeout=60):
+        """
+        param rate: Maximum requests per second, None for no limit
+        param burst: Number of requests allowed back to back under rate
+        param backoffBase: Backoff in seconds after the first failure
+        param backoffMax: Upper bound of the backoff in seconds
+        param failureThreshold: Consecutive failures which open the circuit
+        param resetTimeout: Seconds the circuit stays open before a trial
+        """
+        self.rate = rate
+        self.burst = burst
+        self.backoffBase = backoffBase
+        self.backoffMax = backoffMax
+        self.failureThreshold = failureThreshold
+        self.resetTimeout = resetTimeout
+        self.state = CIRCUIT_CLOSED
+        self.consecutiveFailures = 0
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._lastFill = time.monotonic()
+        self._retryAfter = 0.0
+        self._openedAt = 0.0
+        self._lastFailure = 0.0
+        self._trialInFlight = False
+
+    def acquire(self):
+        """
+        Waits until the next request may be sent
+
+        raises WiserCircuitOpenException when the circuit is open
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self.state == CIRCUIT_OPEN:
+                if now - self._openedAt < self.resetTimeout:
+                    raise WiserCircuitOpenException(
+                        "Circuit open after {} failures, retry in {:.1f}s".
+                        format(self.consecutiveFailures,
+                               self.resetTimeout - (now - self._openedAt)))
+                _LOGGER.debug("Circuit half open, sending trial request")
+                self.state = CIRCUIT_HALF_OPEN
+            if self.state == CIRCUIT_HALF_OPEN:
+                if self._trialInFlight:
+                    raise WiserCircuitOpenException(
+                        "Circuit half open, trial request in flight")
+                self._trialInFlight = True
+
+            wait = max(0.0, self._retryAfter - now)
+            if self.rate is not None:
+                self._tokens = min(
+                    self.burst,
+                    self._tokens + (now - self._lastFill) * self.rate)
+                self._lastFill = now
+                if self._tokens < 1:
+                    wait = max(wait, (1 - self._tokens) / self.rate)
+                # May go negative, later callers queue behind this one
+                self._tokens -= 1
+        if wait > 0:
+            time.sleep(wait)
+
+    def recordSuccess(self):
+        with self._lock:
+            if self.state != CIRCUIT_CLOSED:
+                _LOGGER.info("Circuit closed")
+            self.state = CIRCUIT_CLOSED
+            self.consecutiveFailures = 0
+            self._retryAfter = 0.0
+            self._trialInFlight = False
+
+    def releaseTrial(self):
+        """
+        Ends a request which failed for reasons other than the hub, a half
+        open circuit then lets the next request through as its trial
+        """
+        with self._lock:
+            self._trialInFlight = False
+
+    def recordFailure(self, sentAt=None):
+        """
+        param sentAt: time.monotonic() when the failed request was sent. A
+                      request sent before the last counted failure was in
+                      flight with it and is not counted again.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if sentAt is not None and sentAt < self._lastFailure:
+                return
+            self._lastFailure = now
+            self.consecutiveFailures += 1
+            backoff = min(self.backoffMax, self.backoffBase *
+                          2 ** (self.consecutiveFailures - 1))
+            self._retryAfter = now + random.uniform(0, backoff)
+            if self.state == CIRCUIT_HALF_OPEN or \
+                    self.consecutiveFailures >= self.failureThreshold:
+                if self.state != CIRCUIT_OPEN:
+                    _LOGGER.warning(
+                        "Circuit opened after {} consecutive failures".format(
+                            self.consecutiveFailures))
+                self.state = CIRCUIT_OPEN
+                self._openedAt = now
+            self._trialInFlight = False
@@ -0,0 +1,100 @@
+"""
+# Wiser API Facade, memoized derived views
+
+Aggregates computed from the domain payload, e.g. the overall relay state
+or the rooms calling for heat. wiserHub bumps its generation counter each
+time the cached payload changes, a view is computed at most once per
+generation and served from the memo until then.
+"""
+
+import array
+import collections
+import threading
+
+# BatteryLevel values reported as low by getLowBatteryDevices
+LOW_BATTERY_LEVELS = ("OneThird", "Low", "Critical")
+
+# Room ids and their calculated temperatures in degrees C, NaN for rooms
+# without a reading
+WiserRoomTemperatures = collections.namedtuple(
+    "WiserRoomTemperatures", ["roomIds", "temperatures"])
+
+
+class WiserViewCache:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._generation = None
+        self._views = {}
+
+    def get(self, generation, key, compute):
+        """
+        Returns the memoized view, computing it once per generation
+
+        param generation: Generation of the data the view is derived from
+        param key: Hashable name of the view and its arguments
+        param compute: Callable computing the view
+        """
+        with self._lock:
+            if self._generation != generation:
+                self._generation = generation
+                self._views = {}
+            views = self._views
+            if key in views:
+                return views[key]
+        value = compute()
+        with self._lock:
+            # Only keep it if no newer generation arrived meanwhile
+            if self._views is views:
+                views[key] = value
+        return value
+
+
+def heatingRelayStatus(hubData):
+    """
+    return: On if the relay of any heating channel is on, else Off
+    """
+    for heatingChannel in hubData.get("HeatingChannel") or ():
+        if heatingChannel.get("HeatingRelayState") == "On":
+            return "On"
+    return "Off"
+
+
+def hotWaterRelayStatus(hubData):
+    """
+    return: WaterHeatingState of the hot water, False if there is none
+    """
+    hotWater = hubData.get("HotWater") or ()
+    if len(hotWater) < 1:
+        return False
+    return hotWater[0].get("WaterHeatingState")
+
+
+def roomsCallingForHeat(hubData):
+    """
+    return: tuple of the ids of the rooms with a heat demand
+    """
+    return tuple(room.get("id") for room in hubData.get("Room") or ()
+                 if (room.get("PercentageDemand") or 0) > 0)
+
+
+def roomTemperatures(hubData):
+    """
+    return: WiserRoomTemperatures of every room
+    """
+    rooms = hubData.get("Room") or ()
+    return WiserRoomTemperatures(
+        tuple(room.get("id") for room in rooms),
+        array.array("d", [
+            float("nan") if temperature is None or temperature <= -32768
+            else temperature / 10
+            for temperature in (room.get("CalculatedTemperature")
+                                for room in rooms)]))
+
+
+def lowBatteryDevices(hubData, levels=LOW_BATTERY_LEVELS):
+    """
+    return: tuple of the devices whose BatteryLevel is one of levels
+    """
+    return tuple(device for device in hubData.get("Device") or ()
+                 if device.get("BatteryLevel") in levels)
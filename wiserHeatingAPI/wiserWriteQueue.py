@@ -0,0 +1,94 @@
+"""
+# Wiser API Facade, write coalescing
+
+When a write queue is enabled on a hub (wiserHub.enableWriteQueue) the
+setters for room temperature and mode, smart plugs and hot water validate
+their arguments and return straight away. Only the latest value per target
+is kept, a debounce window after the first pending write all targets are
+flushed to the hub in parallel. Flushes run one at a time, a value queued
+while a flush is sending an older one for the same target goes out after
+it.
+"""
+
+import logging
+import threading
+
+_LOGGER = logging.getLogger(__name__)
+
+# Seconds between the first queued write and the flush
+WRITE_DEBOUNCE = 0.3
+
+
+class WiserWriteQueue:
+
+    def __init__(self, hub, debounce=WRITE_DEBOUNCE):
+        """
+        param hub: The wiserHub the writes are sent through
+        param debounce: Seconds to wait for more writes before flushing
+        """
+        self.hub = hub
+        self.debounce = debounce
+        # key -> (setter, args), the latest write per target
+        self._pending = {}
+        self._lock = threading.Lock()
+        # Held while a flush sends, so writes to a target stay in order
+        self._flushLock = threading.Lock()
+        self._timer = None
+        self._local = threading.local()
+        # key -> exception for writes which failed in the last flush
+        self.lastErrors = {}
+
+    def isFlushing(self):
+        """
+        return: True when called from a setter the queue is flushing, those
+                calls must go to the hub instead of being queued again
+        """
+        return getattr(self._local, "flushing", False)
+
+    def submit(self, key, setter, args):
+        """
+        Queues a write, replacing any pending write for the same key
+
+        param key: Identifies the target, e.g. ("Room", roomId)
+        param setter: Bound hub setter to call when flushing
+        param args: Arguments for the setter
+        """
+        with self._lock:
+            self._pending[key] = (setter, args)
+            if self._timer is None:
+                self._timer = threading.Timer(self.debounce, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def flush(self):
+        """
+        Sends all pending writes now, one thread per target
+
+        return: dict of key to True or the exception raised for that target
+        """
+        with self._flushLock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                if self._timer is not None:
+                    self._timer.cancel()
+                    self._timer = None
+            if not pending:
+                return {}
+            results = self.hub._runBatch(
+                {key: self.__task(setter, args)
+                 for key, (setter, args) in pending.items()})
+        self.lastErrors = {key: result for key, result in results.items()
+                           if isinstance(result, Exception)}
+        for key, error in self.lastErrors.items():
+            _LOGGER.warning("Queued write to {} failed: {}".format(key, error))
+        return {key: True if not isinstance(result, Exception) else result
+                for key, result in results.items()}
+
+    def __task(self, setter, args):
+        def run():
+            self._local.flushing = True
+            try:
+                return setter(*args)
+            finally:
+                self._local.flushing = False
+        return run